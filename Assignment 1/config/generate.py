@@ -0,0 +1,42 @@
+# Made-up topologies for networks too big to write by hand.
+#
+# scripts/loadtest.py writes one out as yaml and runs it for real;
+# src/simulation.py flies it on a virtual clock. Same seed, same network.
+#
+# Codes go ANC, AAA, AAB, ... so ANC is always there and always a hub.
+# Every other hub lays over at one random other hub, every spoke at one or two
+# random hubs. The probe airport (ZZZ) is the loadtest's own node, hung off ANC.
+
+import itertools
+import random
+import string
+from typing import Dict, List, Tuple
+
+PROBE_CODE = "ZZZ"
+
+
+def generate_topology(count: int, hub_count: int, base_port: int, seed: int) -> Tuple[Dict[str, str], List[str], Dict[str, List[str]]]:
+    """Make `count` airports (ANC always first), the first `hub_count` of them hubs, plus the probe."""
+    rng = random.Random(seed)
+    codes = ["ANC"]
+    for letters in itertools.product(string.ascii_uppercase, repeat=3):
+        if len(codes) >= count:
+            break
+        code = "".join(letters)
+        if code not in ("ANC", PROBE_CODE):
+            codes.append(code)
+
+    hubs = codes[: max(1, min(hub_count, len(codes)))]
+    airports = {code: f"127.0.0.1:{base_port + i}" for i, code in enumerate(codes)}
+    airports[PROBE_CODE] = f"127.0.0.1:{base_port + len(codes)}"
+
+    default_hub: Dict[str, List[str]] = {}
+    for code in codes:
+        if code in hubs:
+            others = [hub for hub in hubs if hub != code]
+            if others:
+                default_hub[code] = [rng.choice(others)]
+        else:
+            default_hub[code] = rng.sample(hubs, min(len(hubs), rng.choice((1, 2))))
+    default_hub[PROBE_CODE] = ["ANC"]
+    return airports, hubs, default_hub
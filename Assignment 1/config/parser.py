@@ -10,6 +10,9 @@
 #                   default_hub:
 #                        SEA: "ANC"
 #                        FAI: ["ANC", "SEA"]
+#                   transport:          (optional, see load_transports)
+#                        default: "tcp"
+#                        ANC: "udp"
 #
 # It ignores blank lines and lines starting with '#'.
 # This is NOT a full YAML parser. It just handles my use case.
@@ -149,6 +152,46 @@ def load_routes(path: str) -> tuple[list[str], dict[str, list[str]]]:
         raise ValueError("routes.yaml hubs must include ANC")
     return hubs, default_hub
 
+TRANSPORTS = ("tcp", "udp")
+
+def load_transports(path: str) -> dict[str, str]:
+    """
+    Read the optional transport block of routes.yaml: which protocol each
+    airport uses to send its legs. Returns e.g. {"default": "tcp", "ANC": "udp"};
+    an empty dict (everyone on TCP) if the block isn't there.
+    transport:
+        default: "tcp"
+        ANC: "udp"
+    load_routes skips this block, so older code reading the same file is fine.
+    """
+    transports: dict[str, str] = {}
+    inside = False
+
+    with open(path, "r", encoding="utf-8") as f:
+        for raw in f:
+            line = raw.rstrip("\n")
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+
+            # any unindented line ends the block (or starts it)
+            if not (line.startswith(" ") or line.startswith("\t")):
+                inside = stripped.startswith("transport:")
+                continue
+            if not inside or ":" not in stripped:
+                continue
+
+            k, v = stripped.split(":", 1)
+            k = k.strip().upper()
+            value = _strip_quotes(v).strip().lower()
+            if k != "DEFAULT" and not _is_iata(k):
+                raise ValueError(f"routes.yaml bad transport key: {k!r}")
+            if value not in TRANSPORTS:
+                raise ValueError(f"routes.yaml transport for {k} must be one of {TRANSPORTS}, got {value!r}")
+            transports["default" if k == "DEFAULT" else k] = value
+
+    return transports
+
 # quick test case: print a tiny summary
 if __name__ == "__main__":
     a = load_airports("src/airports.yaml")
@@ -156,3 +199,4 @@ if __name__ == "__main__":
     print("airports:", len(a), "ANC:", a.get("ANC"))
     print("hubs:", h)
     print("default_hub count:", len(d), "SEA->", d.get("SEA"))
+    print("transports:", load_transports("src/routes.yaml") or "all tcp")
@@ -0,0 +1,131 @@
+# Watches airports.yaml / routes.yaml and hands out fresh topology when they change.
+#
+# Every `interval` seconds we stat both files. Only if an mtime or size moved
+# do we read them, and only if the bytes actually hash differently do we run
+# the parser (editors love to touch files without changing them). A file that
+# fails to parse is reported and ignored; everyone keeps the last good config.
+#
+# Subscribers get a Topology, a plain immutable snapshot. main() wires the
+# scheduler, the routing table and every node up to it.
+
+import hashlib
+import os
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .parser import load_airports, load_routes, load_transports
+
+
+class Topology(NamedTuple):
+    airports: Dict[str, str]
+    hubs: List[str]
+    default_hub: Dict[str, List[str]]
+    version: int  # bumps on every applied change, starts at 1
+    transports: Dict[str, str] = {}  # routes.yaml transport block, e.g. {"default": "tcp", "ANC": "udp"}
+
+
+Stamp = Tuple[int, int]  # (mtime_ns, size)
+
+
+class ConfigWatcher:
+    """Polls the two config files and tells subscribers when the topology really changed."""
+
+    def __init__(self, airports_path: str, routes_path: str, interval: float = 2.0) -> None:
+        self.airports_path = airports_path
+        self.routes_path = routes_path
+        self.interval = interval
+        self._stamps: Dict[str, Optional[Stamp]] = {}
+        self._hashes: Dict[str, Optional[str]] = {}
+        self._subscribers: List[Callable[[Topology], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.current: Optional[Topology] = None
+
+    def load(self) -> Topology:
+        """Parse both files now (raises on bad config). Used for the first load."""
+        for path in (self.airports_path, self.routes_path):
+            self._stamps[path] = self._stamp(path)
+            self._hashes[path] = self._hash(path)
+        self.current = self._parse(1)
+        return self.current
+
+    def subscribe(self, callback: Callable[[Topology], None]) -> None:
+        """callback(topology) runs on the watcher thread after every change."""
+        self._subscribers.append(callback)
+
+    def check(self) -> Optional[Topology]:
+        """Look once. Returns the new Topology if something really changed, else None."""
+        moved = []
+        for path in (self.airports_path, self.routes_path):
+            stamp = self._stamp(path)
+            if stamp != self._stamps.get(path):
+                self._stamps[path] = stamp
+                moved.append(path)
+        if not moved:
+            return None
+
+        changed = False
+        for path in moved:
+            digest = self._hash(path)
+            if digest != self._hashes.get(path):
+                self._hashes[path] = digest
+                changed = True
+        if not changed:
+            return None
+
+        try:
+            topology = self._parse((self.current.version if self.current else 0) + 1)
+        except (OSError, ValueError) as exc:
+            print(f"[config] not reloading, keeping the last good config: {exc}")
+            return None
+
+        self.current = topology
+        print(
+            f"[config] reloaded v{topology.version}: {len(topology.airports)} airports, hubs {', '.join(topology.hubs)}"
+        )
+        for callback in self._subscribers:
+            try:
+                callback(topology)
+            except Exception as exc:  # one bad subscriber shouldn't stop the others
+                print(f"[config] reload hook {callback!r} failed: {exc}")
+        return topology
+
+    def start(self) -> None:
+        """Poll from a daemon thread until stop()."""
+        if self._thread is not None:
+            return
+        if self.current is None:
+            self.load()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def _parse(self, version: int) -> Topology:
+        airports = load_airports(self.airports_path)
+        hubs, default_hub = load_routes(self.routes_path)
+        return Topology(airports, hubs, default_hub, version, load_transports(self.routes_path))
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[Stamp]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    @staticmethod
+    def _hash(path: str) -> Optional[str]:
+        try:
+            with open(path, "rb") as f:
+                return hashlib.sha1(f.read()).hexdigest()
+        except OSError:
+            return None
@@ -0,0 +1,522 @@
+# Load-test harness for the airport network.
+#
+# Run from the "Assignment 1" folder:
+#   python -m scripts.loadtest --airports 50 --rate 200 --duration 10
+#   python -m scripts.loadtest --engine async --routing table --out async.json
+#   python -m scripts.loadtest --compare threaded.json async.json
+#   python -m scripts.loadtest --transport udp --out udp.json   (then --compare it with a tcp run)
+#
+# What it does:
+#   1. writes a generated airports.yaml / routes.yaml into a temp folder
+#   2. starts `python -m src.main` on them as a child process (the cluster)
+#   3. runs one extra airport, ZZZ, inside this process (the probe)
+#   4. the probe fires flights ZZZ -> A >> ... >> B -> ZZZ at the target rate
+#      and times the first leg's ACK plus the full round trip back to itself
+#   5. samples /proc for connections, socket fds and CPU of both processes, and
+#      counts the cluster's context switches (every blocking socket call is one)
+#   6. prints a summary and writes everything to a JSON results file
+#
+# The cluster still leases its own scheduler plans in the background; raise
+# --background-interval to keep that noise down.
+
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from config.generate import PROBE_CODE, generate_topology
+from src.logsink import LogSink
+from src.node import Node
+from src import wire
+from src.routing import RoutingTable
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def write_config(
+    folder: Path,
+    airports: Dict[str, str],
+    hubs: List[str],
+    default_hub: Dict[str, List[str]],
+    transport: str = "tcp",
+) -> Tuple[Path, Path]:
+    """Write the topology in the format config/parser.py reads."""
+    airports_path = folder / "airports.yaml"
+    routes_path = folder / "routes.yaml"
+    lines = ["# generated by scripts/loadtest.py"]
+    lines += [f'{code}: "{addr}"' for code, addr in airports.items()]
+    airports_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    def quoted(codes: List[str]) -> str:
+        return "[" + ", ".join(f'"{code}"' for code in codes) + "]"
+
+    lines = ["# generated by scripts/loadtest.py", f"hubs: {quoted(hubs)}", "", "default_hub:"]
+    lines += [f"  {code}: {quoted(options)}" for code, options in default_hub.items()]
+    lines += ["", "transport:", f'  default: "{transport}"']
+    routes_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return airports_path, routes_path
+
+
+class ProbeNode(Node):
+    """The harness's own airport: launches test flights and notes when they come home."""
+
+    def __init__(self, airports: Dict[str, str], log_dir: Path, links_per_peer: int, transport: str = "tcp") -> None:
+        host, port_text = airports[PROBE_CODE].rsplit(":", 1)
+        super().__init__(PROBE_CODE, host, int(port_text), airports, links_per_peer=links_per_peer, transport=transport)
+        self.log_path = log_dir / "zzz.log"
+        self.sink = LogSink(mirror_stdout=False)
+        self.arrived: Dict[str, float] = {}
+        self._arrived_lock = threading.Lock()
+        self.all_home = threading.Event()
+        self.expected: Optional[int] = None
+
+    def start(self) -> None:
+        """Listener (and its arrival handlers) only; the probe doesn't lease plans from the scheduler."""
+        self.start_listener()
+
+    def stop(self) -> None:
+        super().stop()
+        self.sink.close()
+
+    def _after_arrival(self, flight: Dict[str, Any]) -> None:
+        now = time.perf_counter()
+        flight_id = flight["flight_id"]
+        if not flight_id.startswith("L"):
+            return  # a scheduler plan that happened to end here
+        with self._arrived_lock:
+            self.arrived.setdefault(flight_id, now)
+            if self.expected is not None and len(self.arrived) >= self.expected:
+                self.all_home.set()
+
+    def launch(self, flight_id: str, legs: List[str]) -> str:
+        """Send the first leg and return the ACK text (raises OSError on failure)."""
+        flight = {"flight_id": flight_id, "payload": "Load test", "legs": legs, "from_idx": 0, "to_idx": 1}
+        addr = self._lookup_airport(legs[1])
+        if self.transport == "udp":
+            return self.udp.send_wait(addr, wire.flight_frame(flight))
+        if self.pool is not None:
+            return self.pool.send(addr, flight)
+        packet = json.dumps(flight)
+        with socket.create_connection(addr) as sock:
+            sock.sendall(packet.encode("utf-8"))
+            return sock.recv(1024).decode("utf-8").strip()
+
+
+class ProcSampler:
+    """Polls /proc on Linux for connection counts, socket fds and CPU time. No-op elsewhere."""
+
+    def __init__(self, pids: Dict[str, int], ports: Set[int], interval: float = 0.25) -> None:
+        self.pids = pids
+        self.ports = ports
+        self.interval = interval
+        self.available = Path("/proc/net/tcp").exists()
+        self.peak_established = 0
+        self.peak_fds: Dict[str, int] = {name: 0 for name in pids}
+        self.samples: List[Dict[str, Any]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if not self.available:
+            return
+        self._thread = threading.Thread(target=self._run, name="proc-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def cpu_seconds(self, pid: int) -> Optional[float]:
+        """utime + stime for pid (all threads), in seconds."""
+        try:
+            stat = Path(f"/proc/{pid}/stat").read_text()
+        except OSError:
+            return None
+        fields = stat[stat.rindex(")") + 2 :].split()
+        return (int(fields[11]) + int(fields[12])) / _CLK_TCK
+
+    def established(self) -> int:
+        """ESTABLISHED TCP connections whose local end is one of our listening ports."""
+        count = 0
+        for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+            try:
+                with open(table, "r", encoding="ascii") as fh:
+                    next(fh)
+                    for line in fh:
+                        parts = line.split()
+                        if parts[3] == "01" and int(parts[1].rsplit(":", 1)[1], 16) in self.ports:
+                            count += 1
+            except OSError:
+                continue
+        return count
+
+    def socket_fds(self, pid: int) -> int:
+        try:
+            entries = os.listdir(f"/proc/{pid}/fd")
+        except OSError:
+            return 0
+        count = 0
+        for entry in entries:
+            try:
+                if os.readlink(f"/proc/{pid}/fd/{entry}").startswith("socket:"):
+                    count += 1
+            except OSError:
+                continue
+        return count
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            sample: Dict[str, Any] = {"t": round(time.perf_counter() - started, 3), "established": self.established()}
+            for name, pid in self.pids.items():
+                sample[f"{name}_socket_fds"] = fds = self.socket_fds(pid)
+                self.peak_fds[name] = max(self.peak_fds[name], fds)
+            self.peak_established = max(self.peak_established, sample["established"])
+            self.samples.append(sample)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max/mean in milliseconds (nearest-rank)."""
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None, "mean": None}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        idx = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return round(ordered[idx] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "max": round(ordered[-1] * 1000, 3),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def _wait_for_ports(addrs: List[Tuple[str, int]], timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    pending = list(addrs)
+    while pending and time.monotonic() < deadline:
+        still = []
+        for addr in pending:
+            try:
+                # an empty connection is ignored by the nodes' legacy path
+                socket.create_connection(addr, timeout=0.5).close()
+            except OSError:
+                still.append(addr)
+        pending = still
+        if pending:
+            time.sleep(0.2)
+    return not pending
+
+
+def _worker_pids(parent: int) -> Dict[str, int]:
+    """Child processes of the cluster (its --workers), so their CPU shows up too."""
+    try:
+        children = Path(f"/proc/{parent}/task/{parent}/children").read_text().split()
+    except OSError:
+        return {}
+    workers = []
+    for pid in children:
+        try:
+            if b"spawn_main" in Path(f"/proc/{pid}/cmdline").read_bytes():
+                workers.append(int(pid))  # skips multiprocessing's resource tracker
+        except OSError:
+            continue
+    return {f"worker{idx}": pid for idx, pid in enumerate(workers)}
+
+
+def _split(addr: str) -> Tuple[str, int]:
+    host, port_text = addr.rsplit(":", 1)
+    return host, int(port_text)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    airports, hubs, default_hub = generate_topology(args.airports, args.hubs, args.base_port, args.seed)
+    cluster_codes = [code for code in airports if code != PROBE_CODE]
+    routes = RoutingTable.from_config(airports, hubs, default_hub)
+    rng = random.Random(args.seed)
+
+    workdir = Path(tempfile.mkdtemp(prefix="loadtest-"))
+    airports_path, routes_path = write_config(workdir, airports, hubs, default_hub, args.transport)
+
+    probe = ProbeNode(airports, workdir, args.probe_links, args.transport)
+    probe.start()
+
+    cmd = [
+        sys.executable, "-m", "src.main",
+        "--airports", str(airports_path),
+        "--routes", str(routes_path),
+        "--exclude", PROBE_CODE,
+        "--quiet",
+        "--engine", args.engine,
+        "--routing", args.routing,
+        "--links-per-peer", str(args.links_per_peer),
+        "--workers", str(args.workers),
+        "--flight-interval", str(args.background_interval),
+    ]
+    env = dict(os.environ, PYTHONPATH=str(PROJECT_DIR))
+    cluster_out = open(workdir / "cluster.out", "w", encoding="utf-8")
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN) if resource is not None else None
+    result: Dict[str, Any] = {}
+    launched = time.perf_counter()
+    cluster = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=cluster_out, stderr=subprocess.STDOUT)
+
+    try:
+        node_addrs = [_split(airports[code]) for code in cluster_codes]
+        if not _wait_for_ports(node_addrs, args.startup_timeout):
+            raise RuntimeError(f"cluster did not come up within {args.startup_timeout}s (see {workdir / 'cluster.out'})")
+        startup_s = time.perf_counter() - launched
+        print(f"[loadtest] {len(cluster_codes)} airports up in {startup_s:.2f}s, driving {args.rate} flights/s for {args.duration}s")
+
+        ports = {port for _, port in node_addrs}
+        sampler = ProcSampler({"cluster": cluster.pid, "harness": os.getpid(), **_worker_pids(cluster.pid)}, ports)
+        cpu_before = {name: sampler.cpu_seconds(pid) for name, pid in sampler.pids.items()}
+        cpu_start = time.perf_counter()
+        sampler.start()
+
+        sent: Dict[str, Tuple[float, int]] = {}
+        leg_times: List[float] = []
+        failures: List[str] = []
+        lock = threading.Lock()
+
+        def fire(seq: int) -> None:
+            origin, dest = rng.sample(cluster_codes, 2)
+            legs = [PROBE_CODE] + routes.path(origin, dest) + [PROBE_CODE]
+            flight_id = f"L{seq:06d}"
+            started = time.perf_counter()
+            try:
+                probe.launch(flight_id, legs)
+            except (OSError, RuntimeError) as exc:
+                with lock:
+                    failures.append(f"{flight_id}: {exc}")
+                return
+            acked = time.perf_counter()
+            with lock:
+                sent[flight_id] = (started, len(legs) - 1)
+                leg_times.append(acked - started)
+
+        interval = 1.0 / args.rate
+        with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="loadtest") as executor:
+            drive_start = time.perf_counter()
+            next_at = drive_start
+            seq = 0
+            while time.perf_counter() - drive_start < args.duration:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(fire, seq)
+                seq += 1
+                next_at += interval
+        drive_s = time.perf_counter() - drive_start
+
+        probe.expected = len(sent)
+        if len(probe.arrived) >= len(sent):
+            probe.all_home.set()
+        probe.all_home.wait(args.drain)
+        sampler.stop()
+        cpu_after = {name: sampler.cpu_seconds(pid) for name, pid in sampler.pids.items()}
+        # CPU is per wall second of the whole drive + drain window, whether or not anything landed
+        cpu_window = time.perf_counter() - cpu_start
+
+        e2e: List[float] = []
+        per_leg: List[float] = []
+        last_arrival = drive_start
+        for flight_id, (started, leg_count) in sent.items():
+            arrived = probe.arrived.get(flight_id)
+            if arrived is None:
+                continue
+            e2e.append(arrived - started)
+            per_leg.append((arrived - started) / leg_count)
+            last_arrival = max(last_arrival, arrived)
+        elapsed = last_arrival - drive_start
+
+        cpu: Dict[str, Any] = {}
+        for name in sampler.pids:
+            before, after = cpu_before.get(name), cpu_after.get(name)
+            if before is None or after is None:
+                cpu[name] = None
+                continue
+            used = after - before
+            cpu[name] = {"cpu_s": round(used, 3), "cpu_pct": round(used / cpu_window * 100, 1)}
+
+        result = {
+            "label": args.label,
+            "config": {
+                "airports": len(cluster_codes),
+                "hubs": len(hubs),
+                "engine": args.engine,
+                "routing": args.routing,
+                "transport": args.transport,
+                "links_per_peer": args.links_per_peer,
+                "workers": args.workers,
+                "probe_links": args.probe_links,
+                "background_interval": args.background_interval,
+                "rate": args.rate,
+                "duration": args.duration,
+                "concurrency": args.concurrency,
+                "seed": args.seed,
+            },
+            "startup_s": round(startup_s, 3),
+            "offered": seq,
+            "sent": len(sent),
+            "failed": len(failures),
+            "completed": len(e2e),
+            "lost": len(sent) - len(e2e),
+            "send_rate": round(len(sent) / drive_s, 1),
+            "flights_per_s": round(len(e2e) / elapsed, 1) if e2e else 0.0,
+            "first_leg_ack_ms": percentiles(leg_times),
+            "per_leg_ms": percentiles(per_leg),
+            "end_to_end_ms": percentiles(e2e),
+            "connections": {
+                "peak_established": sampler.peak_established if sampler.available else None,
+                "peak_socket_fds": sampler.peak_fds if sampler.available else None,
+            },
+            "cpu": cpu,
+            "context_switches": None,
+            "samples": sampler.samples,
+            "errors": failures[:20],
+            "workdir": str(workdir),
+        }
+        return result
+    finally:
+        if cluster.poll() is None:
+            cluster.send_signal(signal.SIGINT)
+            try:
+                cluster.wait(10)
+            except subprocess.TimeoutExpired:
+                cluster.kill()
+                cluster.wait()
+        cluster_out.close()
+        probe.stop()
+        if usage_before is not None and result:
+            # whole run including startup, but the same for every transport; only there once the cluster was reaped
+            usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            result["context_switches"] = {
+                "voluntary": usage.ru_nvcsw - usage_before.ru_nvcsw,
+                "involuntary": usage.ru_nivcsw - usage_before.ru_nivcsw,
+            }
+
+
+def _fmt(stats: Optional[Dict[str, Any]], key: str) -> str:
+    value = stats.get(key) if stats else None
+    return "-" if value is None else f"{value}"
+
+
+def print_summary(result: Dict[str, Any]) -> None:
+    cfg = result["config"]
+    print(
+        f"[loadtest] {result['label'] or 'run'}: {cfg['airports']} airports, engine={cfg['engine']}, "
+        f"routing={cfg['routing']}, transport={cfg.get('transport', 'tcp')}, links/peer={cfg['links_per_peer']}"
+    )
+    print(
+        f"  flights: offered {result['offered']}, sent {result['sent']}, failed {result['failed']}, "
+        f"completed {result['completed']}, lost {result['lost']}"
+    )
+    print(f"  throughput: {result['flights_per_s']} flights/s completed (sent at {result['send_rate']}/s)")
+    for name in ("first_leg_ack_ms", "per_leg_ms", "end_to_end_ms"):
+        stats = result[name]
+        print(
+            f"  {name:<17} p50 {_fmt(stats, 'p50'):>9}  p95 {_fmt(stats, 'p95'):>9}  "
+            f"p99 {_fmt(stats, 'p99'):>9}  max {_fmt(stats, 'max'):>9}"
+        )
+    conns = result["connections"]
+    print(f"  connections: peak established {conns['peak_established']}, peak socket fds {conns['peak_socket_fds']}")
+    for name, usage in result["cpu"].items():
+        print(f"  cpu {name}: {usage['cpu_s']}s ({usage['cpu_pct']}%)" if usage else f"  cpu {name}: n/a")
+    switches = result.get("context_switches")
+    if switches:
+        print(f"  cluster context switches: {switches['voluntary']} voluntary, {switches['involuntary']} involuntary")
+
+
+def compare(paths: List[str]) -> None:
+    """Side-by-side table of the headline numbers from earlier results files."""
+    results = [json.loads(Path(path).read_text(encoding="utf-8")) for path in paths]
+    rows = [
+        ("label", lambda r: r.get("label") or "-"),
+        ("engine", lambda r: r["config"]["engine"]),
+        ("routing", lambda r: r["config"]["routing"]),
+        ("transport", lambda r: r["config"].get("transport", "tcp")),
+        ("airports", lambda r: r["config"]["airports"]),
+        ("flights/s", lambda r: r["flights_per_s"]),
+        ("lost", lambda r: r["lost"]),
+        ("leg p50 ms", lambda r: r["first_leg_ack_ms"]["p50"]),
+        ("leg p99 ms", lambda r: r["first_leg_ack_ms"]["p99"]),
+        ("e2e p50 ms", lambda r: r["end_to_end_ms"]["p50"]),
+        ("e2e p99 ms", lambda r: r["end_to_end_ms"]["p99"]),
+        ("peak conns", lambda r: r["connections"]["peak_established"]),
+        ("cluster cpu s", lambda r: (r["cpu"].get("cluster") or {}).get("cpu_s")),
+        ("ctx switches", lambda r: (r.get("context_switches") or {}).get("voluntary")),
+    ]
+    width = max(14, *(len(Path(p).name) + 2 for p in paths))
+    print(" " * 15 + "".join(f"{Path(p).name:>{width}}" for p in paths))
+    for title, getter in rows:
+        print(f"{title:<15}" + "".join(f"{str(getter(r)):>{width}}" for r in results))
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drive flights through a generated airport network and measure it")
+    parser.add_argument("--airports", type=int, default=20, help="airports in the generated network")
+    parser.add_argument("--hubs", type=int, default=3, help="how many of them are hubs")
+    parser.add_argument("--rate", type=float, default=50.0, help="target flights per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to drive traffic")
+    parser.add_argument("--drain", type=float, default=10.0, help="seconds to wait for flights still in the air")
+    parser.add_argument("--concurrency", type=int, default=32, help="flights the probe can have waiting on a first ACK")
+    parser.add_argument("--engine", choices=("threaded", "async"), default="threaded")
+    parser.add_argument("--routing", choices=("source", "table"), default="source")
+    parser.add_argument("--transport", choices=("tcp", "udp"), default="tcp", help="how every airport (and the probe) sends legs")
+    parser.add_argument("--links-per-peer", type=int, default=4, help="passed through to src.main")
+    parser.add_argument("--workers", type=int, default=1, help="passed through to src.main (0 = one per CPU)")
+    parser.add_argument("--probe-links", type=int, default=16, help="pooled links from the probe to each airport")
+    parser.add_argument(
+        "--background-interval",
+        type=float,
+        default=5.0,
+        help="--flight-interval for the cluster's own scheduler traffic",
+    )
+    parser.add_argument("--base-port", type=int, default=7001, help="first port of the generated network")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--label", default="", help="name for this run in the results file")
+    parser.add_argument("--out", default="loadtest_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS", help="compare earlier results files and exit")
+    args = parser.parse_args(argv)
+    if args.airports < 2:
+        parser.error("--airports must be at least 2")
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = _parse_args(argv)
+    if args.compare:
+        compare(args.compare)
+        return
+    result = run(args)
+    print_summary(result)
+    Path(args.out).write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+    print(f"[loadtest] results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,23 @@
 import json
+import mmap
 import random
 import os
+import struct
 
 config_folder = os.path.join(os.path.dirname(__file__), "..", "config") # GPT Line
 first_names = os.path.join(config_folder, "first-names.json")
 last_names = os.path.join(config_folder, "last-names.json")
+# compiled, already title-cased copy of the two JSON files (rebuilt when they change)
+compiled_names = os.path.join(config_folder, "names.bin")
+
+# names.bin layout: header, then the first names joined by "\n", a NUL, the last names joined by "\n"
+_MAGIC = b"NAMES\x00\x00\x01"
+_HEADER = struct.Struct(">8sII")  # magic, first count, last count
 
 _FIRST_NAMES = None
 _LAST_NAMES = None
+_FIRST_TITLED = None
+_LAST_TITLED = None
 
 def _read_json_array(path):
     # return a list of strings loaded from a JSON file at path
@@ -20,10 +30,11 @@ def _read_json_array(path):
         ) from e
     except json.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON in {path}: {e}") from e
-    
+
     return data
 
 def _ensure_loaded():
+    # raw JSON names, only needed for titlecase=False
     global _FIRST_NAMES, _LAST_NAMES
 
     if _FIRST_NAMES is None:
@@ -31,19 +42,104 @@ def _ensure_loaded():
     if _LAST_NAMES is None:
         _LAST_NAMES = _read_json_array(last_names)
 
+def compile_names(out_path=compiled_names):
+    # parse the JSON once, title-case everything, write names.bin; returns (firsts, lasts)
+    firsts = [name.title() for name in _read_json_array(first_names)]
+    lasts = [name.title() for name in _read_json_array(last_names)]
+    body = "\n".join(firsts).encode("utf-8") + b"\x00" + "\n".join(lasts).encode("utf-8")
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, len(firsts), len(lasts)))
+        f.write(body)
+    os.replace(tmp_path, out_path)  # readers never see half a file
+    return tuple(firsts), tuple(lasts)
+
+def _read_compiled(path):
+    # map names.bin and split it back into two tuples; None if it's missing or not ours
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, first_count, last_count = _HEADER.unpack_from(data)
+            if magic != _MAGIC:
+                return None
+            first_blob, last_blob = data[_HEADER.size:].split(b"\x00")
+    except (OSError, ValueError, struct.error):
+        return None
+    firsts = tuple(first_blob.decode("utf-8").split("\n"))
+    lasts = tuple(last_blob.decode("utf-8").split("\n"))
+    if len(firsts) != first_count or len(lasts) != last_count:
+        return None
+    return firsts, lasts
+
+def _is_stale(path):
+    try:
+        built = os.path.getmtime(path)
+    except OSError:
+        return True
+    return any(os.path.getmtime(src) > built for src in (first_names, last_names))
+
+def _ensure_compiled():
+    # title-cased name tables, from names.bin (built on first use if needed)
+    global _FIRST_TITLED, _LAST_TITLED
+
+    if _FIRST_TITLED is not None:
+        return
+    tables = None if _is_stale(compiled_names) else _read_compiled(compiled_names)
+    if tables is None:
+        try:
+            tables = compile_names()
+        except OSError:
+            # read-only checkout or similar; just build it in memory this time
+            tables = (
+                tuple(name.title() for name in _read_json_array(first_names)),
+                tuple(name.title() for name in _read_json_array(last_names)),
+            )
+    _FIRST_TITLED, _LAST_TITLED = tables
+
 def random_full_name(seperator=" ", titlecase=True, rng=None):
 # return a random full name
     # returns = "Alice Johnson"
 
-    _ensure_loaded()
+    if titlecase:
+        _ensure_compiled()
+        firsts, lasts = _FIRST_TITLED, _LAST_TITLED
+    else:
+        _ensure_loaded()
+        firsts, lasts = _FIRST_NAMES, _LAST_NAMES
 
     chooser = rng.choice if rng is not None else random.choice
 
-    first = chooser(_FIRST_NAMES)
-    last = chooser(_LAST_NAMES)
+    return f"{chooser(firsts)}{seperator}{chooser(lasts)}"
 
-    if titlecase:
-        first = first.title()
-        last = last.title()
+def random_full_names(n, rng=None, seperator=" "):
+    # n title-cased full names in one go, e.g. ["Alice Johnson", "Neal Hart", ...]
+    # same rng seed -> same list. choices(k=n) draws every index in one call and
+    # map(join) glues them in C, so a few thousand names cost well under a millisecond.
+
+    _ensure_compiled()
+    rng = rng if rng is not None else random
+    firsts = rng.choices(_FIRST_TITLED, k=n)
+    lasts = rng.choices(_LAST_TITLED, k=n)
+    return list(map(seperator.join, zip(firsts, lasts)))
+
+class NameStream:
+    # callable that returns one name per call but draws them from rng in batches
+    # (what the scheduler uses, one per thread)
+
+    def __init__(self, rng=None, batch=256, seperator=" "):
+        self.rng = rng
+        self.batch = batch
+        self.seperator = seperator
+        self._names = iter(())
+
+    def __call__(self):
+        name = next(self._names, None)
+        if name is None:
+            self._names = iter(random_full_names(self.batch, self.rng, self.seperator))
+            name = next(self._names)
+        return name
 
-    return f"{first}{seperator}{last}"
\ No newline at end of file
+if __name__ == "__main__":
+    # python -m scripts.name_generator  -> (re)build config/names.bin and show a few
+    firsts, lasts = compile_names()
+    print(f"wrote {compiled_names}: {len(firsts)} first names, {len(lasts)} last names")
+    print(random_full_names(5, random.Random(1)))
@@ -0,0 +1,581 @@
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from . import wire
+from .node import BUSY_RETRIES, IDLE_YIELD, QUEUE_WAIT, WINDOW_POLL, Node
+from .pool import LINK_HELLO, LINK_OK, AsyncConnectionPool
+from .scheduler import SCHEDULER_HOST, SCHEDULER_PORT
+from .workers import SHED_READ_TIMEOUT, busy_reply, retry_hint
+
+# asyncio flavour of Node. Same packets, same log lines, but every airport's
+# listener, forwarding and scheduler polling share one event loop instead of
+# a thread per arrival.
+
+
+class AsyncRuntime:
+    """Owns the shared event loop that all AsyncNodes run on."""
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Spin the loop up in a daemon thread so main() stays in charge."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def submit(self, coro) -> "asyncio.Future":
+        """Schedule a coroutine on the loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self) -> None:
+        """Cancel whatever is still flying and stop the loop."""
+        if self._thread is None:
+            return
+        try:
+            self.submit(self._cancel_all()).result(timeout=2.0)
+        except Exception:
+            pass  # loop is going away anyway
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2.0)
+        self._thread = None
+
+    async def _cancel_all(self) -> None:
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class AsyncNode(Node):
+    """Node that speaks the same protocol but runs as coroutines on a shared loop."""
+
+    def __init__(
+        self,
+        code: str,
+        listen_host: str,
+        listen_port: int,
+        airports: Dict[str, str],
+        runtime: AsyncRuntime,
+        links_per_peer: int = 4,
+        **options,
+    ) -> None:
+        # the threaded pool is never used here; the async one below replaces it
+        super().__init__(code, listen_host, listen_port, airports, links_per_peer=0, **options)
+        self.runtime = runtime
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.async_pool: Optional[AsyncConnectionPool] = (
+            AsyncConnectionPool(self.code, links_per_peer) if links_per_peer > 0 else None
+        )
+        # the v5 scheduler session's writer (see _to_scheduler) and the launches in flight on the loop
+        self._scheduler_writer: Optional[asyncio.StreamWriter] = None
+        self._launches: Set["asyncio.Task"] = set()
+        # same limits as the threaded handler pool (self.arrivals, never started here), counted on the loop:
+        # `_admitted` connections in total, `_waiting` of them for one of the gate's slots
+        self._gate: Optional[asyncio.Semaphore] = None
+        self._admitted = 0
+        self._waiting = 0
+
+    def stop(self) -> None:
+        """Stop taking arrivals and plans; open connections run to completion."""
+        self.running = False
+        if self._server is not None:
+            self.runtime.loop.call_soon_threadsafe(self._server.close)
+        if self.async_pool is not None:
+            self.runtime.submit(self.async_pool.close())
+        self.udp.close()
+        self.window.wake()
+        self._drop_gauges()
+        self._log(f"Node {self.code} stopped.")
+
+    def _open_links(self) -> int:
+        return self.async_pool.stats()["open"] if self.async_pool is not None else 0
+
+    def _queue_depth(self) -> int:
+        return self._waiting
+
+    def start_listener(self) -> None:
+        """Bind the listener on the shared loop; `ready` is set once the port is bound."""
+        if self.running:
+            return
+        self.running = True
+        # the UDP side keeps its own receive thread and hands legs to the loop (see _on_datagrams)
+        self._open_udp()
+        self.runtime.submit(self._serve_forever())
+        self._log(f"Node {self.code} started on {self.listen_host}:{self.listen_port}")
+
+    def start_flying(self) -> None:
+        """Start the scheduler loop on the shared loop (only once)."""
+        if self._flying or not self.running:
+            return
+        self._flying = True
+        self.runtime.submit(self._request_and_fly())
+
+    async def _serve_forever(self) -> None:
+        """Accept inbound flights; each connection is a task, not a thread."""
+        try:
+            self._server = await asyncio.start_server(
+                self._handle_arrival,
+                self.listen_host,
+                self.listen_port,
+                reuse_address=True,
+                backlog=self.backlog,
+            )
+        except OSError as exc:
+            self.running = False
+            self._log(f"Could not listen on {self.listen_host}:{self.listen_port}: {exc}")
+            return
+        self.ready.set()
+        self._log("Ready for arrivals.")
+
+    async def _handle_arrival(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Admit one inbound connection (or shed it), then serve it until it closes."""
+        addr = writer.get_extra_info("peername")
+        handlers = self.arrivals.workers
+        if self._admitted >= handlers + self.arrivals.queue_size:
+            await self._turn_away(reader, writer, addr)
+            return
+        if self._gate is None:
+            self._gate = asyncio.Semaphore(handlers)
+        self._admitted += 1
+        try:
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._gate.acquire(), QUEUE_WAIT)
+            except asyncio.TimeoutError:
+                await self._turn_away(reader, writer, addr)
+                return
+            finally:
+                self._waiting -= 1
+            try:
+                await self._serve_arrival(reader, writer, addr)
+            finally:
+                self._gate.release()
+        finally:
+            self._admitted -= 1
+
+    async def _turn_away(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, addr) -> None:
+        """Shed a connection on the loop, like workers.turn_away: BUSY in its own protocol, then close."""
+        retry_after = retry_hint(self._waiting, self.arrivals.workers)
+        self._note_shed(addr, retry_after, self._waiting)
+        try:
+            try:
+                first = await asyncio.wait_for(reader.read(4096), SHED_READ_TIMEOUT)
+            except asyncio.TimeoutError:
+                first = b""
+            writer.write(busy_reply(first, retry_after, self._waiting))
+            await writer.drain()
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_arrival(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, addr) -> None:
+        """Work out which protocol the peer speaks from the first bytes and serve it."""
+        self._inbound.inc()
+        try:
+            first = await reader.read(1024)
+            if wire.is_framed(first):
+                await self._serve_frames(reader, writer, addr, first)
+                return
+
+            try:
+                raw = first.decode("utf-8").strip()
+            except UnicodeDecodeError:
+                self._log(f"Arrival from {addr}: not UTF-8 text, closing.")
+                return
+            if not raw:
+                return
+
+            if raw.startswith(f"{LINK_HELLO} "):
+                await self._serve_link(reader, writer, addr)
+                return
+
+            flight = self._try_parse_flight_message(raw)
+            if not flight:
+                self._log(f"Arrival from {addr}: {raw}")
+                writer.write(f"ACK from {self.code}".encode("utf-8"))
+                await writer.drain()
+                return
+
+            self._log_arrival(flight)
+            writer.write(f"ACK from {self.code}".encode("utf-8"))
+            await writer.drain()
+            # threaded Node closes after forwarding too, keep that ordering
+            await self._after_arrival(flight)
+        except (OSError, asyncio.CancelledError):
+            pass  # peer went away or the runtime is shutting down
+        finally:
+            self._inbound.dec()
+            writer.close()
+
+    async def _serve_link(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, addr) -> None:
+        """Pooled link: one JSON flight per line, one ACK line back."""
+        writer.write(f"{LINK_OK}\n".encode("utf-8"))
+        await writer.drain()
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            try:
+                raw = line.decode("utf-8").strip()
+            except UnicodeDecodeError:
+                self._log(f"Arrival from {addr}: not UTF-8 text, closing the link.")
+                return
+            if not raw:
+                continue
+            flight = self._try_parse_flight_message(raw)
+            if not flight:
+                self._log(f"Arrival from {addr}: {raw}")
+                writer.write(f"ACK from {self.code}\n".encode("utf-8"))
+                await writer.drain()
+                continue
+
+            self._log_arrival(flight)
+            writer.write(f"ACK from {self.code}\n".encode("utf-8"))
+            await writer.drain()
+            await self._after_arrival(flight)
+
+    async def _serve_frames(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, addr, first: bytes) -> None:
+        """Framed link: HELLO handshake, then FLIGHT frames in and ACK frames out."""
+        prefix = bytearray(first)
+        try:
+            frame = await wire.read_frame_async(reader, prefix)
+            if frame is None or frame[1] != wire.HELLO:
+                return
+            writer.write(wire.encode_hello(self.code, wire.negotiate(frame[0])))
+            await writer.drain()
+
+            while True:
+                if not prefix:
+                    # between frames: an idle link gives its slot back if others are queued for one
+                    try:
+                        first = await asyncio.wait_for(reader.read(1), IDLE_YIELD)
+                    except asyncio.TimeoutError:
+                        if self._waiting or not self.running:
+                            return
+                        continue
+                    if not first:
+                        return
+                    prefix += first
+                frame = await wire.read_frame_async(reader, prefix)
+                if frame is None:
+                    return
+                _, frame_type, body = frame
+                if frame_type == wire.FLIGHT:
+                    flight = wire.decode_flight_body(body)
+                elif frame_type == wire.ROUTED:
+                    flight = wire.decode_routed_body(body)
+                else:
+                    self._log(f"Arrival from {addr}: unexpected frame type {frame_type}")
+                    continue
+
+                self._log_arrival(flight)
+                writer.write(wire.encode_ack(self.code))
+                await writer.drain()
+                await self._after_arrival(flight)
+        except wire.FrameError as exc:
+            self._log(f"Bad frame from {addr}: {exc}")
+
+    def _on_datagrams(self, arrivals) -> None:
+        """UDP legs, already ACKed by the transport; forwarding happens on the loop, not the receive thread."""
+        for frame_type, body, addr in arrivals:
+            try:
+                flight = wire.decode_flight_frame(frame_type, body)
+            except wire.FrameError as exc:
+                self._log(f"Bad datagram from {addr}: {exc}")
+                continue
+            self._log_arrival(flight)
+            self.runtime.submit(self._after_arrival(flight))
+
+    async def _after_arrival(self, flight) -> None:
+        """Forward the flight to its next leg, or mark it done if we are the last stop."""
+        if "dest" in flight:
+            if flight["dest"] == self.code:
+                self._landed(flight)
+            elif self.running:
+                await self._send_routed(flight["flight_id"], flight["payload"], flight["origin"], flight["dest"], flight["hops"])
+            return
+
+        legs: List[str] = flight["legs"]
+        to_idx: int = flight["to_idx"]
+        if to_idx < len(legs) - 1 and self.running:
+            await self._send_leg(legs, flight["payload"], flight["flight_id"], to_idx)
+        elif to_idx == len(legs) - 1:
+            self._landed(flight)
+
+    def _to_scheduler(self, frame: bytes) -> bool:
+        """Queue a frame on the v5 scheduler session. Safe from any thread (UDP callbacks aren't on the loop)."""
+        writer = self._scheduler_writer
+        if writer is None or writer.is_closing():
+            return False
+        self.runtime.loop.call_soon_threadsafe(writer.write, frame)
+        return True
+
+    async def _request_and_fly(self) -> None:
+        """Keeps registering with scheduler until stopped."""
+        failures = 0
+        while self.running:
+            try:
+                reader, writer = await asyncio.open_connection(SCHEDULER_HOST, SCHEDULER_PORT)
+                failures = 0
+                try:
+                    if self._scheduler_framed:
+                        if not await self._request_and_fly_framed(reader, writer):
+                            continue  # scheduler only speaks text, ask again the old way
+                    else:
+                        writer.write(self.code.encode("utf-8"))
+                        await writer.drain()
+                        plan = (await reader.read(1024)).decode("utf-8").strip()
+                        busy = wire.parse_busy_text(plan)
+                        if busy is not None:
+                            raise busy
+                        if not plan.startswith("FLIGHT"):
+                            self._log(f"Got odd plan text: {plan}")
+                            await asyncio.sleep(1.0)
+                            continue
+
+                        self._log(f"Received plan: {plan}")
+                        legs, payload, flight_id = self._parse_plan(plan)
+                        await self._fly_route(legs, payload, flight_id)
+                        writer.write(f"{self.code} complete".encode("utf-8"))
+                        await writer.drain()
+                finally:
+                    writer.close()
+            except wire.PeerBusy as busy:
+                self._busy_scheduler.inc()
+                self._scheduler_down(
+                    int(self._busy_scheduler.value), f"Scheduler is busy ({busy.depth} queued), retrying in {busy.retry_after * 1000:.0f} ms."
+                )
+                await asyncio.sleep(self._busy_wait(busy))
+                continue
+            except ConnectionRefusedError:
+                failures += 1
+                self._scheduler_down(failures, "Scheduler is offline, could not register.")
+            except OSError as exc:
+                failures += 1
+                self._scheduler_down(failures, f"Network error while flying: {exc}")
+
+            if not self.running:
+                break
+            await asyncio.sleep(self._backoff(failures) if failures else 1.0)
+
+    async def _request_and_fly_framed(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """Framed scheduler session (see Node._request_and_fly_framed). False if text-only."""
+        writer.write(wire.encode_hello(self.code))
+        await writer.drain()
+        prefix = bytearray()
+        try:
+            first = await reader.read(1024)
+            if not wire.is_framed(first):
+                self._scheduler_framed = False
+                return False
+            prefix += first
+            frame = await wire.read_frame_async(reader, prefix)
+            if frame is not None and frame[1] == wire.BUSY:
+                raise wire.decode_busy_body(frame[2])
+            if frame is None or frame[1] != wire.HELLO:
+                self._scheduler_framed = False
+                return False
+            version = wire.negotiate(frame[0])
+        except wire.FrameError as exc:
+            self._log(f"Got odd plan frame: {exc}")
+            return True
+
+        if version < wire.LEASE_VERSION:
+            writer.write(wire.encode_frame(wire.REGISTER, self.code.encode("ascii")))
+            await writer.drain()
+            plan = await self._read_plan(reader, prefix)
+            if plan is not None:
+                await self._fly_plan(writer, plan)
+            return True
+
+        if version >= wire.COMPLETE_VERSION:
+            await self._windowed_session(reader, writer, prefix)
+            return True
+
+        while self.running:
+            writer.write(wire.encode_lease(self.code, self.lease_size))
+            await writer.drain()
+            plans = [await self._read_plan(reader, prefix) for _ in range(self.lease_size)]
+            for plan in plans:
+                if plan is not None and self.running:
+                    await self._fly_plan(writer, plan)
+            if self.running:
+                await asyncio.sleep(self.flight_interval)
+        return True
+
+    async def _windowed_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, prefix: bytearray) -> None:
+        """Node._windowed_session on the loop: a reader task instead of a thread, an Event instead of blocking."""
+        loop = self.runtime.loop
+        room_changed = asyncio.Event()
+        self.window.on_room = lambda: loop.call_soon_threadsafe(room_changed.set)
+        self._scheduler_writer = writer
+        read_task = asyncio.ensure_future(self._read_session(reader, prefix))
+        try:
+            while self.running and not read_task.done():
+                for flight_id in self.window.expire():
+                    self._give_up(flight_id, f"no landing report after {self.window.timeout:g}s")
+                room_changed.clear()
+                room = min(self.window.room(), self.lease_size)
+                if room <= 0:
+                    wait = WINDOW_POLL
+                    deadline = self.window.next_deadline()
+                    if deadline is not None:
+                        wait = max(0.0, min(wait, deadline - time.monotonic()))
+                    try:
+                        await asyncio.wait_for(room_changed.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                self.window.reserve(room)
+                writer.write(wire.encode_lease(self.code, room))
+                await writer.drain()
+                if self.flight_interval:
+                    await asyncio.sleep(self.flight_interval)
+        finally:
+            self._scheduler_writer = None
+            self.window.on_room = None
+            read_task.cancel()
+            await asyncio.gather(read_task, return_exceptions=True)
+            dropped = self.window.clear()
+            if dropped:
+                self._log(f"Scheduler session ended with {dropped} flights not reported landed yet.")
+
+    async def _read_session(self, reader: asyncio.StreamReader, prefix: bytearray) -> None:
+        """Reader half of _windowed_session: PLANs to launch, COMPLETEs to settle."""
+        try:
+            while True:
+                frame = await wire.read_frame_async(reader, prefix)
+                if frame is None:
+                    return
+                _, frame_type, body = frame
+                if frame_type == wire.PLAN:
+                    plan = self._decode_plan(body)
+                    if plan is None or not self.running:
+                        self.window.unreserve()
+                        continue
+                    self.window.launched(plan[2])
+                    task = asyncio.ensure_future(self._launch(plan))
+                    self._launches.add(task)
+                    task.add_done_callback(self._launches.discard)
+                elif frame_type == wire.COMPLETE:
+                    self._confirmed(*wire.decode_complete_body(body)[1:])
+                else:
+                    self._log(f"Got odd plan frame: {frame_type}")
+        except (OSError, wire.FrameError, UnicodeDecodeError) as exc:
+            if self.running:
+                self._log(f"Lost the scheduler session: {exc}")
+        finally:
+            self.window.wake()
+
+    async def _launch(self, plan) -> None:
+        legs, payload, flight_id = plan
+        self._log(f"Received plan: {wire.format_plan(legs, payload, flight_id)}")
+        if not await self._fly_route(legs, payload, flight_id) and self.window.finish(flight_id):
+            self._give_up(flight_id, "it never left")
+
+    async def _read_plan(self, reader: asyncio.StreamReader, prefix: bytearray):
+        frame = await wire.read_frame_async(reader, prefix)
+        if frame is None:
+            raise ConnectionResetError("scheduler closed the session")
+        if frame[1] != wire.PLAN:
+            self._log(f"Got odd plan frame: {frame[1]}")
+            return None
+        return self._decode_plan(frame[2])
+
+    async def _fly_plan(self, writer: asyncio.StreamWriter, plan) -> None:
+        legs, payload, flight_id = plan
+        self._log(f"Received plan: {wire.format_plan(legs, payload, flight_id)}")
+        await self._fly_route(legs, payload, flight_id)
+        writer.write(wire.encode_frame(wire.DONE, flight_id.encode("ascii")))
+        await writer.drain()
+
+    async def _fly_route(self, legs: List[str], payload: str, flight_id: str) -> bool:
+        """Dispatch the first leg; downstream nodes forward the rest. False if it didn't leave."""
+        self._trace(flight_id, "plan", route=legs)
+        if len(legs) <= 1:
+            self._log(f"Flight {flight_id}: no legs to fly, staying put.")
+            return False
+
+        if self.routes is not None:
+            return await self._send_routed(flight_id, payload, self.code, legs[-1], 0)
+        return await self._send_leg(legs, payload, flight_id, 0)
+
+    async def _send_leg(self, legs: List[str], payload: str, flight_id: str, from_idx: int) -> bool:
+        """Send the next leg in the route starting from legs[from_idx]."""
+        to_idx = from_idx + 1
+        if to_idx >= len(legs):
+            return False
+
+        target_code = legs[to_idx]
+        flight = {
+            "flight_id": flight_id,
+            "payload": payload,
+            "legs": legs,
+            "from_idx": from_idx,
+            "to_idx": to_idx,
+        }
+        verb = "Forwarded" if from_idx > 0 else "Sent"
+        (self._legs_forwarded if from_idx > 0 else self._legs_sent).inc()
+        return await self._send_flight(target_code, flight, f"{verb} flight {flight_id}: {legs[from_idx]} -> {target_code} carrying {payload}")
+
+    async def _send_routed(self, flight_id: str, payload: str, origin: str, dest: str, hops: int) -> bool:
+        """Forward a routed flight one hop closer to dest using the routing table."""
+        flight = self._routed_packet(flight_id, payload, origin, dest, hops)
+        if flight is None:
+            return False
+        target_code = flight["legs"][1]
+        verb = "Forwarded" if origin != self.code else "Sent"
+        (self._legs_forwarded if origin != self.code else self._legs_sent).inc()
+        return await self._send_flight(target_code, flight, f"{verb} flight {flight_id}: {self.code} -> {target_code} carrying {payload}")
+
+    async def _send_flight(self, target_code: str, flight, summary: str) -> bool:
+        """Hand one packet to target_code (pooled link or one-shot) and log the reply. False if it failed."""
+        self._trace_leg("depart", flight, to=target_code)
+        try:
+            host, port = self._lookup_airport(target_code)
+            if self.transport == "udp" and self.udp.sock is not None:
+                self._send_datagram((host, port), target_code, flight, summary)
+                return True
+            started = time.perf_counter()
+            for attempt in range(1, BUSY_RETRIES + 1):
+                try:
+                    ack = await self._deliver_leg_async((host, port), flight)
+                    break
+                except wire.PeerBusy as busy:
+                    self._busy_peer.inc()
+                    if attempt == BUSY_RETRIES or not self.running:
+                        raise
+                    await asyncio.sleep(self._busy_wait(busy))
+            self._ack_latency.observe(time.perf_counter() - started)
+            self._log(f"{summary} | Reply: {ack}")
+            self._trace_leg("ack", flight, to=target_code)
+            return True
+        except (OSError, RuntimeError) as exc:
+            self._connect_failures.inc()
+            self._log(f"Could not reach {target_code} for flight {flight['flight_id']}: {exc}")
+            self._trace_leg("fail", flight, to=target_code, reason=str(exc))
+            return False
+
+    async def _deliver_leg_async(self, addr, flight) -> str:
+        """One TCP attempt at a leg (see Node._deliver_leg)."""
+        if self.async_pool is not None:
+            return await self.async_pool.send(addr, flight)
+        packet = wire.flight_json(flight["flight_id"], flight["payload"], flight["legs"], flight["from_idx"], flight["to_idx"])
+        reader, writer = await asyncio.open_connection(*addr)
+        try:
+            writer.write(packet.encode("utf-8"))
+            await writer.drain()
+            ack = (await reader.read(1024)).decode("utf-8").strip()
+        finally:
+            writer.close()
+        busy = wire.parse_busy_text(ack)
+        if busy is not None:
+            raise busy
+        return ack
@@ -0,0 +1,214 @@
+import random
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Load-aware destination and layover picks for the scheduler.
+#
+# Picking uniformly ignores where the traffic already is: with routes.yaml
+# almost every destination lays over at ANC, so ANC drowns while SEA idles.
+# Instead the scheduler keeps a live load per airport, the number of its
+# plans in the air that land at or pass through it (+1 when a plan goes out,
+# -1 when COMPLETE/DONE settles it or the session drops it). By Little's law
+# that's arrival rate times time spent, so a slow hub looks loaded too.
+#
+# Destination and layover are drawn together, as a (hub, destination) pair:
+#   P(h, d) ~ w(load h) * w(load d) / len(d's layover options),  h in d's options
+# so a destination is picked by how idle it is times how idle its hubs are
+# on average, and given d the layover goes by w(load h) alone. With every
+# load at 0 that's exactly the old uniform pick. w(load) = SCALE // (1 + load)^2:
+# an airport with ~40% more in the air than another gets half its share,
+# which pulls things back into line quickly without starving anything.
+#
+# Each hub has a Fenwick tree over the destinations it serves (a direct
+# flight counts as hub ""), and a Fenwick tree over the hubs holds
+# w(load h) * that hub's total. A pick is a walk down both trees: O(log n).
+# A hub's load changing is one update in the hub tree; a destination's is an
+# update in the tree of each hub it can lay over at (one or two) plus those
+# hubs' entries up top. Also O(log n), however many airports sit behind a hub.
+#
+# Only with source routing, though. Under --routing table each node rebuilds
+# the path from its own routing table and ignores the plan's layover, so the
+# loads counted here wouldn't be the hubs flights really pass through, and
+# steering by them would do nothing. balance_mode() turns it off there.
+
+SCALE = 1 << 30  # w(0); big enough that w doesn't bottom out at 1 until ~32k flights
+ORIGIN_RETRIES = 8  # redraws when the pick lands on the origin itself
+DIRECT = ""  # the "hub" direct flights go through
+
+
+def balance_mode(balance: str, routing: str) -> str:
+    """The balance setting that actually applies: "load" falls back to "uniform" under table routing."""
+    return "uniform" if balance == "load" and routing == "table" else balance
+
+
+def weight(load: int) -> int:
+    if load < len(_WEIGHTS):
+        return _WEIGHTS[load]
+    return max(1, SCALE // (1 + load) ** 2)
+
+
+# the loads that actually come up, worked out once
+_WEIGHTS = [SCALE // (1 + load) ** 2 for load in range(4096)]
+
+
+class Fenwick:
+    """Integer weights with O(log n) update and O(log n) weighted pick."""
+
+    def __init__(self, weights: Sequence[int]) -> None:
+        n = len(weights)
+        self._weights = list(weights)
+        tree = [0] * (n + 1)
+        for i, w in enumerate(self._weights, 1):
+            tree[i] += w
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._total = sum(self._weights)
+        self._top = 1 << (n.bit_length() - 1) if n else 0
+
+    def total(self) -> int:
+        return self._total
+
+    def set(self, i: int, w: int) -> None:
+        delta = w - self._weights[i]
+        if not delta:
+            return
+        self._weights[i] = w
+        self._total += delta
+        tree = self._tree
+        n = len(tree) - 1
+        i += 1
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+
+    def find(self, target: int) -> int:
+        """Index whose slice of the running total covers target (0 <= target < total())."""
+        tree = self._tree
+        n = len(tree) - 1
+        pos = 0
+        step = self._top
+        while step:
+            nxt = pos + step
+            if nxt <= n and tree[nxt] <= target:
+                pos = nxt
+                target -= tree[nxt]
+            step >>= 1
+        return pos
+
+    def sample(self, rng: random.Random) -> int:
+        return self.find(int(rng.random() * self._total))
+
+
+class LoadBalancer:
+    """Per-airport load and the weighted (destination, layover) picks that steer flights around it."""
+
+    def __init__(
+        self,
+        codes: Sequence[str],
+        layovers: Dict[str, Tuple[str, ...]],
+        loads: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self._lock = threading.Lock()
+        self.loads: Dict[str, int] = {code: n for code, n in (loads or {}).items() if n > 0}
+        self._hub_index: Dict[str, int] = {}
+        self._hubs: List[str] = []
+        members: List[List[str]] = []
+        # destination -> [(hub index, slot in that hub's tree)], and how many hubs it's split over
+        self._slots: Dict[str, List[Tuple[int, int]]] = {}
+        self._share: Dict[str, int] = {}
+        for code in codes:
+            options = tuple(dict.fromkeys(layovers.get(code, ()))) or (DIRECT,)
+            self._share[code] = len(options)
+            slots = self._slots[code] = []
+            for hub in options:
+                idx = self._hub_index.get(hub)
+                if idx is None:
+                    idx = self._hub_index[hub] = len(self._hubs)
+                    self._hubs.append(hub)
+                    members.append([])
+                slots.append((idx, len(members[idx])))
+                members[idx].append(code)
+        self._members = members
+        self._trees = [Fenwick([self._dest_weight(code) for code in group]) for group in members]
+        # w(load) of each hub (the direct "hub" never gets busier)
+        self._hub_w = [SCALE if hub == DIRECT else weight(self.loads.get(hub, 0)) for hub in self._hubs]
+        self._top = Fenwick([w * tree.total() for w, tree in zip(self._hub_w, self._trees)])
+
+    def load(self, code: str) -> int:
+        return self.loads.get(code, 0)
+
+    def flying(self, legs: Sequence[str]) -> None:
+        """A plan went out: everything after its origin gets one more flight headed its way."""
+        with self._lock:
+            for code in legs[1:]:
+                self._bump(code, 1)
+
+    def landed(self, legs: Sequence[str]) -> None:
+        """A plan settled (landed, given up on, or its session is gone)."""
+        with self._lock:
+            for code in legs[1:]:
+                self._bump(code, -1)
+
+    def pick(self, origin: str, rng: random.Random) -> Optional[Tuple[str, Optional[str]]]:
+        """Weighted (destination, layover hub or None for direct) for a flight out of origin.
+
+        None if there's nowhere else to go. The hub can be the origin itself;
+        the caller swaps it out then, same as it always has for hub origins.
+        """
+        with self._lock:
+            top = self._top
+            for _ in range(ORIGIN_RETRIES):
+                if top.total() <= 0:
+                    return None
+                idx = top.sample(rng)
+                code = self._members[idx][self._trees[idx].sample(rng)]
+                if code != origin:
+                    hub = self._hubs[idx]
+                    return code, hub if hub != DIRECT else None
+        # only when origin is most of the weight, i.e. a tiny or lopsided network
+        others = [code for code in self._slots if code != origin]
+        return (others[int(rng.random() * len(others))], None) if others else None
+
+    def pick_layover(self, options: Sequence[str], rng: random.Random) -> str:
+        """Weighted draw among some of a destination's layover hubs."""
+        if len(options) == 1:
+            return options[0]
+        with self._lock:
+            weights = [weight(self.loads.get(hub, 0)) for hub in options]
+        target = int(rng.random() * sum(weights))
+        for hub, w in zip(options, weights):
+            if target < w:
+                return hub
+            target -= w
+        return options[-1]
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.loads)
+
+    def _bump(self, code: str, delta: int) -> None:
+        loads = self.loads
+        load = loads.get(code, 0) + delta
+        if load > 0:
+            loads[code] = load
+        else:
+            load = 0
+            loads.pop(code, None)
+        w = weight(load)
+        trees, hub_w, top = self._trees, self._hub_w, self._top
+        idx = self._hub_index.get(code)
+        if idx is not None:
+            hub_w[idx] = w
+            top.set(idx, w * trees[idx].total())
+        slots = self._slots.get(code)
+        if slots is not None:
+            w //= self._share[code]
+            for idx, slot in slots:
+                tree = trees[idx]
+                tree.set(slot, w)
+                top.set(idx, hub_w[idx] * tree.total())
+
+    def _dest_weight(self, code: str) -> int:
+        return weight(self.loads.get(code, 0)) // self._share[code]
@@ -0,0 +1,59 @@
+import socket
+from typing import List
+
+# Reusable receive buffers.
+#
+# sock.recv(n) hands back a brand new bytes object on every call, and most
+# of our receive paths then decoded that into yet another str. recv_into()
+# fills memory we already own instead. A connection borrows one bytearray
+# from the pool for as long as it lives (see wire.FrameStream) and gives it
+# back when it closes, so a busy link allocates nothing per message: frame
+# headers are unpacked straight out of the buffer, bodies are handed out as
+# memoryview slices of it, and only the fields that end up in a log line are
+# ever decoded to str.
+#
+# acquire/release are a list pop/append, which the GIL already makes atomic,
+# so there's no lock on this path either.
+
+RECV_SIZE = 4096  # most frames (a flight is ~60 bytes) fit many times over
+POOL_KEEP = 256  # spare buffers kept around; more than that are left to the GC
+
+
+class BufferPool:
+    """Free list of same-sized bytearrays for recv_into."""
+
+    def __init__(self, size: int = RECV_SIZE, keep: int = POOL_KEEP) -> None:
+        self.size = size
+        self.keep = keep
+        self._free: List[bytearray] = []
+
+    def acquire(self) -> bytearray:
+        try:
+            return self._free.pop()
+        except IndexError:
+            return bytearray(self.size)
+
+    def release(self, buf: bytearray) -> None:
+        # buffers that had to grow for one big frame aren't worth keeping
+        if len(buf) == self.size and len(self._free) < self.keep:
+            self._free.append(buf)
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+
+# shared by every connection in the process
+POOL = BufferPool()
+
+
+def recv_text(sock: socket.socket, pool: BufferPool = POOL) -> str:
+    """One recv() worth of the text protocol, stripped. '' if the peer closed.
+
+    Reads into a pooled buffer, so the only new object is the str itself.
+    """
+    buf = pool.acquire()
+    try:
+        count = sock.recv_into(buf)
+        return str(memoryview(buf)[:count], "utf-8").strip()
+    finally:
+        pool.release(buf)
@@ -0,0 +1,248 @@
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config.watcher import Topology
+from .fleet import Fleet
+from .logsink import LogSink, default_sink, use_sink
+from .metrics import start_metrics_server
+from .scheduler import SCHEDULER_HOST
+
+# Spread airports over several worker processes so the network isn't stuck on one core.
+#
+#   parent: Scheduler, config watcher, metrics, the one real LogSink, and the supervisor
+#   worker: a Fleet hosting its shard of airports (threaded or async, same as single-process)
+#
+# Every worker gets the full airport directory (code -> host:port) and builds
+# the same routing table, so a flight from a node in worker 1 to a node in
+# worker 3 is the exact same TCP hop it would be in one process. The parent
+# keeps the directory and the shard assignment and pushes both to the workers
+# whenever the config reloads.
+#
+# Workers don't write logs themselves. Their LogSink batches lines as usual
+# and ships each batch up a multiprocessing queue, and the parent writes them
+# into the usual logs/ files (and console). A worker that dies gets restarted
+# with its shard, with a growing delay if it keeps dying.
+
+RESTART_WINDOW = 30.0  # crashes older than this don't count towards the backoff
+MAX_RESTART_DELAY = 10.0
+APPLY_TIMEOUT = 10.0
+
+
+class ForwardingSink(LogSink):
+    """Worker-side LogSink: same batching, but batches go to the parent instead of to disk."""
+
+    def __init__(self, out: "multiprocessing.Queue", **options) -> None:
+        super().__init__(**options)
+        self.out = out
+
+    def _flush(self, batch) -> None:
+        if batch:
+            self.out.put(batch)
+
+    def _close_files(self) -> None:
+        pass
+
+
+def _worker_main(
+    shard: int,
+    codes: List[str],
+    topology: Topology,
+    settings: Dict[str, Any],
+    logs: "multiprocessing.Queue",
+    control: "multiprocessing.Queue",
+    replies: "multiprocessing.Queue",
+) -> None:
+    """Entry point of a worker process. Runs its shard until the parent says stop."""
+    # Ctrl+C hits the whole process group; the parent decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sink = use_sink(ForwardingSink(logs, flush_interval=settings["log_flush_interval"]))
+    metrics_server = None
+    if settings["metrics_port"]:
+        metrics_server = start_metrics_server(SCHEDULER_HOST, settings["metrics_port"] + 1 + shard)
+
+    fleet = Fleet(
+        topology.airports,
+        topology.hubs,
+        topology.default_hub,
+        engine=settings["engine"],
+        routing=settings["routing"],
+        exclude=settings["exclude"],
+        transports=topology.transports,
+        transport=settings["transport"],
+        **settings["node_options"],
+    )
+    # listeners only; flying waits for the parent's go, once every worker is listening
+    fleet.start(codes, fly=False)
+    replies.put(("started", shard, os.getpid()))
+
+    while True:
+        message = control.get()
+        kind = message[0]
+        if kind == "update":
+            _, topology, codes = message
+            fleet.update(topology.airports, topology.hubs, topology.default_hub, only=codes, transports=topology.transports)
+            replies.put(("updated", shard, topology.version))
+        elif kind == "fly":
+            fleet.fly()
+        elif kind == "prune":
+            fleet.prune(message[1])
+        elif kind == "stop":
+            break
+
+    fleet.stop()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    sink.close()
+
+
+class _Worker:
+    """Parent-side handle on one worker process."""
+
+    def __init__(self, shard: int, codes: List[str]) -> None:
+        self.shard = shard
+        self.codes = codes
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.control: Optional["multiprocessing.Queue"] = None
+        self.crashes: List[float] = []
+
+
+class Cluster:
+    """Runs the airports in `workers` processes and keeps them running."""
+
+    def __init__(self, topology: Topology, workers: int, settings: Dict[str, Any]) -> None:
+        self.topology = topology
+        self.settings = settings
+        self._ctx = multiprocessing.get_context("spawn")  # same behaviour on Windows and Linux
+        self._logs = self._ctx.Queue()
+        self._replies = self._ctx.Queue()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        codes = [code for code in topology.airports if code not in settings["exclude"]]
+        count = max(1, min(workers, len(codes)))
+        # round robin in config order, so hubs (usually listed first) end up on different cores
+        self.workers = [_Worker(shard, codes[shard::count]) for shard in range(count)]
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        drain = threading.Thread(target=self._drain_logs, name="cluster-logs", daemon=True)
+        drain.start()
+        self._threads.append(drain)
+        for worker in self.workers:
+            self._spawn(worker)
+        self._wait_replies("started", len(self.workers))
+        for worker in self.workers:
+            worker.control.put(("fly",))
+        supervisor = threading.Thread(target=self._supervise, name="cluster-supervisor", daemon=True)
+        supervisor.start()
+        self._threads.append(supervisor)
+        for worker in self.workers:
+            print(f"[cluster] worker {worker.shard} (pid {worker.process.pid}): {', '.join(worker.codes)}")
+
+    def shard_of(self, code: str) -> Optional[int]:
+        for worker in self.workers:
+            if code in worker.codes:
+                return worker.shard
+        return None
+
+    def update(self, topology: Topology) -> None:
+        """First half of a reload: every worker syncs up and starts any airports it was handed."""
+        with self._lock:
+            self.topology = topology
+            for worker in self.workers:
+                worker.codes = [code for code in worker.codes if code in topology.airports]
+            for code in topology.airports:
+                if code in self.settings["exclude"] or self.shard_of(code) is not None:
+                    continue
+                min(self.workers, key=lambda w: len(w.codes)).codes.append(code)
+            for worker in self.workers:
+                worker.control.put(("update", topology, list(worker.codes)))
+        self._wait_replies("updated", len(self.workers))
+
+    def prune(self) -> None:
+        """Second half of a reload: stop airports that left the config."""
+        with self._lock:
+            for worker in self.workers:
+                worker.control.put(("prune", list(worker.codes)))
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        for worker in self.workers:
+            if worker.control is not None:
+                worker.control.put(("stop",))
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(1.0)
+        self._logs.put(None)
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+
+    def _spawn(self, worker: _Worker) -> None:
+        worker.control = self._ctx.Queue()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                worker.shard,
+                list(worker.codes),
+                self.topology,
+                self.settings,
+                self._logs,
+                worker.control,
+                self._replies,
+            ),
+            name=f"airports-{worker.shard}",
+            daemon=True,
+        )
+        worker.process.start()
+
+    def _wait_replies(self, kind: str, count: int) -> None:
+        deadline = time.monotonic() + APPLY_TIMEOUT
+        seen = 0
+        while seen < count:
+            try:
+                reply = self._replies.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                print(f"[cluster] only {seen}/{count} workers answered '{kind}' in time, carrying on")
+                return
+            if reply[0] == kind:
+                seen += 1
+
+    def _supervise(self) -> None:
+        """Restart workers that died, backing off if one keeps crashing."""
+        while not self._stopping.wait(0.5):
+            for worker in self.workers:
+                process = worker.process
+                if process is None or process.is_alive() or self._stopping.is_set():
+                    continue
+                now = time.monotonic()
+                worker.crashes = [t for t in worker.crashes if now - t < RESTART_WINDOW] + [now]
+                delay = min(MAX_RESTART_DELAY, 0.5 * 2 ** (len(worker.crashes) - 1))
+                print(
+                    f"[cluster] worker {worker.shard} (pid {process.pid}) exited with code {process.exitcode}, "
+                    f"restarting {', '.join(worker.codes)} in {delay:.1f}s"
+                )
+                if self._stopping.wait(delay):
+                    return
+                with self._lock:
+                    self._spawn(worker)
+                    # everyone else is up already; the worker reads this once its listeners are bound
+                    worker.control.put(("fly",))
+
+    def _drain_logs(self) -> None:
+        """Write every batch the workers send into the parent's sink."""
+        sink = default_sink()
+        while True:
+            batch = self._logs.get()
+            if batch is None:
+                return
+            for path, line, echo in batch:
+                sink.write(path, line, echo)
@@ -0,0 +1,136 @@
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .async_node import AsyncNode, AsyncRuntime
+from .node import Node
+from .routing import RoutingTable
+
+# The airports one process hosts.
+#
+# In the normal single-process run that's every airport in the config. With
+# --workers (see cluster.py) each worker process has its own Fleet holding
+# just its shard. Either way a config reload goes through the same steps.
+
+READY_TIMEOUT = 10.0  # seconds to wait for listeners to bind before carrying on without them
+
+
+def _split_address(addr: str) -> Tuple[str, int]:
+    """Turn '127.0.0.1:6001' into ('127.0.0.1', 6001)."""
+    host, port_text = addr.rsplit(":", 1)
+    return host.strip(), int(port_text)
+
+
+class Fleet:
+    """Starts, updates and stops this process's airport nodes."""
+
+    def __init__(
+        self,
+        airports: Dict[str, str],
+        hubs: List[str],
+        default_hub: Dict[str, List[str]],
+        engine: str = "threaded",
+        routing: str = "source",
+        exclude: Iterable[str] = (),
+        transports: Optional[Dict[str, str]] = None,
+        transport: Optional[str] = None,
+        **node_options,
+    ) -> None:
+        self.airports = airports
+        self.runtime: Optional[AsyncRuntime] = AsyncRuntime() if engine == "async" else None
+        # every process builds the same table from the same config (ties break on code)
+        self.routes = RoutingTable.from_config(airports, hubs, default_hub) if routing == "table" else None
+        self.exclude = {code.upper() for code in exclude}
+        # routes.yaml transport block; `transport` (from --transport) replaces its default
+        self.transports = transports or {}
+        self.default_transport = transport
+        self.node_options = node_options
+        self.nodes: Dict[str, Node] = {}
+
+    def transport_for(self, code: str) -> str:
+        """tcp/udp for one airport: its own routes.yaml entry, else --transport, else the file's default."""
+        return self.transports.get(code) or self.default_transport or self.transports.get("default", "tcp")
+
+    def start(self, only: Optional[Iterable[str]] = None, fly: bool = True, timeout: float = READY_TIMEOUT) -> List[str]:
+        """Start a node per airport (just the `only` ones if given). Returns the codes started.
+
+        All listeners bind in parallel and we wait until every one of them is
+        up before any node starts flying, so nobody gets "connection refused"
+        from a neighbour that was simply a few milliseconds late. fly=False
+        stops after the listeners (cluster workers wait for the others first).
+        """
+        if self.runtime is not None:
+            self.runtime.start()
+        wanted = set(only) if only is not None else None
+        started: List[Node] = []
+        for code, addr in self.airports.items():
+            if code in self.exclude or code in self.nodes or (wanted is not None and code not in wanted):
+                continue
+            host, port = _split_address(addr)
+            if self.runtime is not None:
+                node = AsyncNode(
+                    code, host, port, self.airports, self.runtime,
+                    routes=self.routes, transport=self.transport_for(code), **self.node_options,
+                )
+            else:
+                node = Node(code, host, port, self.airports, routes=self.routes, transport=self.transport_for(code), **self.node_options)
+            node.start_listener()
+            self.nodes[code] = node
+            started.append(node)
+
+        deadline = time.monotonic() + timeout
+        late = [node.code for node in started if not node.ready.wait(max(0.0, deadline - time.monotonic()))]
+        if late:
+            print(f"[fleet] not listening after {timeout:.0f}s: {', '.join(late)}")
+        if fly:
+            for node in started:
+                node.start_flying()
+        return [node.code for node in started]
+
+    def fly(self) -> None:
+        """Let every node that's only listening so far start leasing plans."""
+        for node in list(self.nodes.values()):
+            node.start_flying()
+
+    def update(
+        self,
+        airports: Dict[str, str],
+        hubs: List[str],
+        default_hub: Dict[str, List[str]],
+        only: Optional[Iterable[str]] = None,
+        transports: Optional[Dict[str, str]] = None,
+    ) -> List[str]:
+        """First half of a reload: everything that has to happen before the scheduler moves.
+
+        1. routes first, so a link that just appeared already has next hops
+        2. running nodes learn the new address book (and transport); their open links stay up
+        3. airports that are new, or moved to another host:port, come up
+           before anyone is sent there
+        Returns the codes that were (re)started.
+        """
+        old_airports = self.airports
+        self.airports = airports
+        if transports is not None:
+            self.transports = transports
+        if self.routes is not None:
+            self.routes.sync(hubs, default_hub)
+        for node in list(self.nodes.values()):
+            node.update_airports(airports)
+            node.transport = self.transport_for(node.code)
+        moved = [code for code in self.nodes if code in airports and airports[code] != old_airports.get(code)]
+        for code in moved:
+            self.nodes.pop(code).stop()
+        return self.start(only)
+
+    def prune(self, keep: Iterable[str]) -> List[str]:
+        """Second half of a reload, once the scheduler stopped planning for them: stop dropped airports."""
+        keep = set(keep)
+        gone = [code for code in self.nodes if code not in keep]
+        for code in gone:
+            self.nodes.pop(code).stop()
+        return gone
+
+    def stop(self) -> None:
+        for node in self.nodes.values():
+            node.stop()
+        if self.runtime is not None:
+            self.runtime.stop()
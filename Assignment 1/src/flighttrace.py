@@ -0,0 +1,380 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Structured flight traces, and an index to pull one flight back out of them.
+#
+# With --trace every airport also writes logs/<code>.trace.jsonl next to its
+# .log: one JSON object per line, per thing that happened to a flight there.
+#   {"t":81234567890123,"flight":"0042","origin":"SEA","event":"depart","at":"SEA","hop":1,"to":"ANC"}
+# t is time.monotonic_ns() (the virtual clock in simulation.py), which on one
+# machine is the same clock in every process, so records from different
+# airports (or cluster workers) line up. hop is the leg number: leg 1 leaves
+# the origin, and its depart/ack at one end and arrive at the other share it.
+# origin is where the flight started, since an id alone isn't unique (below).
+#
+# events:
+#   plan         the origin got the plan (route)
+#   depart       a leg was handed to the next airport (to)
+#   ack          ... and it answered (to)
+#   fail         ... or it couldn't be reached (to, reason)
+#   arrive       a leg got here (from)
+#   drop         a routed flight couldn't go any further (reason)
+#   land         the final hop, before it reports COMPLETE
+#   confirm      the origin got the COMPLETE back (final)
+#   unconfirmed  the origin gave the slot back without one (reason)
+#
+# Finding flight 0042 across SEA -> ANC -> OME used to mean grepping every
+# airport's log. TraceIndex keeps a sqlite file (logs/trace.db) of
+# flight id -> (file, byte range), so a lookup is a few seeks no matter how
+# big the logs get. A flight's records in one file sit close together (it
+# passes through in milliseconds), so one row covers a run of them: records
+# of the same flight less than SPAN_GAP bytes apart share a range, and the
+# query reads the range and keeps that flight's lines. That keeps the index
+# around a tenth of the traces' size instead of a row per record.
+# Indexing is incremental: files are remembered by inode,
+# only bytes past what was already indexed get scanned, and a rotated file
+# (sea.trace.jsonl -> sea.trace.jsonl.1) keeps its entries under its new name.
+#
+#   python -m src.flighttrace index                 catch the index up with logs/
+#   python -m src.flighttrace show 0042             trace + per-hop latencies (updates the index first)
+#   python -m src.flighttrace show 0042 --all       every run that used that id, not just the latest
+#   python -m src.flighttrace show 0042 --json
+#
+# Flight ids wrap at 9999 and start over every time the scheduler does, so
+# one id covers many flights: several at once from different origins, and
+# the same origin again later on. show splits them by origin, then at each
+# plan event (every flight starts with one), and prints the latest.
+
+TRACE_SUFFIX = ".trace.jsonl"
+INDEX_NAME = "trace.db"
+SCAN_CHUNK = 8 * 1024 * 1024
+SPAN_GAP = 64 * 1024  # records of one flight further apart than this get a new index row
+INSERT_BATCH = 50000
+HEAD_BYTES = 64  # start of a file, to notice it was truncated and rewritten in place
+
+# line start + the flight field, without parsing the JSON
+_FLIGHT_FIELD = re.compile(rb'^[^\n]*?"flight":"((?:[^"\\\n]|\\.)*)"', re.M)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    indexed INTEGER NOT NULL,
+    head BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS spans (
+    flight TEXT NOT NULL,
+    file INTEGER NOT NULL,
+    first INTEGER NOT NULL,
+    last INTEGER NOT NULL,
+    records INTEGER NOT NULL,
+    PRIMARY KEY (flight, file, first)
+) WITHOUT ROWID;
+"""
+
+
+def record(t: int, flight_id: str, origin: str, event: str, at: str, hop: int = 0, **fields: Any) -> str:
+    """One trace line, newline included."""
+    entry: Dict[str, Any] = {"t": t, "flight": flight_id, "origin": origin, "event": event, "at": at, "hop": hop}
+    entry.update(fields)
+    return json.dumps(entry, separators=(",", ":")) + "\n"
+
+
+def trace_files(folder: Path) -> List[Path]:
+    """Every trace file in folder, rotated ones included."""
+    return sorted(p for p in folder.glob(f"*{TRACE_SUFFIX}*") if p.is_file())
+
+
+class TraceIndex:
+    """flight id -> where its records are, for the trace files in one folder."""
+
+    def __init__(self, folder: Path, db_path: Optional[Path] = None) -> None:
+        self.folder = Path(folder)
+        self.db_path = Path(db_path) if db_path is not None else self.folder / INDEX_NAME
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.db_path))
+        # it's a cache of the trace files; a crash mid-update costs a rebuild at worst
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute("PRAGMA cache_size = -131072")
+        self.db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def update(self) -> Tuple[int, int]:
+        """Index whatever was written since last time. Returns (files scanned, records added)."""
+        known = {(dev, ino): (file_id, indexed, head) for file_id, dev, ino, indexed, head in self.db.execute(
+            "SELECT id, dev, ino, indexed, head FROM files"
+        )}
+        seen = set()
+        scanned = added = 0
+        with self.db:
+            for path in trace_files(self.folder):
+                try:
+                    st = path.stat()
+                    with open(path, "rb") as fh:
+                        head = fh.read(HEAD_BYTES)
+                except OSError:
+                    continue  # rotated away between the glob and here; next update picks it up
+                key = (st.st_dev, st.st_ino)
+                entry = known.get(key)
+                if entry is None:
+                    file_id = self.db.execute(
+                        "INSERT INTO files (name, dev, ino, indexed, head) VALUES (?, ?, ?, 0, ?)",
+                        (path.name, st.st_dev, st.st_ino, head),
+                    ).lastrowid
+                    start = 0
+                else:
+                    file_id, start, old_head = entry
+                    self.db.execute("UPDATE files SET name = ? WHERE id = ?", (path.name, file_id))
+                    if st.st_size < start or head[: len(old_head)] != old_head:
+                        # truncated (or rewritten from the top): what we had for it is gone
+                        self.db.execute("DELETE FROM spans WHERE file = ?", (file_id,))
+                        start = 0
+                seen.add(file_id)
+                if st.st_size > start:
+                    end, count = self._scan(path, file_id, start)
+                    self.db.execute("UPDATE files SET indexed = ?, head = ? WHERE id = ?", (end, head, file_id))
+                    scanned += 1
+                    added += count
+            for file_id, _, _ in known.values():
+                if file_id not in seen:  # rotated off the end and deleted
+                    self.db.execute("DELETE FROM spans WHERE file = ?", (file_id,))
+                    self.db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        return scanned, added
+
+    def _scan(self, path: Path, file_id: int, start: int) -> Tuple[int, int]:
+        """Add the complete lines of path from byte `start` on. Returns (bytes indexed up to, records added)."""
+        rows: List[Tuple[str, int, int, int, int]] = []
+        spans: Dict[str, List[int]] = {}  # flight -> [first offset, last offset, records], still open
+        count = 0
+        offset = start
+        insert = "INSERT OR REPLACE INTO spans (flight, file, first, last, records) VALUES (?, ?, ?, ?, ?)"
+        with open(path, "rb") as fh:
+            fh.seek(start)
+            while True:
+                chunk = fh.read(SCAN_CHUNK)
+                end = chunk.rfind(b"\n")
+                if end < 0:
+                    break  # nothing, or a line still being written
+                for match in _FLIGHT_FIELD.finditer(chunk, 0, end + 1):
+                    flight = match.group(1)
+                    at = offset + match.start()
+                    count += 1
+                    span = spans.get(flight)
+                    if span is not None and at - span[1] <= SPAN_GAP:
+                        span[1] = at
+                        span[2] += 1
+                        continue
+                    if span is not None:
+                        rows.append((_unescape(flight), file_id, span[0], span[1], span[2]))
+                    spans[flight] = [at, at, 1]
+                offset += end + 1
+                fh.seek(offset)
+                # flights that went quiet can't extend their span any more
+                quiet = [flight for flight, span in spans.items() if offset - span[1] > SPAN_GAP]
+                for flight in quiet:
+                    span = spans.pop(flight)
+                    rows.append((_unescape(flight), file_id, span[0], span[1], span[2]))
+                if len(rows) >= INSERT_BATCH:
+                    self.db.executemany(insert, rows)
+                    rows.clear()
+        rows.extend((_unescape(flight), file_id, span[0], span[1], span[2]) for flight, span in spans.items())
+        self.db.executemany(insert, rows)
+        return offset, count
+
+    def events(self, flight_id: str) -> List[Dict[str, Any]]:
+        """Every record for flight_id, oldest first."""
+        where: Dict[str, List[Tuple[int, int]]] = {}
+        for name, first, last in self.db.execute(
+            "SELECT files.name, spans.first, spans.last FROM spans JOIN files ON files.id = spans.file "
+            "WHERE spans.flight = ? ORDER BY spans.file, spans.first",
+            (flight_id,),
+        ):
+            where.setdefault(name, []).append((first, last))
+        needle = b'"flight":' + json.dumps(flight_id).encode("utf-8") + b","
+        found: List[Dict[str, Any]] = []
+        for name, ranges in where.items():
+            try:
+                with open(self.folder / name, "rb") as fh:
+                    for first, last in ranges:
+                        fh.seek(first)
+                        data = fh.read(last - first) + fh.readline()
+                        for line in data.splitlines():
+                            if needle not in line:
+                                continue  # another flight's record in between
+                            try:
+                                found.append(json.loads(line))
+                            except ValueError:
+                                pass  # the file changed under the index; `index` again to fix it
+            except OSError:
+                continue
+        # ties (same ns, virtual clock) keep the order each airport wrote them in
+        found.sort(key=lambda e: e.get("t", 0))
+        return found
+
+
+def _unescape(raw: bytes) -> str:
+    if b"\\" not in raw:
+        return raw.decode("utf-8", "replace")
+    return json.loads(b'"' + raw + b'"')
+
+
+def split_runs(events: Iterable[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Cut a flight id's events (oldest first) into separate flights: by origin, then one per plan event."""
+    current: Dict[str, List[Dict[str, Any]]] = {}
+    runs: List[List[Dict[str, Any]]] = []
+    for event in events:
+        origin = event.get("origin", "")
+        run = current.get(origin)
+        if run is None or event.get("event") == "plan":
+            run = current[origin] = []
+            runs.append(run)
+        run.append(event)
+    return runs
+
+
+def hop_latencies(trace: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per leg: depart -> arrive (and depart -> ack) in ms, in hop order."""
+    departs: Dict[Tuple[int, str, str], Dict[str, Any]] = {}
+    arrives: Dict[Tuple[int, str, str], Dict[str, Any]] = {}
+    acks: Dict[Tuple[int, str, str], Dict[str, Any]] = {}
+    for event in trace:
+        kind = event.get("event")
+        if kind == "depart":
+            departs.setdefault((event["hop"], event["at"], event.get("to", "")), event)
+        elif kind == "ack":
+            acks.setdefault((event["hop"], event["at"], event.get("to", "")), event)
+        elif kind == "arrive":
+            arrives.setdefault((event["hop"], event.get("from", ""), event["at"]), event)
+    hops: List[Dict[str, Any]] = []
+    for key in sorted(departs, key=lambda k: (k[0], departs[k]["t"])):
+        hop, source, target = key
+        depart = departs[key]
+        arrive = arrives.get(key)
+        ack = acks.get(key)
+        hops.append(
+            {
+                "hop": hop,
+                "from": source,
+                "to": target,
+                "ms": _ms(arrive["t"] - depart["t"]) if arrive else None,
+                "ack_ms": _ms(ack["t"] - depart["t"]) if ack else None,
+            }
+        )
+    return hops
+
+
+def describe(trace: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One run of a flight: its events (with ms since the first), hop latencies and totals."""
+    first = trace[0]["t"] if trace else 0
+    by_kind: Dict[str, Dict[str, Any]] = {}
+    for event in trace:
+        by_kind.setdefault(event.get("event", ""), event)
+    plan = by_kind.get("plan")
+    land = by_kind.get("land")
+    confirm = by_kind.get("confirm")
+    start = (plan or (trace[0] if trace else {})).get("t", first)
+    if land is not None:
+        status = f"landed at {land['at']}"
+    elif "unconfirmed" in by_kind:
+        status = "unconfirmed: " + by_kind["unconfirmed"].get("reason", "")
+    elif "drop" in by_kind:
+        status = "dropped at " + by_kind["drop"]["at"]
+    elif "fail" in by_kind:
+        status = f"failed at {by_kind['fail']['at']}"
+    else:
+        status = "no landing in the trace"
+    return {
+        "flight": trace[0]["flight"] if trace else None,
+        "route": plan.get("route") if plan else None,
+        "status": status,
+        "end_to_end_ms": _ms(land["t"] - start) if land else None,
+        "confirmed_ms": _ms(confirm["t"] - start) if confirm else None,
+        "hops": hop_latencies(trace),
+        "events": [dict(event, ms=_ms(event["t"] - first)) for event in trace],
+    }
+
+
+def _ms(ns: int) -> float:
+    return round(ns / 1e6, 3)
+
+
+def _event_detail(event: Dict[str, Any]) -> str:
+    skip = {"t", "flight", "origin", "event", "at", "hop", "ms"}
+    parts = []
+    if event.get("hop"):
+        parts.append(f"hop {event['hop']}")
+    for key, value in event.items():
+        if key in skip:
+            continue
+        if key == "route" and isinstance(value, list):
+            value = " >> ".join(value)
+        parts.append(f"{key} {value}")
+    return ", ".join(parts)
+
+
+def _print_run(run: Dict[str, Any]) -> None:
+    route = " >> ".join(run["route"]) if run["route"] else "?"
+    print(f"flight {run['flight']}: {route}, {run['status']}")
+    for event in run["events"]:
+        print(f"  {event['ms']:>+12.3f} ms  {event['at']:<5}{event['event']:<12}{_event_detail(event)}")
+    for hop in run["hops"]:
+        took = f"{hop['ms']:.3f} ms" if hop["ms"] is not None else "never arrived"
+        ack = f" (ack after {hop['ack_ms']:.3f} ms)" if hop["ack_ms"] is not None else ""
+        print(f"  hop {hop['hop']}  {hop['from']} -> {hop['to']}: {took}{ack}")
+    if run["end_to_end_ms"] is not None:
+        print(f"  end to end: {run['end_to_end_ms']:.3f} ms", end="")
+        if run["confirmed_ms"] is not None:
+            print(f", origin heard back after {run['confirmed_ms']:.3f} ms", end="")
+        print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Index and query the --trace flight logs")
+    parser.add_argument("--logs", default="logs", help="folder with the <code>.trace.jsonl files")
+    parser.add_argument("--db", help=f"index file (default: <logs>/{INDEX_NAME})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("index", help="catch the index up with the trace files")
+    show = sub.add_parser("show", help="ordered trace and per-hop latencies for one flight")
+    show.add_argument("flight_id")
+    show.add_argument("--all", action="store_true", help="every run that used this id, oldest first (default: the latest)")
+    show.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    show.add_argument("--no-update", action="store_true", help="query the index as it is, without scanning new lines")
+    args = parser.parse_args()
+
+    folder = Path(args.logs)
+    if not folder.is_dir():
+        parser.error(f"no such folder: {folder}")
+    index = TraceIndex(folder, Path(args.db) if args.db else None)
+    try:
+        if args.command == "index" or not args.no_update:
+            scanned, added = index.update()
+            if args.command == "index":
+                total = index.db.execute("SELECT COALESCE(SUM(records), 0) FROM spans").fetchone()[0]
+                size = os.path.getsize(index.db_path)
+                print(f"[trace] scanned {scanned} files, {added} new records ({total} indexed, {size / 1e6:.1f} MB index)")
+                return
+        runs = [describe(run) for run in split_runs(index.events(args.flight_id))]
+        if not args.all:
+            runs = runs[-1:]
+        if args.json:
+            print(json.dumps(runs, indent=2))
+            return
+        if not runs:
+            print(f"[trace] no records for flight {args.flight_id}")
+        for run in runs:
+            _print_run(run)
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
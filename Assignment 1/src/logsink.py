@@ -0,0 +1,189 @@
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, TextIO, Tuple
+
+# Shared background log writer.
+#
+# Node._log used to open the airport's log file, append one line, close it
+# and print, all on the hot path. Now _log just drops (path, line, echo) on a
+# SimpleQueue (a C-level queue, no Python lock on put) and one writer thread
+# drains it, groups lines per file and writes each group in one go.
+#
+# Files stay open between batches and get rotated once they pass max_bytes:
+#   anc.log -> anc.log.1 -> anc.log.2 ... (oldest past `backups` is dropped)
+
+_STOP = object()
+
+
+class LogSink:
+    """Batches log lines per file on a background thread, with optional stdout mirror."""
+
+    def __init__(
+        self,
+        flush_interval: float = 0.2,
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 3,
+        mirror_stdout: bool = True,
+        max_batch: int = 4096,
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.mirror_stdout = mirror_stdout
+        self.max_batch = max_batch
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._files: Dict[Path, Tuple[TextIO, int]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def write(self, path: Optional[Path], line: str, echo: Optional[str] = None) -> None:
+        """Queue one line for path (None = stdout only). Never touches the disk itself."""
+        if self._thread is None:
+            self.start()
+        self._queue.put((path, line, echo))
+
+    def depth(self) -> int:
+        """Roughly how many lines are waiting to be written."""
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Flush everything queued so far and stop the writer."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch: List[Tuple[Optional[Path], str, Optional[str]]] = []
+            stopping = item is _STOP
+            if not stopping:
+                batch.append(item)
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+            if stopping:
+                # drain anything that raced in behind the stop marker
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+
+            self._flush(batch)
+            if stopping:
+                self._close_files()
+                return
+
+    def _flush(self, batch: List[Tuple[Optional[Path], str, Optional[str]]]) -> None:
+        per_file: Dict[Path, List[str]] = {}
+        echoes: List[str] = []
+        for path, line, echo in batch:
+            if path is not None:
+                per_file.setdefault(path, []).append(line)
+            if echo is not None and self.mirror_stdout:
+                echoes.append(echo)
+
+        for path, lines in per_file.items():
+            chunk = "".join(lines)
+            try:
+                self._append(path, chunk)
+            except OSError as exc:
+                print(f"[logsink] could not write {path}: {exc}", file=sys.stderr)
+
+        if echoes:
+            try:
+                sys.stdout.write("\n".join(echoes) + "\n")
+                sys.stdout.flush()
+            except (OSError, ValueError):
+                pass  # stdout closed (piped into head, etc.); files still get written
+
+    def _append(self, path: Path, chunk: str) -> None:
+        fh, size = self._files.get(path, (None, 0))
+        if fh is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fh = open(path, "a", encoding="utf-8")
+            size = fh.tell()
+        if self.max_bytes > 0 and size > 0 and size + len(chunk) > self.max_bytes:
+            fh.close()
+            self._rotate(path)
+            fh = open(path, "a", encoding="utf-8")
+            size = 0
+        fh.write(chunk)
+        fh.flush()
+        self._files[path] = (fh, size + len(chunk))
+
+    def _rotate(self, path: Path) -> None:
+        if self.backups <= 0:
+            os.remove(path)
+            return
+        for idx in range(self.backups - 1, 0, -1):
+            older = path.with_name(f"{path.name}.{idx}")
+            if older.exists():
+                os.replace(older, path.with_name(f"{path.name}.{idx + 1}"))
+        os.replace(path, path.with_name(f"{path.name}.1"))
+
+    def _close_files(self) -> None:
+        for fh, _ in self._files.values():
+            fh.close()
+        self._files.clear()
+
+
+_default_sink: Optional[LogSink] = None
+
+
+def configure_sink(**options) -> LogSink:
+    """Replace the shared sink (main() calls this with the command line options)."""
+    global _default_sink
+    if _default_sink is not None:
+        _default_sink.close()
+    _default_sink = LogSink(**options)
+    return _default_sink
+
+
+def use_sink(sink: LogSink) -> LogSink:
+    """Make an already built sink the shared one (cluster workers use a forwarding sink)."""
+    global _default_sink
+    if _default_sink is not None and _default_sink is not sink:
+        _default_sink.close()
+    _default_sink = sink
+    return sink
+
+
+def default_sink() -> LogSink:
+    """The shared sink every Node logs through unless told otherwise."""
+    global _default_sink
+    if _default_sink is None:
+        _default_sink = LogSink()
+    return _default_sink
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    if _default_sink is not None:
+        _default_sink.close()
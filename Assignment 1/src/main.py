@@ -1,12 +1,18 @@
 # C:\...\Assignment 1> python -m src.main 
 
+import argparse
+import os
 import signal
 import time
-from typing import Dict, List, Tuple
+from typing import List, Optional
 
-from config.parser import load_airports, load_routes
-from .node import Node
-from .scheduler import Scheduler
+from config.watcher import ConfigWatcher, Topology
+from .cluster import Cluster
+from .balance import balance_mode
+from .fleet import Fleet
+from .logsink import configure_sink
+from .metrics import REGISTRY, start_metrics_server
+from .scheduler import METRICS_PORT, SCHEDULER_HOST, Scheduler
 
 """
 Assignment:
@@ -14,39 +20,227 @@ Assignment:
     - Each airport runs as both a server (listens for arrivals) and a client (flies to another airport).
 """
 
-def _split_address(addr: str) -> Tuple[str, int]:
-    """Turn '127.0.0.1:6001' into ('127.0.0.1', 6001)."""
-    host, port_text = addr.rsplit(":", 1)
-    return host.strip(), int(port_text)
-
-def _start_nodes(airports: Dict[str, str]) -> List[Node]:
-    """Create and start a Node per airport."""
-    nodes: List[Node] = []
-    for code, addr in airports.items():
-        host, port = _split_address(addr)
-        node = Node(code, host, port, airports)
-        node.start()
-        nodes.append(node)
-        time.sleep(0.1)  # small stagger so not everything talks at once
-    return nodes
-
-def main() -> None:
-    airports = load_airports("src/airports.yaml")
-    hubs, default_hub = load_routes("src/routes.yaml")
-
-    scheduler = Scheduler(airports, hubs, default_hub)
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Airline server simulation")
+    parser.add_argument("--airports", default="src/airports.yaml", help="path to airports.yaml")
+    parser.add_argument("--routes", default="src/routes.yaml", help="path to routes.yaml")
+    parser.add_argument(
+        "--exclude",
+        default="",
+        help="comma separated airport codes hosted somewhere else (config still lists them)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=("threaded", "async"),
+        default="threaded",
+        help="threaded = a pool of handler threads per airport, async = all nodes on one event loop",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="processes to spread the airports over (1 = everything in this process, 0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--links-per-peer",
+        type=int,
+        default=4,
+        help="max pooled connections from one airport to another (0 = new connection per leg)",
+    )
+    parser.add_argument("--lease-size", type=int, default=4, help="flight plans leased per scheduler round trip")
+    parser.add_argument(
+        "--flight-interval",
+        type=float,
+        default=1.0,
+        help="seconds each airport waits between leased batches (0 = fly flat out)",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=4,
+        help="flights each airport keeps in the air at once, each until its final hop reports it landed",
+    )
+    parser.add_argument(
+        "--flight-timeout",
+        type=float,
+        default=10.0,
+        help="seconds an airport waits for a landing report before giving the flight's slot back",
+    )
+    parser.add_argument(
+        "--handlers",
+        type=int,
+        default=64,
+        help="connections each airport serves at once (threads in the threaded engine); the scheduler gets twice as many",
+    )
+    parser.add_argument(
+        "--accept-queue",
+        type=int,
+        default=128,
+        help="connections allowed to wait for a handler; past that they're told BUSY and when to retry",
+    )
+    parser.add_argument("--backlog", type=int, default=128, help="listen() backlog for airports and the scheduler")
+    parser.add_argument(
+        "--balance",
+        choices=("load", "uniform"),
+        default="load",
+        help="load = the scheduler steers destinations and layovers away from airports with the most flights in the air "
+        "(source routing only; --routing table falls back to uniform)",
+    )
+    parser.add_argument(
+        "--routing",
+        choices=("source", "table"),
+        default="source",
+        help="source = packets carry the full legs list, table = hop-by-hop next-hop lookup on the destination",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=("tcp", "udp"),
+        default=None,
+        help="how airports send legs, unless routes.yaml names one for them (default: routes.yaml, else tcp)",
+    )
+    parser.add_argument(
+        "--log-flush-interval",
+        type=float,
+        default=0.2,
+        help="seconds the background log writer batches lines before writing",
+    )
+    parser.add_argument(
+        "--log-max-bytes",
+        type=int,
+        default=10 * 1024 * 1024,
+        help="rotate an airport log once it grows past this many bytes (0 = never)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help=f"HTTP port for the /metrics stats endpoint, e.g. {METRICS_PORT} (default 0 = off; cluster workers use port+1+shard)",
+    )
+    parser.add_argument(
+        "--watch-config",
+        type=float,
+        default=0.0,
+        help="seconds between checks of airports.yaml/routes.yaml for changes, e.g. 2 (default 0 = load once)",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="also write logs/<code>.trace.jsonl, one JSON record per flight event (query with python -m src.flighttrace)",
+    )
+    parser.add_argument("--quiet", action="store_true", help="don't mirror node logs to the console")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    launched = time.perf_counter()
+    args = _parse_args(argv)
+    sink = configure_sink(
+        flush_interval=args.log_flush_interval,
+        max_bytes=args.log_max_bytes,
+        mirror_stdout=not args.quiet,
+    )
+    REGISTRY.gauge_fn("log_queue_depth", "Log lines waiting for the background writer.", sink.depth)
+    metrics_server = start_metrics_server(SCHEDULER_HOST, args.metrics_port) if args.metrics_port else None
+    watcher = ConfigWatcher(args.airports, args.routes, args.watch_config)
+    topology = watcher.load()
+    airports, hubs, default_hub = topology.airports, topology.hubs, topology.default_hub
+
+    balance = balance_mode(args.balance, args.routing)
+    if balance != args.balance:
+        print("[main] --routing table picks its own layovers, so load balancing is off (--balance uniform)")
+    # every airport keeps a session open to the scheduler, so it gets more handlers than one airport
+    scheduler = Scheduler(
+        airports,
+        hubs,
+        default_hub,
+        handlers=2 * args.handlers,
+        accept_queue=args.accept_queue,
+        backlog=args.backlog,
+        balance=balance,
+    )
     scheduler.start()
-    time.sleep(0.5)  # give the scheduler a moment to bind its socket
+    if not scheduler.ready.wait(5.0):
+        print("[main] scheduler is not listening yet, nodes will keep retrying")
+    scheduler_ready = time.perf_counter() - launched
 
-    nodes = _start_nodes(airports)
+    exclude = {code.strip().upper() for code in args.exclude.split(",") if code.strip()}
+    node_options = dict(
+        links_per_peer=args.links_per_peer,
+        lease_size=args.lease_size,
+        flight_interval=args.flight_interval,
+        window=args.window,
+        flight_timeout=args.flight_timeout,
+        handlers=args.handlers,
+        accept_queue=args.accept_queue,
+        backlog=args.backlog,
+        trace=args.trace,
+    )
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    cluster: Optional[Cluster] = None
+    fleet: Optional[Fleet] = None
+    if workers > 1:
+        cluster = Cluster(
+            topology,
+            workers,
+            dict(
+                engine=args.engine,
+                routing=args.routing,
+                exclude=exclude,
+                transport=args.transport,
+                node_options=node_options,
+                log_flush_interval=args.log_flush_interval,
+                metrics_port=args.metrics_port,
+            ),
+        )
+        cluster.start()
+    else:
+        fleet = Fleet(
+            airports,
+            hubs,
+            default_hub,
+            engine=args.engine,
+            routing=args.routing,
+            exclude=exclude,
+            transports=topology.transports,
+            transport=args.transport,
+            **node_options,
+        )
+        fleet.start()
+    startup = time.perf_counter() - launched
+    REGISTRY.gauge("startup_seconds", "Seconds from launch until every airport was listening.").set(startup)
+    print(
+        f"[main] {len(airports) - len(exclude & airports.keys())} airports up in {startup:.2f}s "
+        f"(scheduler ready after {scheduler_ready * 1000:.0f} ms)"
+    )
     print("[main] All nodes launched. Press Ctrl+C to stop.")
 
+    def _apply_topology(topology: Topology) -> None:
+        """Push a reloaded config everywhere, in an order that never strands a flight."""
+        # routes, address books and brand new airports first (see Fleet.update)
+        if cluster is not None:
+            cluster.update(topology)
+        else:
+            fleet.update(topology.airports, topology.hubs, topology.default_hub, transports=topology.transports)
+        # only now does the scheduler start planning flights to them
+        scheduler.apply_topology(topology.airports, topology.hubs, topology.default_hub)
+        # airports dropped from the config stop last, once nothing new is planned for them
+        if cluster is not None:
+            cluster.prune()
+        else:
+            fleet.prune(topology.airports)
+        print(f"[main] topology v{topology.version} applied")
+
+    watcher.subscribe(_apply_topology)
+    if args.watch_config > 0:
+        watcher.start()
+
     # Keep the process around until the user stops it.
     # I think this is like super bad practice but whatever.
     stop = False
 
     def _handle_sigint(signum, frame):
         nonlocal stop
+        if stop:
+            return  # second Ctrl+C (or the whole process group got it); already on our way out
         stop = True
         print("\n[main] Shutdown signal received, wrapping up...")
 
@@ -55,8 +249,16 @@ def main() -> None:
     while not stop:
         time.sleep(1)
 
+    watcher.stop()
     # Give nodes a sec to finish logging. So we do not forcefully close sockets.
     time.sleep(1)
+    if cluster is not None:
+        cluster.stop()
+    else:
+        fleet.stop()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    sink.close()
     print("[main] Shutdown complete.")
 
 if __name__ == "__main__":
@@ -1,15 +1,40 @@
 import json
+import random
 import socket
 import threading
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import flighttrace, wire
+from .buffers import recv_text
+from .logsink import default_sink
+from .metrics import REGISTRY, Registry
+from .pool import LINK_HELLO, LINK_OK, ConnectionPool
+from .routing import MAX_HOPS, RoutingTable
 from .scheduler import SCHEDULER_HOST, SCHEDULER_PORT
+from .udp import Arrival, UdpTransport
+from .window import FLIGHT_TIMEOUT, FlightWindow
+from .workers import WorkerPool, turn_away
 
 # Each airport runs the same Node class with a different code/port.
 
+# Retry delays for reaching the scheduler: doubles from BASE up to CAP, with jitter
+# so a whole fleet that started together doesn't knock in lockstep.
+REGISTER_BACKOFF_BASE = 0.05
+REGISTER_BACKOFF_CAP = 5.0
+# longest a windowed session sits waiting for room before it checks on itself again
+WINDOW_POLL = 0.5
+# Arrivals are served by a fixed pool of handler threads (see workers.py).
+# A framed link that sits idle this long while others wait for a handler hangs
+# up to make room; the sender's pool just reconnects on its next leg.
+IDLE_YIELD = 1.0
+# a queued connection still not picked up after this long is told BUSY instead
+QUEUE_WAIT = 2.0
+# tries for one leg against a peer that keeps answering BUSY
+BUSY_RETRIES = 3
+
 class Node:
     """Simple TCP peer that can accept flights and fly to other peers."""
 
@@ -19,6 +44,18 @@ class Node:
         listen_host: str,
         listen_port: int,
         airports: Dict[str, str],
+        links_per_peer: int = 4,
+        lease_size: int = 4,
+        flight_interval: float = 1.0,
+        routes: Optional[RoutingTable] = None,
+        transport: str = "tcp",
+        window: int = 4,
+        flight_timeout: float = FLIGHT_TIMEOUT,
+        handlers: int = 64,
+        accept_queue: int = 128,
+        backlog: int = 128,
+        trace: bool = False,
+        registry: Registry = REGISTRY,
     ) -> None:
         self.code = code.upper()
         self.listen_host = listen_host
@@ -26,28 +63,173 @@ class Node:
         self.airports = airports
         self.running = False
         self._server_thread: Optional[threading.Thread] = None
+        self._server_socket: Optional[socket.socket] = None
+        # set once the listener is bound, so callers can wait for it instead of sleeping
+        self.ready = threading.Event()
+        self._flying = False
+        self._addr_cache: Dict[str, Tuple[str, int]] = {}
+        # links_per_peer=0 falls back to one connection per leg (the original behaviour)
+        self.pool: Optional[ConnectionPool] = ConnectionPool(self.code, links_per_peer) if links_per_peer > 0 else None
+        # flips to False the first time the scheduler doesn't answer our HELLO frame
+        self._scheduler_framed = True
+        # plans leased per scheduler round trip, and the pause between batches
+        self.lease_size = max(1, lease_size)
+        self.flight_interval = flight_interval
+        # with a routing table flights carry only their destination and hop by next-hop lookup
+        self.routes = routes
+        # "tcp" or "udp": how this node sends legs. Arrivals are taken on both either way.
+        self.transport = transport
+        # outbound flights in the air at once, each until its final hop reports back (v5 schedulers)
+        self.window = FlightWindow(window, flight_timeout)
+        # the open v5 scheduler session, for COMPLETE/DONE/LEASE frames from any thread
+        self._scheduler_stream: Optional[wire.FrameStream] = None
+        self._scheduler_lock = threading.Lock()
+        # inbound connections: listen backlog, then at most `handlers` served and `accept_queue` waiting
+        self.backlog = backlog
+        self.handlers = max(1, handlers)
+        self.accept_queue = max(0, accept_queue)
+        # where this airport's metrics go; simulation.py hands each run its own so nothing lands in REGISTRY
+        self.registry = registry
+        # the LogSink makes the folder on the first write
         log_dir = Path("logs")
-        log_dir.mkdir(exist_ok=True)
         self.log_path = log_dir / f"{self.code.lower()}.log"
+        # --trace: one JSON record per flight event as well, for python -m src.flighttrace
+        self.trace_path: Optional[Path] = log_dir / f"{self.code.lower()}{flighttrace.TRACE_SUFFIX}" if trace else None
+        self.trace_clock: Callable[[], int] = time.monotonic_ns
+        # jitter for backoffs and BUSY waits; simulation.py swaps in its seeded one
+        self.rng = random.Random()
+        self.sink = default_sink()
+        # replies are the same bytes every time, so build them once
+        self._ack_frame = wire.encode_ack(self.code)
+        self._ack_text = f"ACK from {self.code}".encode("utf-8")
+        self._init_io()
+        self._init_metrics()
+
+    def _init_io(self) -> None:
+        """The socket-side machinery: UDP transport, arrival handlers, launchers. SimNode has none of it."""
+        self.udp = UdpTransport(self.code, self.listen_host, self.listen_port, self._on_datagrams, registry=self.registry)
+        self.arrivals = WorkerPool(f"{self.code}-arrivals", self.handlers, self.accept_queue, QUEUE_WAIT, self._shed, self._log)
+        # windowed plans are flown by a few launcher threads, not one thread per flight; the window
+        # caps how many can be waiting, so `window` of them (plus as much queue) never sheds
+        self.launcher = WorkerPool(f"{self.code}-launches", self.window.size, self.window.size, log=self._log)
+
+    def _init_metrics(self) -> None:
+        """Grab this airport's metric handles once so the hot path is just .inc()/.observe()."""
+        registry = self.registry
+        legs = "Flight legs handled, by airport and direction."
+        self._legs_sent = registry.counter("node_legs_total", legs, airport=self.code, kind="sent")
+        self._legs_forwarded = registry.counter("node_legs_total", legs, airport=self.code, kind="forwarded")
+        self._legs_received = registry.counter("node_legs_total", legs, airport=self.code, kind="received")
+        self._ack_latency = registry.histogram(
+            "node_ack_latency_seconds", "Time from handing a leg to the next airport until its ACK.", airport=self.code
+        )
+        self._connect_failures = registry.counter(
+            "node_connect_failures_total", "Legs that could not be delivered to the next airport.", airport=self.code
+        )
+        self._inbound = registry.gauge("node_connections_active", "Inbound connections currently open.", airport=self.code)
+        registry.gauge_fn("node_pool_links_open", "Outbound pooled links currently open.", self._open_links, airport=self.code)
+        registry.gauge_fn(
+            "node_flights_in_air", "Flights this airport launched that haven't been reported landed.", self._in_air, airport=self.code
+        )
+        self._reports_sent = registry.counter(
+            "node_completions_reported_total", "Landings this airport reported to the scheduler as the final hop.", airport=self.code
+        )
+        self._unconfirmed = registry.counter(
+            "node_flights_unconfirmed_total", "Flights whose window slot was given back without a landing report.", airport=self.code
+        )
+        registry.gauge_fn(
+            "node_accept_queue_depth", "Inbound connections waiting for a free handler.", self._queue_depth, airport=self.code
+        )
+        self._shed_count = registry.counter(
+            "node_connections_shed_total", "Inbound connections turned away with BUSY because the queue was full.", airport=self.code
+        )
+        busy = "BUSY replies this airport got back, by who sent them."
+        self._busy_peer = registry.counter("node_busy_replies_total", busy, airport=self.code, source="airport")
+        self._busy_scheduler = registry.counter("node_busy_replies_total", busy, airport=self.code, source="scheduler")
+
+    def _drop_gauges(self) -> None:
+        """Unhook the callback gauges: a stopped airport stops being scraped and its Node can be freed."""
+        for name in ("node_pool_links_open", "node_flights_in_air", "node_accept_queue_depth"):
+            self.registry.remove(name, airport=self.code)
+
+    def _open_links(self) -> int:
+        return self.pool.stats()["open"] if self.pool is not None else 0
+
+    def _in_air(self) -> int:
+        return len(self.window)
+
+    def _queue_depth(self) -> int:
+        return self.arrivals.depth()
 
     def start(self) -> None:
         """Start the listener and grab a flight plan from the scheduler."""
+        self.start_listener()
+        self.start_flying()
+
+    def start_listener(self) -> None:
+        """Bind and take arrivals in the background; `ready` is set once the port is bound."""
         if self.running:
             return
         self.running = True
+        self._open_udp()
+        self.arrivals.start()
         self._server_thread = threading.Thread(target=self._serve_forever, daemon=True)
         self._server_thread.start()
         self._log(f"Node {self.code} started on {self.listen_host}:{self.listen_port}")
 
+    def _open_udp(self) -> None:
+        """Bind the UDP side on the same port number. Without it this node just sends over TCP."""
+        try:
+            self.udp.open()
+        except OSError as exc:
+            self._log(f"No UDP on {self.listen_host}:{self.listen_port}, legs go over TCP: {exc}")
+
+    def start_flying(self) -> None:
+        """Start leasing plans from the scheduler (only once, and only while running)."""
+        if self._flying or not self.running:
+            return
+        self._flying = True
         # Hop onto the scheduler in the background so main() can keep launching nodes. (gpt assist)
         threading.Thread(target=self._request_and_fly, daemon=True).start()
 
+    def stop(self) -> None:
+        """Stop taking arrivals and plans. Connections already open finish what they're doing."""
+        self.running = False
+        server = self._server_socket
+        if server is not None:
+            try:
+                server.shutdown(socket.SHUT_RDWR)  # wakes the accept() in _serve_forever
+            except OSError:
+                pass
+            server.close()
+        self.arrivals.stop()
+        self.launcher.stop()
+        if self.pool is not None:
+            self.pool.close()
+        self.udp.close()
+        self.window.wake()
+        self._drop_gauges()
+        self._log(f"Node {self.code} stopped.")
+
+    def update_airports(self, airports: Dict[str, str]) -> None:
+        """Swap in a reloaded airports table. Pooled links stay up; only lookups change."""
+        # airports first: a lookup that still grabs the old cache writes into a dict nobody reads again
+        self.airports = airports
+        self._addr_cache = {}
+
     def _serve_forever(self) -> None:
         """Accept inbound flights and log the details."""
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
             server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            server.bind((self.listen_host, self.listen_port))
-            server.listen(4)
+            try:
+                server.bind((self.listen_host, self.listen_port))
+            except OSError as exc:
+                self.running = False
+                self._log(f"Could not listen on {self.listen_host}:{self.listen_port}: {exc}")
+                return
+            server.listen(self.backlog)
+            self._server_socket = server
+            self.ready.set()
             self._log("Ready for arrivals.")
 
             while self.running:
@@ -55,67 +237,416 @@ class Node:
                     conn, addr = server.accept()
                 except OSError:
                     break
-                threading.Thread(target=self._handle_arrival, args=(conn, addr), daemon=True).start()
+                if not self.arrivals.submit(self._handle_arrival, conn, addr):
+                    self._shed(conn, addr)
+
+    def _shed(self, conn: socket.socket, addr: Tuple[str, int]) -> None:
+        """No handler for this connection any time soon: tell the peer BUSY and when to retry."""
+        retry_after, depth = self.arrivals.retry_after(), self.arrivals.depth()
+        self._note_shed(addr, retry_after, depth)
+        turn_away(conn, retry_after, depth)
+
+    def _note_shed(self, addr: Tuple[str, int], retry_after: float, depth: int) -> None:
+        self._shed_count.inc()
+        shed = int(self._shed_count.value)
+        # first one and every hundredth after, a burst shouldn't flood the log
+        if shed == 1 or shed % 100 == 0:
+            self._log(f"Busy: turned away {addr} ({shed} so far, {depth} queued), retry in {retry_after * 1000:.0f} ms")
 
     def _handle_arrival(self, conn: socket.socket, addr: Tuple[str, int]) -> None:
         """Handle one inbound connection until it closes."""
+        self._inbound.inc()
+        try:
+            self._serve_arrival(conn, addr)
+        finally:
+            self._inbound.dec()
+
+    def _serve_arrival(self, conn: socket.socket, addr: Tuple[str, int]) -> None:
+        """Work out which protocol the peer speaks from the first bytes and serve it."""
+        stream = wire.FrameStream(conn)
         with conn:
-            raw = conn.recv(1024).decode("utf-8").strip()
-            if not raw:
-                return
+            try:
+                first = stream.peek()
+                if wire.is_framed(first):
+                    self._serve_frames(conn, addr, stream)
+                    return
 
-            flight = self._try_parse_flight_message(raw)
-            if not flight:
-                self._log(f"Arrival from {addr}: {raw}")
-                conn.sendall(f"ACK from {self.code}".encode("utf-8"))
+                # text protocols: the JSON/hello text is the message itself, so it does get decoded
+                try:
+                    raw = str(first, "utf-8").strip()
+                except UnicodeDecodeError:
+                    self._log(f"Arrival from {addr}: not UTF-8 text, closing.")
+                    return
+                if not raw:
+                    return
+
+                if raw.startswith(f"{LINK_HELLO} "):
+                    self._serve_link(conn, addr)
+                    return
+
+                flight = self._try_parse_flight_message(raw)
+                if not flight:
+                    self._log(f"Arrival from {addr}: {raw}")
+                    conn.sendall(self._ack_text)
+                    return
+
+                self._log_arrival(flight)
+                conn.sendall(self._ack_text)
+                self._after_arrival(flight)
+            finally:
+                stream.release()
+
+    def _serve_link(self, conn: socket.socket, addr: Tuple[str, int]) -> None:
+        """Pooled link: one JSON flight per line, one ACK line back, until the peer hangs up."""
+        conn.sendall(f"{LINK_OK}\n".encode("utf-8"))
+        with conn.makefile("rb") as reader:
+            for line in reader:
+                try:
+                    raw = line.decode("utf-8").strip()
+                except UnicodeDecodeError:
+                    self._log(f"Arrival from {addr}: not UTF-8 text, closing the link.")
+                    return
+                if not raw:
+                    continue
+                flight = self._try_parse_flight_message(raw)
+                if not flight:
+                    self._log(f"Arrival from {addr}: {raw}")
+                    conn.sendall(self._ack_text + b"\n")
+                    continue
+
+                self._log_arrival(flight)
+                # ACK before forwarding so the upstream link is free again right away
+                conn.sendall(self._ack_text + b"\n")
+                self._after_arrival(flight)
+
+    def _serve_frames(self, conn: socket.socket, addr: Tuple[str, int], stream: wire.FrameStream) -> None:
+        """Framed link: HELLO handshake, then FLIGHT frames in and ACK frames out."""
+        try:
+            frame = stream.read_frame()
+            if frame is None or frame[1] != wire.HELLO:
                 return
+            stream.send(wire.encode_hello(self.code, wire.negotiate(frame[0])))
 
-            legs: List[str] = flight["legs"]
-            from_idx: int = flight["from_idx"]
-            to_idx: int = flight["to_idx"]
-            payload: str = flight["payload"]
-            flight_id: str = flight["flight_id"]
+            conn.settimeout(IDLE_YIELD)
+            while True:
+                try:
+                    frame = stream.read_frame()
+                except socket.timeout:
+                    # read_frame picks up where it left off, so a stall mid-frame is fine too
+                    if self.arrivals.depth() or not self.running:
+                        return  # idle while others queue (or we're stopping): give the handler back
+                    continue
+                if frame is None:
+                    return
+                _, frame_type, body = frame
+                if frame_type == wire.FLIGHT:
+                    flight = wire.decode_flight_body(body)
+                elif frame_type == wire.ROUTED:
+                    flight = wire.decode_routed_body(body)
+                else:
+                    self._log(f"Arrival from {addr}: unexpected frame type {frame_type}")
+                    continue
+
+                self._log_arrival(flight)
+                stream.send(self._ack_frame)
+                self._after_arrival(flight)
+        except wire.FrameError as exc:
+            self._log(f"Bad frame from {addr}: {exc}")
+
+    def _on_datagrams(self, arrivals: List[Arrival]) -> None:
+        """UDP legs, already ACKed by the transport. Runs on its receive thread."""
+        for frame_type, body, addr in arrivals:
+            try:
+                flight = wire.decode_flight_frame(frame_type, body)
+            except wire.FrameError as exc:
+                self._log(f"Bad datagram from {addr}: {exc}")
+                continue
+            self._log_arrival(flight)
+            # forwarding can mean a TCP round trip; on this thread that would hold up every SACK
+            # behind it (and bring on resends), so an arrival handler does it. Queue full: do it here.
+            if not self.arrivals.submit_accepted(self._after_arrival, flight):
+                self._after_arrival(flight)
+
+    def _log_arrival(self, flight: Dict[str, Any]) -> None:
+        """Log the arrival line for a parsed flight packet."""
+        self._legs_received.inc()
+        if self.trace_path is not None:
+            self._trace_leg("arrive", flight, **{"from": flight["prev"] if "dest" in flight else flight["legs"][flight["from_idx"]]})
+        if "dest" in flight:
+            self._log(f"Flight {flight['flight_id']} arrived: {flight['prev']} -> {self.code} carrying {flight['payload']}")
+            return
 
-            if to_idx >= len(legs) or legs[to_idx] != self.code:
-                self._log(
-                    f"Flight {flight_id} arrived from {legs[from_idx]} but route expected {legs[to_idx] if to_idx < len(legs) else 'unknown'}; current node {self.code}."
-                )
-            else:
-                leg_desc = f"{legs[from_idx]} -> {self.code}"
-                self._log(f"Flight {flight_id} arrived: {leg_desc} carrying {payload}")
+        legs: List[str] = flight["legs"]
+        from_idx: int = flight["from_idx"]
+        to_idx: int = flight["to_idx"]
+
+        if to_idx >= len(legs) or legs[to_idx] != self.code:
+            self._log(
+                f"Flight {flight['flight_id']} arrived from {legs[from_idx]} but route expected {legs[to_idx] if to_idx < len(legs) else 'unknown'}; current node {self.code}."
+            )
+        else:
+            leg_desc = f"{legs[from_idx]} -> {self.code}"
+            self._log(f"Flight {flight['flight_id']} arrived: {leg_desc} carrying {flight['payload']}")
+
+    def _after_arrival(self, flight: Dict[str, Any]) -> None:
+        """Forward the flight to its next leg, or mark it done if we are the last stop."""
+        if "dest" in flight:
+            if flight["dest"] == self.code:
+                self._landed(flight)
+            elif self.running:
+                self._send_routed(flight["flight_id"], flight["payload"], flight["origin"], flight["dest"], flight["hops"])
+            return
 
-            conn.sendall(f"ACK from {self.code}".encode("utf-8"))
+        legs: List[str] = flight["legs"]
+        to_idx: int = flight["to_idx"]
+        if to_idx < len(legs) - 1 and self.running:
+            self._send_leg(legs, flight["payload"], flight["flight_id"], to_idx)
+        elif to_idx == len(legs) - 1:
+            self._landed(flight)
+
+    def _landed(self, flight: Dict[str, Any]) -> None:
+        """We're the last stop: log it and report it, so the scheduler (and through it the origin) knows."""
+        flight_id = flight["flight_id"]
+        self._log(f"Flight {flight_id} completed at {self.code}.")
+        origin = flight.get("origin") or flight["legs"][0]
+        self._trace(flight_id, "land", flight["hops"] if "dest" in flight else flight["to_idx"], origin)
+        if self._to_scheduler(wire.encode_complete(origin, self.code, flight_id)):
+            self._reports_sent.inc()
+
+    def _to_scheduler(self, frame: bytes) -> bool:
+        """Write a frame on the open v5 scheduler session, from any thread. False if there isn't one."""
+        with self._scheduler_lock:
+            stream = self._scheduler_stream
+            if stream is None:
+                return False
+            try:
+                stream.send(frame)
+            except OSError:
+                return False
+        return True
 
-            if to_idx < len(legs) - 1 and self.running:
-                self._send_leg(legs, payload, flight_id, to_idx)
-            elif to_idx == len(legs) - 1:
-                self._log(f"Flight {flight_id} completed at {self.code}.")
+    def _backoff(self, failures: int) -> float:
+        """How long to wait after `failures` misses in a row: exponential, half of it random."""
+        ceiling = min(REGISTER_BACKOFF_CAP, REGISTER_BACKOFF_BASE * 2 ** (failures - 1))
+        return ceiling / 2 + self.rng.random() * ceiling / 2
+
+    def _scheduler_down(self, failures: int, text: str) -> None:
+        # first miss and every tenth after that, so a long outage doesn't flood the log
+        if failures == 1 or failures % 10 == 0:
+            self._log(text)
 
     def _request_and_fly(self) -> None:
         """Keeps registering with scheduler until stopped."""
+        failures = 0
         while self.running:
             try:
                 with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
                     sock.connect((SCHEDULER_HOST, SCHEDULER_PORT))
-                    sock.sendall(self.code.encode("utf-8"))
-                    plan = sock.recv(1024).decode("utf-8").strip()
-                    if not plan.startswith("FLIGHT"):
-                        self._log(f"Got odd plan text: {plan}")
-                        time.sleep(1.0)
-                        continue
-
-                    self._log(f"Received plan: {plan}")
-                    legs, payload, flight_id = self._parse_plan(plan)
-                    self._fly_route(legs, payload, flight_id)
-                    sock.sendall(f"{self.code} complete".encode("utf-8"))
+                    failures = 0
+                    if self._scheduler_framed:
+                        if not self._request_and_fly_framed(sock):
+                            continue  # scheduler only speaks text, ask again the old way
+                    else:
+                        sock.sendall(self.code.encode("utf-8"))
+                        plan = recv_text(sock)
+                        busy = wire.parse_busy_text(plan)
+                        if busy is not None:
+                            raise busy
+                        if not plan.startswith("FLIGHT"):
+                            self._log(f"Got odd plan text: {plan}")
+                            time.sleep(1.0)
+                            continue
+
+                        self._log(f"Received plan: {plan}")
+                        legs, payload, flight_id = self._parse_plan(plan)
+                        self._fly_route(legs, payload, flight_id)
+                        sock.sendall(f"{self.code} complete".encode("utf-8"))
+            except wire.PeerBusy as busy:
+                # not a failure: it's up, just full. Come back when it says, not on the backoff clock
+                self._busy_scheduler.inc()
+                self._scheduler_down(
+                    int(self._busy_scheduler.value), f"Scheduler is busy ({busy.depth} queued), retrying in {busy.retry_after * 1000:.0f} ms."
+                )
+                time.sleep(self._busy_wait(busy))
+                continue
             except ConnectionRefusedError:
-                self._log("Scheduler is offline, could not register.")
+                failures += 1
+                self._scheduler_down(failures, "Scheduler is offline, could not register.")
             except OSError as exc:
-                self._log(f"Network error while flying: {exc}")
+                failures += 1
+                self._scheduler_down(failures, f"Network error while flying: {exc}")
 
             if not self.running:
                 break
-            time.sleep(1.0)
+            time.sleep(self._backoff(failures) if failures else 1.0)
+
+    def _request_and_fly_framed(self, sock: socket.socket) -> bool:
+        """Framed scheduler session. Returns False if the scheduler is text-only.
+
+        On v2+ the connection stays open: lease a batch of plans in one round
+        trip, fly them, and drop a DONE frame for each as it finishes.
+        """
+        sock.sendall(wire.encode_hello(self.code))
+        stream = wire.FrameStream(sock)
+        try:
+            return self._leased_session(stream)
+        finally:
+            stream.release()
+
+    def _leased_session(self, stream: wire.FrameStream) -> bool:
+        """Body of _request_and_fly_framed; the caller owns the stream's buffer."""
+        try:
+            if not wire.is_framed(stream.peek()):
+                self._scheduler_framed = False
+                return False
+            frame = stream.read_frame()
+            if frame is not None and frame[1] == wire.BUSY:
+                raise wire.decode_busy_body(frame[2])
+            if frame is None or frame[1] != wire.HELLO:
+                self._scheduler_framed = False
+                return False
+            version = wire.negotiate(frame[0])
+        except wire.FrameError as exc:
+            self._log(f"Got odd plan frame: {exc}")
+            return True
+
+        if version < wire.LEASE_VERSION:
+            # older scheduler: one plan per connection, like the text protocol
+            stream.send(wire.encode_frame(wire.REGISTER, self.code.encode("ascii")))
+            plan = self._read_plan(stream)
+            if plan is not None:
+                self._fly_plan(stream, plan)
+            return True
+
+        if version >= wire.COMPLETE_VERSION:
+            self._windowed_session(stream)
+            return True
+
+        # v2-v4: lease a batch, fly it one plan at a time, DONE once each first leg is ACKed
+        while self.running:
+            stream.send(wire.encode_lease(self.code, self.lease_size))
+            plans = [self._read_plan(stream) for _ in range(self.lease_size)]
+            for plan in plans:
+                if plan is not None and self.running:
+                    self._fly_plan(stream, plan)
+            if self.running:
+                time.sleep(self.flight_interval)
+        return True
+
+    def _windowed_session(self, stream: wire.FrameStream) -> None:
+        """v5 session: up to `window` flights in the air, each holding its slot until it's reported landed.
+
+        This thread leases plans whenever there's room (at most lease_size per
+        LEASE, then a flight_interval pause). A reader thread launches PLANs as
+        they come in and frees slots as COMPLETE reports come back, so nothing
+        here ever waits on a leg's ACK.
+        """
+        with self._scheduler_lock:
+            self._scheduler_stream = stream
+        self.launcher.start()
+        reader = threading.Thread(target=self._read_session, args=(stream,), daemon=True)
+        reader.start()
+        try:
+            while self.running and reader.is_alive():
+                for flight_id in self.window.expire():
+                    self._give_up(flight_id, f"no landing report after {self.window.timeout:g}s")
+                room = min(self.window.wait_for_room(WINDOW_POLL), self.lease_size)
+                if room <= 0 or not self.running or not reader.is_alive():
+                    continue
+                self.window.reserve(room)
+                if not self._to_scheduler(wire.encode_lease(self.code, room)):
+                    break
+                if self.flight_interval:
+                    time.sleep(self.flight_interval)
+        finally:
+            with self._scheduler_lock:
+                self._scheduler_stream = None
+            try:
+                # the reader is parked in recv on this socket; get it out before the stream's buffer goes back
+                stream.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            reader.join()
+            dropped = self.window.clear()
+            if dropped:
+                self._log(f"Scheduler session ended with {dropped} flights not reported landed yet.")
+
+    def _read_session(self, stream: wire.FrameStream) -> None:
+        """Reader half of _windowed_session: PLANs to launch, COMPLETEs to settle."""
+        try:
+            while True:
+                frame = stream.read_frame()
+                if frame is None:
+                    return
+                _, frame_type, body = frame
+                if frame_type == wire.PLAN:
+                    plan = self._decode_plan(body)
+                    if plan is None or not self.running:
+                        self.window.unreserve()
+                        continue
+                    self.window.launched(plan[2])
+                    if not self.launcher.submit(self._launch, plan) and self.window.finish(plan[2]):
+                        self._give_up(plan[2], "no launcher free to fly it")
+                elif frame_type == wire.COMPLETE:
+                    self._confirmed(*wire.decode_complete_body(body)[1:])
+                else:
+                    self._log(f"Got odd plan frame: {frame_type}")
+        except (OSError, wire.FrameError, UnicodeDecodeError) as exc:
+            if self.running:
+                self._log(f"Lost the scheduler session: {exc}")
+        finally:
+            self.window.wake()
+
+    def _confirmed(self, final: str, flight_id: str) -> None:
+        """COMPLETE came back for one of our flights: its slot is free."""
+        if self.window.finish(flight_id):
+            self._log(f"Flight {flight_id} confirmed landed at {final}.")
+            self._trace(flight_id, "confirm", final=final)
+
+    def _launch(self, plan: Tuple[List[str], str, str]) -> None:
+        """Fly one windowed plan. Its slot stays taken until the landing report, unless it never leaves."""
+        legs, payload, flight_id = plan
+        self._log(f"Received plan: {wire.format_plan(legs, payload, flight_id)}")
+        if not self._fly_route(legs, payload, flight_id) and self.window.finish(flight_id):
+            self._give_up(flight_id, "it never left")
+
+    def _leg_failed(self, flight: Dict[str, Any]) -> None:
+        """A UDP leg gave up after its retries. If it was one of our own launches, free its slot."""
+        if flight.get("origin", flight["legs"][0]) == self.code and self.window.finish(flight["flight_id"]):
+            self._give_up(flight["flight_id"], "its first leg never got through")
+
+    def _give_up(self, flight_id: str, reason: str) -> None:
+        """Slot already freed; tell the scheduler with a DONE so it stops counting the plan as out."""
+        self._unconfirmed.inc()
+        self._log(f"Flight {flight_id} not confirmed: {reason}.")
+        self._trace(flight_id, "unconfirmed", reason=reason)
+        self._to_scheduler(wire.encode_frame(wire.DONE, flight_id.encode("ascii")))
+
+    def _read_plan(self, stream: wire.FrameStream) -> Optional[Tuple[List[str], str, str]]:
+        """Read one PLAN frame; None (already logged) if it was something else."""
+        frame = stream.read_frame()
+        if frame is None:
+            raise ConnectionResetError("scheduler closed the session")
+        if frame[1] != wire.PLAN:
+            self._log(f"Got odd plan frame: {frame[1]}")
+            return None
+        return self._decode_plan(frame[2])
+
+    def _decode_plan(self, body: bytes) -> Optional[Tuple[List[str], str, str]]:
+        """PLAN body -> (legs, payload, flight_id); None (already logged) if it doesn't parse."""
+        try:
+            plan = wire.decode_flight_body(body)
+        except wire.FrameError as exc:
+            self._log(f"Got odd plan frame: {exc}")
+            return None
+        return plan["legs"], plan["payload"], plan["flight_id"]
+
+    def _fly_plan(self, stream: wire.FrameStream, plan: Tuple[List[str], str, str]) -> None:
+        """Fly one leased plan and tell the scheduler, without waiting for an answer."""
+        legs, payload, flight_id = plan
+        self._log(f"Received plan: {wire.format_plan(legs, payload, flight_id)}")
+        self._fly_route(legs, payload, flight_id)
+        stream.send(wire.encode_frame(wire.DONE, flight_id.encode("ascii")))
 
     def _parse_plan(self, plan: str) -> Tuple[List[str], str, str]:
         """Turn 'FLIGHT A >> B >> C | cargo | id:0001' into workable goodies"""
@@ -132,42 +663,138 @@ class Node:
         legs = [segment.strip() for segment in route_part.split(">>") if segment.strip()]
         return legs, payload, flight_id
 
-    def _fly_route(self, legs: List[str], payload: str, flight_id: str) -> None:
-        """Dispatch the first leg; downstream nodes forward the rest."""
+    def _fly_route(self, legs: List[str], payload: str, flight_id: str) -> bool:
+        """Dispatch the first leg; downstream nodes forward the rest. False if it didn't leave."""
+        self._trace(flight_id, "plan", route=legs)
         if len(legs) <= 1:
             self._log(f"Flight {flight_id}: no legs to fly, staying put.")
-            return
+            return False
 
-        self._send_leg(legs, payload, flight_id, 0)
+        if self.routes is not None:
+            # the table picks the way; only the destination from the plan matters
+            return self._send_routed(flight_id, payload, self.code, legs[-1], 0)
+        return self._send_leg(legs, payload, flight_id, 0)
 
-    def _send_leg(self, legs: List[str], payload: str, flight_id: str, from_idx: int) -> None:
+    def _send_leg(self, legs: List[str], payload: str, flight_id: str, from_idx: int) -> bool:
         """Send the next leg in the route starting from legs[from_idx]."""
         to_idx = from_idx + 1
         if to_idx >= len(legs):
-            return
+            return False
 
         target_code = legs[to_idx]
-        packet = json.dumps(
-            {
-                "flight_id": flight_id,
-                "payload": payload,
-                "legs": legs,
-                "from_idx": from_idx,
-                "to_idx": to_idx,
-            }
-        )
-
+        flight = {
+            "flight_id": flight_id,
+            "payload": payload,
+            "legs": legs,
+            "from_idx": from_idx,
+            "to_idx": to_idx,
+        }
+        verb = "Forwarded" if from_idx > 0 else "Sent"
+        (self._legs_forwarded if from_idx > 0 else self._legs_sent).inc()
+        return self._send_flight(target_code, flight, f"{verb} flight {flight_id}: {legs[from_idx]} -> {target_code} carrying {payload}")
+
+    def _send_routed(self, flight_id: str, payload: str, origin: str, dest: str, hops: int) -> bool:
+        """Forward a routed flight one hop closer to dest using the routing table."""
+        flight = self._routed_packet(flight_id, payload, origin, dest, hops)
+        if flight is None:
+            return False
+        target_code = flight["legs"][1]
+        verb = "Forwarded" if origin != self.code else "Sent"
+        (self._legs_forwarded if origin != self.code else self._legs_sent).inc()
+        return self._send_flight(target_code, flight, f"{verb} flight {flight_id}: {self.code} -> {target_code} carrying {payload}")
+
+    def _routed_packet(self, flight_id: str, payload: str, origin: str, dest: str, hops: int) -> Optional[Dict[str, Any]]:
+        """Build the outgoing routed packet, or log why it can't go anywhere."""
+        if hops >= MAX_HOPS:
+            self._log(f"Flight {flight_id} dropped at {self.code}: hop limit reached on the way to {dest}.")
+            self._trace(flight_id, "drop", hops, origin, reason="hop limit")
+            return None
+        path = self.routes.path(self.code, dest) if self.routes is not None else []
+        if len(path) < 2:
+            self._log(f"No route from {self.code} to {dest} for flight {flight_id}.")
+            self._trace(flight_id, "drop", hops, origin, reason=f"no route to {dest}")
+            return None
+        return {
+            "flight_id": flight_id,
+            "payload": payload,
+            "origin": origin,
+            "prev": self.code,
+            "dest": dest,
+            "hops": hops + 1,
+            # fallback for peers that only understand source-routed legs
+            "legs": path,
+            "from_idx": 0,
+            "to_idx": 1,
+        }
+
+    def _send_flight(self, target_code: str, flight: Dict[str, Any], summary: str) -> bool:
+        """Hand one packet to target_code (pooled link or one-shot) and log the reply.
+
+        False if it couldn't be delivered. A UDP leg counts as delivered once
+        it's queued; if its retries run out later, _leg_failed hears about it.
+        """
+        self._trace_leg("depart", flight, to=target_code)
         try:
             host, port = self._lookup_airport(target_code)
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.connect((host, port))
-                sock.sendall(packet.encode("utf-8"))
-                ack = sock.recv(1024).decode("utf-8").strip()
-                leg_desc = f"{legs[from_idx]} -> {target_code}"
-                verb = "Forwarded" if from_idx > 0 else "Sent"
-                self._log(f"{verb} flight {flight_id}: {leg_desc} carrying {payload} | Reply: {ack}")
-        except OSError as exc:
-            self._log(f"Could not reach {target_code} for flight {flight_id}: {exc}")
+            if self.transport == "udp" and self.udp.sock is not None:
+                self._send_datagram((host, port), target_code, flight, summary)
+                return True
+            started = time.perf_counter()
+            for attempt in range(1, BUSY_RETRIES + 1):
+                try:
+                    ack = self._deliver_leg((host, port), flight)
+                    break
+                except wire.PeerBusy as busy:
+                    # holding this thread while we wait is the point: it slows our own upstream down too
+                    self._busy_peer.inc()
+                    if attempt == BUSY_RETRIES or not self.running:
+                        raise
+                    time.sleep(self._busy_wait(busy))
+            self._ack_latency.observe(time.perf_counter() - started)
+            self._log(f"{summary} | Reply: {ack}")
+            self._trace_leg("ack", flight, to=target_code)
+            return True
+        except (OSError, RuntimeError) as exc:
+            # RuntimeError: target isn't in the config (any more, after a reload)
+            self._connect_failures.inc()
+            self._log(f"Could not reach {target_code} for flight {flight['flight_id']}: {exc}")
+            self._trace_leg("fail", flight, to=target_code, reason=str(exc))
+            return False
+
+    def _deliver_leg(self, addr: Tuple[str, int], flight: Dict[str, Any]) -> str:
+        """One TCP attempt at a leg; returns the ACK text, raises wire.PeerBusy if the peer shed us."""
+        if self.pool is not None:
+            return self.pool.send(addr, flight)
+        packet = wire.flight_json(flight["flight_id"], flight["payload"], flight["legs"], flight["from_idx"], flight["to_idx"])
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.connect(addr)
+            sock.sendall(packet.encode("utf-8"))
+            ack = recv_text(sock)
+        busy = wire.parse_busy_text(ack)
+        if busy is not None:
+            raise busy
+        return ack
+
+    def _busy_wait(self, busy: wire.PeerBusy) -> float:
+        """The peer's retry hint plus up to half again, so everyone it shed doesn't come back at once."""
+        return busy.retry_after * (1 + self.rng.random() / 2)
+
+    def _send_datagram(self, addr: Tuple[str, int], target_code: str, flight: Dict[str, Any], summary: str) -> None:
+        """UDP leg: returns right away, the reply gets logged when the SACK comes back."""
+        started = time.perf_counter()
+
+        def done(ack: Optional[str], exc: Optional[Exception]) -> None:
+            if exc is not None:
+                self._connect_failures.inc()
+                self._log(f"Could not reach {target_code} for flight {flight['flight_id']}: {exc}")
+                self._trace_leg("fail", flight, to=target_code, reason=str(exc))
+                self._leg_failed(flight)
+                return
+            self._ack_latency.observe(time.perf_counter() - started)
+            self._log(f"{summary} | Reply: {ack}")
+            self._trace_leg("ack", flight, to=target_code)
+
+        self.udp.send(addr, wire.flight_frame(flight), done)
 
     def _try_parse_flight_message(self, message: str) -> Optional[Dict[str, Any]]:
         """Attempt to decode a structured flight forwarding message."""
@@ -199,18 +826,38 @@ class Node:
         return data
 
     def _lookup_airport(self, code: str) -> Tuple[str, int]:
-        """Split '127.0.0.1:6003' into host/port numbers."""
+        """Split '127.0.0.1:6003' into host/port numbers (cached after the first time)."""
+        cache = self._addr_cache
+        cached = cache.get(code)
+        if cached is not None:
+            return cached
         try:
             addr = self.airports[code]
             host, port_text = addr.rsplit(":", 1)
-            return host, int(port_text)
+            resolved = (host, int(port_text))
         except (KeyError, ValueError) as exc:
             raise RuntimeError(f"Missing airport config for {code}") from exc
+        cache[code] = resolved
+        return resolved
 
     def _log(self, text: str) -> None:
-        """Append a timestamped line to the node's log file."""
+        """Queue a timestamped line for the node's log file (written by the shared LogSink)."""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        line = f"[{timestamp}] {text}\n"
-        with open(self.log_path, "a", encoding="utf-8") as fh:
-            fh.write(line)
-        print(f"[{self.code}] {text}")
+        self.sink.write(self.log_path, f"[{timestamp}] {text}\n", f"[{self.code}] {text}")
+
+    def _trace(self, flight_id: str, event: str, hop: int = 0, origin: Optional[str] = None, **fields: Any) -> None:
+        """Queue a trace record for this airport (no-op unless tracing is on). origin defaults to us."""
+        if self.trace_path is not None:
+            record = flighttrace.record(self.trace_clock(), flight_id, origin or self.code, event, self.code, hop, **fields)
+            self._write_trace(record)
+
+    def _trace_leg(self, event: str, flight: Dict[str, Any], **fields: Any) -> None:
+        """_trace for a leg packet; its hop is the leg number (routed flights count as they go)."""
+        if self.trace_path is not None:
+            if "dest" in flight:
+                self._trace(flight["flight_id"], event, flight["hops"], flight["origin"], **fields)
+            else:
+                self._trace(flight["flight_id"], event, flight["to_idx"], flight["legs"][0], **fields)
+
+    def _write_trace(self, line: str) -> None:
+        self.sink.write(self.trace_path, line)
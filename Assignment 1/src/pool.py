@@ -0,0 +1,531 @@
+import asyncio
+import socket
+import threading
+import time
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from . import wire
+from .buffers import recv_text
+
+# Long-lived airport-to-airport links.
+#
+# A pooled link first tries the binary framed protocol (see wire.py):
+#   client -> HELLO frame            server -> HELLO frame (agreed version)
+# then FLIGHT frames go one way and ACK frames come back.
+#
+# Peers that don't answer the HELLO get the older line handshake:
+#   client -> "LINK ANC\n"           server -> "LINK OK\n"
+# after which every flight is one JSON line and every reply one ACK line.
+# Peers that don't get that either are sent one JSON packet per connection,
+# exactly like the original code. Whatever a peer ends up on is remembered.
+#
+# A peer with no room answers any of these with BUSY (see wire.py); that
+# surfaces as wire.PeerBusy from send() and doesn't change the remembered mode.
+# A BUSY in place of an ACK on an open link leaves the link in the pool: the
+# caller backs off for the peer's retry hint rather than reconnecting into it.
+
+LINK_HELLO = "LINK"
+LINK_OK = "LINK OK"
+
+MODE_FRAME = "frame"
+MODE_LINE = "line"
+MODE_ONESHOT = "oneshot"
+
+Flight = Dict[str, Any]
+
+
+def _flight_args(flight: Flight) -> Tuple[str, str, List[str], int, int]:
+    return flight["flight_id"], flight["payload"], flight["legs"], flight["from_idx"], flight["to_idx"]
+
+
+class PeerLink:
+    """One open socket to a peer airport, speaking either frames or JSON lines."""
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        mode: str,
+        stream: Optional[wire.FrameStream] = None,
+        version: int = wire.MIN_VERSION,
+    ) -> None:
+        self.sock = sock
+        self.mode = mode
+        self.stream = stream
+        self.version = version
+        self.reader: Optional[BinaryIO] = sock.makefile("rb") if mode == MODE_LINE else None
+        self.last_used = time.monotonic()
+        self.uses = 0
+
+    def exchange(self, flight: Flight) -> str:
+        """Send one flight, wait for its ACK, return the ACK text."""
+        if self.mode == MODE_FRAME:
+            self.sock.sendall(wire.flight_frame(flight, self.version))
+            try:
+                frame = self.stream.read_frame()
+            except wire.FrameError as exc:
+                raise ConnectionError(str(exc)) from exc
+            if frame is None:
+                raise ConnectionResetError("peer closed the link")
+            _, frame_type, body = frame
+            if frame_type == wire.BUSY:
+                raise wire.decode_busy_body(body)
+            if frame_type != wire.ACK:
+                raise ConnectionError(f"expected ACK frame, got type {frame_type}")
+            reply = wire.ack_text(body)
+        else:
+            reply = self.exchange_line(wire.flight_json(*_flight_args(flight)))
+            busy = wire.parse_busy_text(reply)
+            if busy is not None:
+                raise busy
+        self.uses += 1
+        return reply
+
+    def exchange_line(self, line: str) -> str:
+        self.sock.sendall(line.encode("utf-8") + b"\n")
+        reply = self.reader.readline()
+        if not reply:
+            raise ConnectionResetError("peer closed the link")
+        return reply.decode("utf-8").strip()
+
+    def close(self) -> None:
+        try:
+            if self.reader is not None:
+                self.reader.close()
+        finally:
+            self.sock.close()
+            if self.stream is not None:
+                self.stream.release()
+
+
+class _PeerSlot:
+    """Bookkeeping for one peer: idle links and how many exist in total."""
+
+    def __init__(self) -> None:
+        self.idle: List[Any] = []
+        self.open = 0
+
+
+class _OneShotPeer(Exception):
+    """Internal: this peer only speaks the original one-connection-per-leg protocol."""
+
+
+class ConnectionPool:
+    """Per-node pool of persistent links, capped per peer with idle eviction."""
+
+    def __init__(
+        self,
+        owner_code: str,
+        max_per_peer: int = 4,
+        idle_timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+    ) -> None:
+        self.owner_code = owner_code
+        self.max_per_peer = max(1, max_per_peer)
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._slots: Dict[Tuple[str, int], _PeerSlot] = {}
+        self._modes: Dict[Tuple[str, int], str] = {}
+        self._cond = threading.Condition()
+        self._last_sweep = time.monotonic()
+        # set by close(); links checked in after that are closed instead of kept
+        self._closed = False
+
+    def send(self, addr: Tuple[str, int], flight: Flight) -> str:
+        """Ship one flight to addr and return the ACK text, reconnecting once if a reused link died."""
+        if self._modes.get(addr) == MODE_ONESHOT:
+            return self._send_oneshot(addr, flight)
+        try:
+            link, reused = self._checkout(addr)
+        except _OneShotPeer:
+            return self._send_oneshot(addr, flight)
+        try:
+            reply = link.exchange(flight)
+        except wire.PeerBusy:
+            # the link is fine, the peer is just full: keep it, and let the caller honour the retry hint
+            self._checkin(addr, link)
+            raise
+        except OSError:
+            self._discard(addr, link)
+            if not reused:
+                raise
+            # The idle link was probably closed on the other side; try a fresh one.
+            link, _ = self._checkout(addr, fresh=True)
+            try:
+                reply = link.exchange(flight)
+            except wire.PeerBusy:
+                self._checkin(addr, link)
+                raise
+            except OSError:
+                self._discard(addr, link)
+                raise
+        self._checkin(addr, link)
+        return reply
+
+    def mode_for(self, addr: Tuple[str, int]) -> Optional[str]:
+        return self._modes.get(addr)
+
+    def close(self) -> None:
+        """Close every idle link (busy ones close when they come back)."""
+        with self._cond:
+            self._closed = True
+            for slot in self._slots.values():
+                for link in slot.idle:
+                    link.close()
+                slot.open -= len(slot.idle)
+                slot.idle.clear()
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "peers": len(self._slots),
+                "open": sum(slot.open for slot in self._slots.values()),
+                "idle": sum(len(slot.idle) for slot in self._slots.values()),
+            }
+
+    def _checkout(self, addr: Tuple[str, int], fresh: bool = False) -> Tuple[PeerLink, bool]:
+        with self._cond:
+            self._sweep_locked()
+            slot = self._slots.setdefault(addr, _PeerSlot())
+            while True:
+                if slot.idle and not fresh:
+                    return slot.idle.pop(), True
+                if slot.open < self.max_per_peer:
+                    slot.open += 1
+                    break
+                if fresh and slot.idle:
+                    # make room by dropping the oldest idle link
+                    slot.idle.pop(0).close()
+                    slot.open -= 1
+                    continue
+                self._cond.wait()
+
+        try:
+            return self._connect(addr), False
+        except (OSError, _OneShotPeer):
+            with self._cond:
+                slot.open -= 1
+                self._cond.notify()
+            raise
+
+    def _checkin(self, addr: Tuple[str, int], link: PeerLink) -> None:
+        link.last_used = time.monotonic()
+        with self._cond:
+            slot = self._slots[addr]
+            if self._closed:
+                link.close()
+                slot.open -= 1
+            else:
+                slot.idle.append(link)
+            self._cond.notify()
+
+    def _discard(self, addr: Tuple[str, int], link: PeerLink) -> None:
+        link.close()
+        with self._cond:
+            self._slots[addr].open -= 1
+            self._cond.notify()
+
+    def _open_socket(self, addr: Tuple[str, int]) -> socket.socket:
+        sock = socket.create_connection(addr, timeout=self.connect_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _connect(self, addr: Tuple[str, int]) -> PeerLink:
+        """Open a link, walking down frame -> line -> one-shot until the peer understands us."""
+        if self._modes.get(addr, MODE_FRAME) == MODE_FRAME:
+            sock = self._open_socket(addr)
+            try:
+                sock.sendall(wire.encode_hello(self.owner_code))
+                stream = wire.FrameStream(sock)
+                if wire.is_framed(stream.peek()):
+                    frame = stream.read_frame()
+                    if frame is not None and frame[1] == wire.HELLO:
+                        version = wire.negotiate(frame[0])
+                        sock.settimeout(None)
+                        self._modes[addr] = MODE_FRAME
+                        return PeerLink(sock, MODE_FRAME, stream, version)
+                    if frame is not None and frame[1] == wire.BUSY:
+                        # it speaks frames, it's just full right now
+                        self._modes[addr] = MODE_FRAME
+                        raise wire.decode_busy_body(frame[2])
+                stream.release()
+            except wire.PeerBusy:
+                stream.release()
+                sock.close()
+                raise
+            except (OSError, wire.FrameError) as exc:
+                if self._modes.get(addr) == MODE_FRAME:
+                    sock.close()  # known framed peer, so this is a real failure
+                    raise ConnectionError(f"handshake failed: {exc}") from exc
+                # old peers choke on the HELLO bytes and hang up; fall back below
+            sock.close()
+            self._modes[addr] = MODE_LINE
+
+        if self._modes[addr] == MODE_LINE:
+            sock = self._open_socket(addr)
+            link = PeerLink(sock, MODE_LINE)
+            try:
+                reply = link.exchange_line(f"{LINK_HELLO} {self.owner_code}")
+            except OSError:
+                link.close()
+                raise
+            if reply == LINK_OK:
+                sock.settimeout(None)
+                return link
+            link.close()
+            busy = wire.parse_busy_text(reply)
+            if busy is not None:
+                raise busy
+            self._modes[addr] = MODE_ONESHOT
+
+        raise _OneShotPeer()
+
+    def _send_oneshot(self, addr: Tuple[str, int], flight: Flight) -> str:
+        """The original protocol: connect, one JSON packet, one ACK, close."""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.connect(addr)
+            sock.sendall(wire.flight_json(*_flight_args(flight)).encode("utf-8"))
+            reply = recv_text(sock)
+        busy = wire.parse_busy_text(reply)
+        if busy is not None:
+            raise busy
+        return reply
+
+    def _sweep_locked(self) -> None:
+        """Drop links that sat idle too long. Runs at most twice per idle_timeout."""
+        now = time.monotonic()
+        if now - self._last_sweep < self.idle_timeout / 2:
+            return
+        self._last_sweep = now
+        cutoff = now - self.idle_timeout
+        for slot in self._slots.values():
+            keep = []
+            for link in slot.idle:
+                if link.last_used < cutoff:
+                    link.close()
+                    slot.open -= 1
+                else:
+                    keep.append(link)
+            slot.idle = keep
+
+
+class AsyncPeerLink:
+    """asyncio twin of PeerLink."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, mode: str) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.mode = mode
+        self.version = wire.MIN_VERSION
+        self.prefix = bytearray()
+        self.last_used = time.monotonic()
+
+    async def exchange(self, flight: Flight) -> str:
+        if self.mode == MODE_FRAME:
+            self.writer.write(wire.flight_frame(flight, self.version))
+            await self.writer.drain()
+            try:
+                frame = await wire.read_frame_async(self.reader, self.prefix)
+            except wire.FrameError as exc:
+                raise ConnectionError(str(exc)) from exc
+            if frame is None:
+                raise ConnectionResetError("peer closed the link")
+            if frame[1] == wire.BUSY:
+                raise wire.decode_busy_body(frame[2])
+            if frame[1] != wire.ACK:
+                raise ConnectionError(f"expected ACK frame, got type {frame[1]}")
+            return wire.ack_text(frame[2])
+        reply = await self.exchange_line(wire.flight_json(*_flight_args(flight)))
+        busy = wire.parse_busy_text(reply)
+        if busy is not None:
+            raise busy
+        return reply
+
+    async def exchange_line(self, line: str) -> str:
+        self.writer.write(line.encode("utf-8") + b"\n")
+        await self.writer.drain()
+        reply = await self.reader.readline()
+        if not reply:
+            raise ConnectionResetError("peer closed the link")
+        return reply.decode("utf-8").strip()
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class AsyncConnectionPool:
+    """Same idea as ConnectionPool for AsyncNode; lives on the shared loop."""
+
+    def __init__(
+        self,
+        owner_code: str,
+        max_per_peer: int = 4,
+        idle_timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+    ) -> None:
+        self.owner_code = owner_code
+        self.max_per_peer = max(1, max_per_peer)
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._slots: Dict[Tuple[str, int], _PeerSlot] = {}
+        self._modes: Dict[Tuple[str, int], str] = {}
+        self._cond: Optional[asyncio.Condition] = None  # made lazily on the loop
+        self._closed = False  # see ConnectionPool._closed
+
+    def stats(self) -> Dict[str, int]:
+        # read from the metrics thread without the loop's lock; a count that's one off is fine
+        slots = list(self._slots.values())
+        return {
+            "peers": len(slots),
+            "open": sum(slot.open for slot in slots),
+            "idle": sum(len(slot.idle) for slot in slots),
+        }
+
+    async def send(self, addr: Tuple[str, int], flight: Flight) -> str:
+        if self._modes.get(addr) == MODE_ONESHOT:
+            return await self._send_oneshot(addr, flight)
+        try:
+            link, reused = await self._checkout(addr)
+        except _OneShotPeer:
+            return await self._send_oneshot(addr, flight)
+        try:
+            reply = await link.exchange(flight)
+        except wire.PeerBusy:
+            await self._checkin(addr, link)
+            raise
+        except OSError:
+            await self._discard(addr, link)
+            if not reused:
+                raise
+            link, _ = await self._checkout(addr, fresh=True)
+            try:
+                reply = await link.exchange(flight)
+            except wire.PeerBusy:
+                await self._checkin(addr, link)
+                raise
+            except OSError:
+                await self._discard(addr, link)
+                raise
+        await self._checkin(addr, link)
+        return reply
+
+    async def _checkout(self, addr: Tuple[str, int], fresh: bool = False) -> Tuple[AsyncPeerLink, bool]:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            slot = self._slots.setdefault(addr, _PeerSlot())
+            cutoff = time.monotonic() - self.idle_timeout
+            while slot.idle and slot.idle[0].last_used < cutoff:
+                slot.idle.pop(0).close()
+                slot.open -= 1
+            while True:
+                if slot.idle and not fresh:
+                    return slot.idle.pop(), True
+                if slot.open < self.max_per_peer:
+                    slot.open += 1
+                    break
+                if fresh and slot.idle:
+                    slot.idle.pop(0).close()
+                    slot.open -= 1
+                    continue
+                await self._cond.wait()
+
+        try:
+            return await self._connect(addr), False
+        except (OSError, _OneShotPeer):
+            async with self._cond:
+                slot.open -= 1
+                self._cond.notify()
+            raise
+
+    async def close(self) -> None:
+        """Close every idle link (busy ones close when they come back)."""
+        self._closed = True
+        for slot in self._slots.values():
+            for link in slot.idle:
+                link.close()
+            slot.open -= len(slot.idle)
+            slot.idle.clear()
+        if self._cond is not None:
+            async with self._cond:
+                self._cond.notify_all()
+
+    async def _checkin(self, addr: Tuple[str, int], link: AsyncPeerLink) -> None:
+        link.last_used = time.monotonic()
+        async with self._cond:
+            slot = self._slots[addr]
+            if self._closed:
+                link.close()
+                slot.open -= 1
+            else:
+                slot.idle.append(link)
+            self._cond.notify()
+
+    async def _discard(self, addr: Tuple[str, int], link: AsyncPeerLink) -> None:
+        link.close()
+        async with self._cond:
+            self._slots[addr].open -= 1
+            self._cond.notify()
+
+    async def _open(self, addr: Tuple[str, int]) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        return await asyncio.wait_for(asyncio.open_connection(*addr), self.connect_timeout)
+
+    async def _connect(self, addr: Tuple[str, int]) -> AsyncPeerLink:
+        if self._modes.get(addr, MODE_FRAME) == MODE_FRAME:
+            reader, writer = await self._open(addr)
+            link = AsyncPeerLink(reader, writer, MODE_FRAME)
+            try:
+                writer.write(wire.encode_hello(self.owner_code))
+                await writer.drain()
+                first = await reader.read(4096)
+                if wire.is_framed(first):
+                    link.prefix += first
+                    frame = await wire.read_frame_async(reader, link.prefix)
+                    if frame is not None and frame[1] == wire.HELLO:
+                        link.version = wire.negotiate(frame[0])
+                        self._modes[addr] = MODE_FRAME
+                        return link
+                    if frame is not None and frame[1] == wire.BUSY:
+                        self._modes[addr] = MODE_FRAME
+                        raise wire.decode_busy_body(frame[2])
+            except wire.PeerBusy:
+                link.close()
+                raise
+            except (OSError, wire.FrameError) as exc:
+                if self._modes.get(addr) == MODE_FRAME:
+                    link.close()  # known framed peer, so this is a real failure
+                    raise ConnectionError(f"handshake failed: {exc}") from exc
+                # old peers choke on the HELLO bytes and hang up; fall back below
+            link.close()
+            self._modes[addr] = MODE_LINE
+
+        if self._modes[addr] == MODE_LINE:
+            reader, writer = await self._open(addr)
+            link = AsyncPeerLink(reader, writer, MODE_LINE)
+            try:
+                reply = await link.exchange_line(f"{LINK_HELLO} {self.owner_code}")
+            except OSError:
+                link.close()
+                raise
+            if reply == LINK_OK:
+                return link
+            link.close()
+            busy = wire.parse_busy_text(reply)
+            if busy is not None:
+                raise busy
+            self._modes[addr] = MODE_ONESHOT
+
+        raise _OneShotPeer()
+
+    async def _send_oneshot(self, addr: Tuple[str, int], flight: Flight) -> str:
+        reader, writer = await asyncio.open_connection(*addr)
+        try:
+            writer.write(wire.flight_json(*_flight_args(flight)).encode("utf-8"))
+            await writer.drain()
+            reply = (await reader.read(1024)).decode("utf-8").strip()
+        finally:
+            writer.close()
+        busy = wire.parse_busy_text(reply)
+        if busy is not None:
+            raise busy
+        return reply
@@ -0,0 +1,176 @@
+import heapq
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Routing tables for hop-by-hop forwarding.
+#
+# The graph comes straight out of load_routes(): every airport is linked to
+# each hub listed for it under default_hub, and the hubs are linked to each
+# other. Every link costs 1 unless told otherwise. From that we run Dijkstra
+# once per airport and keep, for every (source, destination), the first hop
+# to take. A node then only needs the destination code to forward a flight,
+# same as a router only needs the destination IP.
+#
+# When a link changes we only rerun Dijkstra for the sources whose shortest
+# path tree can actually change:
+#   - link got cheaper / was added: sources where going over it beats what they have
+#   - link got dearer / was removed: sources whose tree uses it
+
+Link = Tuple[str, str]
+
+# A routed flight is dropped after this many hops, in case tables disagree mid-update.
+MAX_HOPS = 32
+
+
+def _key(a: str, b: str) -> Link:
+    return (a, b) if a <= b else (b, a)
+
+
+def config_links(hubs: List[str], default_hub: Dict[str, List[str]]) -> Dict[Link, float]:
+    """The links routes.yaml describes: hub <-> hub, and every airport <-> each of its hubs."""
+    links: Dict[Link, float] = {}
+    for i, a in enumerate(hubs):
+        for b in hubs[i + 1 :]:
+            links[_key(a, b)] = 1.0
+    for code, options in default_hub.items():
+        for hub in options:
+            if hub != code:
+                links[_key(code, hub)] = 1.0
+    return links
+
+
+class RoutingTable:
+    """All-pairs next-hop table over the hub-and-spoke graph, updated incrementally."""
+
+    def __init__(
+        self,
+        airports: Iterable[str],
+        hubs: List[str],
+        default_hub: Dict[str, List[str]],
+        weights: Optional[Dict[Link, float]] = None,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._graph: Dict[str, Dict[str, float]] = {code: {} for code in airports}
+        for hub in hubs:
+            self._graph.setdefault(hub, {})
+        for (a, b), weight in config_links(hubs, default_hub).items():
+            self._add(a, b, weight)
+        for (a, b), weight in (weights or {}).items():
+            self._add(a, b, weight)
+
+        self._dist: Dict[str, Dict[str, float]] = {}
+        self._parent: Dict[str, Dict[str, str]] = {}
+        self._next: Dict[str, Dict[str, str]] = {}
+        for source in self._graph:
+            self._solve(source)
+
+    @classmethod
+    def from_config(cls, airports: Dict[str, str], hubs: List[str], default_hub: Dict[str, List[str]]) -> "RoutingTable":
+        return cls(airports.keys(), hubs, default_hub)
+
+    def next_hop(self, source: str, destination: str) -> Optional[str]:
+        """First airport to fly to from source on the way to destination (None = unreachable)."""
+        return self._next.get(source, {}).get(destination)
+
+    def path(self, source: str, destination: str) -> List[str]:
+        """Full path source .. destination by chasing next hops (empty if unreachable)."""
+        if source == destination:
+            return [source]
+        path = [source]
+        here = source
+        while here != destination:
+            here = self.next_hop(here, destination)
+            if here is None or len(path) > len(self._graph):
+                return []
+            path.append(here)
+        return path
+
+    def distance(self, source: str, destination: str) -> float:
+        return self._dist.get(source, {}).get(destination, float("inf"))
+
+    def links(self) -> Dict[Link, float]:
+        with self._lock:
+            return {_key(a, b): w for a, edges in self._graph.items() for b, w in edges.items()}
+
+    def set_link(self, a: str, b: str, weight: Optional[float]) -> int:
+        """Add, reweight, or (weight=None) remove a link. Returns how many sources were recomputed."""
+        with self._lock:
+            self._graph.setdefault(a, {})
+            self._graph.setdefault(b, {})
+            old = self._graph[a].get(b)
+            if old == weight:
+                return 0
+
+            affected: Set[str] = set()
+            for source, dist in self._dist.items():
+                parent = self._parent[source]
+                uses_link = parent.get(b) == a or parent.get(a) == b
+                if old is not None and (weight is None or weight > old) and uses_link:
+                    affected.add(source)
+                elif weight is not None and (old is None or weight < old):
+                    da = dist.get(a, float("inf"))
+                    db = dist.get(b, float("inf"))
+                    if da + weight < db or db + weight < da:
+                        affected.add(source)
+            for source in (a, b):
+                if source not in self._dist:
+                    affected.add(source)
+
+            if weight is None:
+                self._graph[a].pop(b, None)
+                self._graph[b].pop(a, None)
+            else:
+                self._add(a, b, weight)
+
+            for source in affected:
+                self._solve(source)
+            return len(affected)
+
+    def sync(self, hubs: List[str], default_hub: Dict[str, List[str]]) -> int:
+        """Move to the links of a reloaded routes.yaml, one set_link per difference.
+
+        New links go in before old ones come out, so two airports that stay
+        connected never lose their route halfway through a reload.
+        Returns how many links changed.
+        """
+        wanted = config_links(hubs, default_hub)
+        current = self.links()
+        changed = 0
+        for (a, b), weight in wanted.items():
+            if current.get((a, b)) != weight:
+                self.set_link(a, b, weight)
+                changed += 1
+        for (a, b) in current.keys() - wanted.keys():
+            self.set_link(a, b, None)
+            changed += 1
+        return changed
+
+    def _add(self, a: str, b: str, weight: float) -> None:
+        self._graph.setdefault(a, {})[b] = weight
+        self._graph.setdefault(b, {})[a] = weight
+
+    def _solve(self, source: str) -> None:
+        """Plain Dijkstra from source, filling dist, parent and first-hop tables."""
+        dist: Dict[str, float] = {source: 0.0}
+        parent: Dict[str, str] = {}
+        first: Dict[str, str] = {}
+        done: Set[str] = set()
+        heap: List[Tuple[float, str]] = [(0.0, source)]
+        graph = self._graph
+        while heap:
+            d, here = heapq.heappop(heap)
+            if here in done:
+                continue
+            done.add(here)
+            if here != source:
+                first[here] = here if parent[here] == source else first[parent[here]]
+            for nxt, weight in graph.get(here, {}).items():
+                nd = d + weight
+                # tie-break on code so every node builds the same table
+                if nd < dist.get(nxt, float("inf")) or (nd == dist.get(nxt) and nxt not in done and here < parent.get(nxt, "~")):
+                    dist[nxt] = nd
+                    parent[nxt] = here
+                    heapq.heappush(heap, (nd, nxt))
+        self._dist[source] = dist
+        self._parent[source] = parent
+        self._next[source] = first
@@ -1,34 +1,216 @@
+import itertools
 import random
 import socket
 import threading
-from typing import Dict, List, Optional, Tuple
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
 from config.parser import load_airports, load_routes
-from scripts.name_generator import random_full_name
+from scripts.name_generator import NameStream
+from . import wire
+from .balance import LoadBalancer
+from .buffers import recv_text
+from .metrics import REGISTRY, Registry
+from .workers import WorkerPool, turn_away
 
 # Scheduler ip/port for nodes to connect to.
 SCHEDULER_HOST = "127.0.0.1"
 SCHEDULER_PORT = 6500
+# stats endpoint (see metrics.py) sits right next to it
+METRICS_PORT = SCHEDULER_PORT + 1
 
+# each takes a zero-arg name source (a NameStream: names come precompiled, 256 at a time)
 PAYLOADS = [
-    lambda: f"Passenger: {random_full_name()}",
-    lambda: "Cargo",
+    lambda next_name: f"Passenger: {next_name()}",
+    lambda next_name: "Cargo",
 ]
 
+MAX_FLIGHT_ID = 9999  # ids print as 4 digits and wrap back to 0001
+
+# a registration still waiting for a handler after this long is told BUSY instead
+QUEUE_WAIT = 2.0
+
+# plan handed out -> final hop reports it landed; flights run longer than one leg's ACK
+FLIGHT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Plan = Tuple[List[str], str, str]
+
+
+class _Session:
+    """One framed airport connection. Other sessions' threads write to it to relay COMPLETE reports.
+
+    `stream` only needs send(frame); simulation.py hands in one that delivers on its virtual clock.
+    """
+
+    def __init__(self, stream: wire.FrameStream, version: int) -> None:
+        self.stream = stream
+        self.version = version
+        self.code = "?"
+        # flight id -> (when the plan went out, its legs); guarded by lock, like writes to the socket
+        self.outstanding: Dict[str, Tuple[float, List[str]]] = {}
+        self.lock = threading.Lock()
+
+    def send(self, frame: bytes) -> None:
+        with self.lock:
+            self.stream.send(frame)
+
+    def issued(self, plans: Sequence[Plan], now: float) -> None:
+        with self.lock:
+            for plan in plans:
+                self.outstanding[plan[2]] = (now, plan[0])
+
+    def settle(self, flight_id: str) -> Optional[Tuple[float, List[str]]]:
+        """Take a plan off the outstanding list; returns (issued at, legs), None if it wasn't there."""
+        with self.lock:
+            return self.outstanding.pop(flight_id, None)
+
+    def drain(self) -> List[List[str]]:
+        """Everything still out when the session ends; nobody will settle these now."""
+        with self.lock:
+            legs = [entry[1] for entry in self.outstanding.values()]
+            self.outstanding.clear()
+            return legs
+
+
+class _PlanTables(NamedTuple):
+    codes: Tuple[str, ...]
+    code_index: Dict[str, int]
+    # destination -> layover hubs, and the same list minus each hub (for when the origin is that hub)
+    layovers: Dict[str, Tuple[str, ...]]
+    layovers_without: Dict[Tuple[str, str], Tuple[str, ...]]
+
 
 class Scheduler:
     """Listens for airport registrations and hands back a simple flight plan."""
 
-    def __init__(self, airports: Dict[str, str], hubs: List[str], default_hub: Dict[str, List[str]]) -> None:
+    def __init__(
+        self,
+        airports: Dict[str, str],
+        hubs: List[str],
+        default_hub: Dict[str, List[str]],
+        seed: Optional[int] = None,
+        handlers: int = 128,
+        accept_queue: int = 128,
+        backlog: int = 128,
+        balance: str = "load",
+        rng: Optional[random.Random] = None,
+        registry: Registry = REGISTRY,
+    ) -> None:
         self.airports = airports
         self.hubs = hubs
         self.default_hub = default_hub
-        self._lock = threading.Lock()
         self._server_socket: Optional[socket.socket] = None
-        self._flight_counter = 0
+        # set once the socket is bound and listening (main waits on it instead of sleeping)
+        self.ready = threading.Event()
+        # next() on itertools.count is a single C call, so handlers can share it without a lock
+        self._flight_ids = itertools.count(0)
+        self._seed = seed
+        # one RNG for every thread instead of one each (simulation.py passes its seeded one)
+        self._shared_rng = rng
+        self._rng_seeds = itertools.count(0)
+        self._local = threading.local()
+        self._tables = self._build_tables(airports, default_hub)
+        # where the scheduler's metrics go (simulation.py keeps its own)
+        self.registry = registry
+        # "load": destinations and layovers weighted away from busy airports (balance.py); "uniform": the old coin flips
+        self._balancer: Optional[LoadBalancer] = LoadBalancer(self._tables.codes, self._tables.layovers) if balance == "load" else None
+        self._plans_issued = self.registry.counter("scheduler_plans_issued_total", "Flight plans handed out to airports.")
+        self._plans_done = self.registry.counter("scheduler_plans_completed_total", "Plans airports reported as flown.")
+        self._sessions = self.registry.gauge("scheduler_sessions_active", "Airport connections open to the scheduler.")
+        self._flight_seconds = self.registry.histogram(
+            "scheduler_flight_seconds", "Plan handed out until its final hop reported the landing.", FLIGHT_BUCKETS
+        )
+        # airport code -> its current framed session, for relaying COMPLETE reports to the origin
+        self._live: Dict[str, _Session] = {}
+        self._live_lock = threading.Lock()
+        # where session chatter goes and what times flights; simulation.py swaps in its log and virtual clock
+        self.log: Callable[[str], None] = print
+        self.clock: Callable[[], float] = time.monotonic
+        # sessions are served by a fixed set of handlers; past `accept_queue` waiting, registrations get BUSY
+        self.backlog = backlog
+        # through a lambda so a log swapped in later (simulation.py) gets handler failures too
+        self._handlers = WorkerPool("scheduler", handlers, accept_queue, QUEUE_WAIT, self._shed, lambda text: self.log(text))
+        self.registry.gauge_fn("scheduler_accept_queue_depth", "Registrations waiting for a free handler.", self._handlers.depth)
+        self._shed_count = self.registry.counter(
+            "scheduler_registrations_shed_total", "Registrations turned away with BUSY because the queue was full."
+        )
+        self._hub_gauges: List[str] = []
+        self._register_hub_gauges(hubs)
+
+    def _register_hub_gauges(self, hubs: List[str]) -> None:
+        """One scheduler_hub_load child per current hub; hubs dropped from the config stop being scraped."""
+        for hub in set(self._hub_gauges) - set(hubs):
+            self.registry.remove("scheduler_hub_load", hub=hub)
+        self._hub_gauges = list(hubs)
+        for hub in hubs:
+            self.registry.gauge_fn(
+                "scheduler_hub_load",
+                "Plans in the air that land at or lay over at this hub (what load balancing steers by).",
+                lambda hub=hub: self._balancer.load(hub) if self._balancer is not None else 0,
+                hub=hub,
+            )
+
+    @staticmethod
+    def _build_tables(airports: Dict[str, str], default_hub: Dict[str, List[str]]) -> _PlanTables:
+        """Precompute what every plan needs so _make_plan never walks the airport list."""
+        codes = tuple(airports)
+        layovers: Dict[str, Tuple[str, ...]] = {}
+        layovers_without: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+        for destination, options in default_hub.items():
+            options = tuple(options)
+            layovers[destination] = options
+            for hub in options:
+                layovers_without[(destination, hub)] = tuple(h for h in options if h != hub)
+        return _PlanTables(codes, {code: idx for idx, code in enumerate(codes)}, layovers, layovers_without)
+
+    def apply_topology(self, airports: Dict[str, str], hubs: List[str], default_hub: Dict[str, List[str]]) -> None:
+        """Switch to a new config without restarting.
+
+        Tables are built off to the side and swapped in with one assignment,
+        so a plan being built right now sees either the old world or the new one.
+        """
+        tables = self._build_tables(airports, default_hub)
+        # plans already out keep their load; only the table of who can be picked changes
+        balancer = (
+            LoadBalancer(tables.codes, tables.layovers, self._balancer.snapshot()) if self._balancer is not None else None
+        )
+        self.airports = airports
+        self.hubs = hubs
+        self.default_hub = default_hub
+        self._tables = tables
+        self._balancer = balancer
+        self._register_hub_gauges(hubs)
+
+    def _rng(self) -> random.Random:
+        """Per-thread RNG so handlers don't fight over random's module lock (and seeds stay reproducible)."""
+        if self._shared_rng is not None:
+            return self._shared_rng
+        rng = getattr(self._local, "rng", None)
+        if rng is None:
+            if self._seed is None:
+                rng = random.Random()
+            else:
+                rng = random.Random(self._seed * 1_000_003 + next(self._rng_seeds))
+            self._local.rng = rng
+        return rng
+
+    def _names(self) -> NameStream:
+        """Per-thread batched name source drawing from that thread's RNG."""
+        names = getattr(self._local, "names", None)
+        if names is None:
+            names = self._local.names = NameStream(self._rng())
+        return names
+
+    def _next_flight_id(self) -> int:
+        return next(self._flight_ids) % MAX_FLIGHT_ID + 1
+
+    def _flight_id_block(self, count: int) -> List[int]:
+        """Reserve count ids in one C-level pass over the shared counter."""
+        return [raw % MAX_FLIGHT_ID + 1 for raw in itertools.islice(self._flight_ids, count)]
 
     def start(self) -> None:
         """Kick off the TCP server in its own daemon thread."""
+        self._handlers.start()
         thread = threading.Thread(target=self._serve, daemon=True)
         thread.start()
 
@@ -37,64 +219,226 @@ class Scheduler:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
             server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             server.bind((SCHEDULER_HOST, SCHEDULER_PORT))
-            server.listen(8)
+            server.listen(self.backlog)
             self._server_socket = server
-            print(f"[scheduler] listening on {SCHEDULER_HOST}:{SCHEDULER_PORT}")
+            self.ready.set()
+            self.log(f"[scheduler] listening on {SCHEDULER_HOST}:{SCHEDULER_PORT}")
 
             while True:
                 conn, addr = server.accept()
-                threading.Thread(target=self._handle_client, args=(conn, addr), daemon=True).start()
+                if not self._handlers.submit(self._handle_client, conn, addr):
+                    self._shed(conn, addr)
+
+    def _shed(self, conn: socket.socket, addr: Tuple[str, int]) -> None:
+        """Full up: tell the airport BUSY and when to come back, instead of letting it hang."""
+        self._shed_count.inc()
+        retry_after = self._handlers.retry_after()
+        shed = int(self._shed_count.value)
+        if shed == 1 or shed % 100 == 0:
+            self.log(f"[scheduler] busy: turned away {addr} ({shed} so far), retry in {retry_after * 1000:.0f} ms")
+        turn_away(conn, retry_after, self._handlers.depth())
 
     def _handle_client(self, conn: socket.socket, addr: Tuple[str, int]) -> None:
         """Handle a single node from register -> plan -> ack."""
+        self._sessions.inc()
+        stream = wire.FrameStream(conn)
         with conn:
             try:
-                # First message is just the airport code (e.g. "ANC").
-                raw = conn.recv(1024)
-                airport_code = raw.decode("utf-8").strip().upper()
+                # First message is just the airport code (e.g. "ANC"), or a HELLO frame.
+                first = stream.peek()
+                if wire.is_framed(first):
+                    self._handle_framed_client(conn, addr, stream)
+                    return
+                try:
+                    airport_code = str(first, "utf-8").strip().upper()
+                except UnicodeDecodeError:
+                    self.log(f"[scheduler] {addr} sent something that isn't UTF-8 text, closing")
+                    return
                 if not airport_code:
                     return
-                print(f"[scheduler] {airport_code} registered from {addr}")
+                self.log(f"[scheduler] {airport_code} registered from {addr}")
 
-                plan = self._make_plan_for(airport_code)
-                conn.sendall(plan.encode("utf-8"))
+                plan = self._make_plan(airport_code)
+                self._flying(plan[0])
+                try:
+                    conn.sendall(wire.format_plan(*plan).encode("utf-8"))
 
-                # wait for any acknowledgement so nodes can tell us they are done
-                ack = conn.recv(1024).decode("utf-8").strip()
+                    # wait for any acknowledgement so nodes can tell us they are done
+                    ack = recv_text(conn)
+                finally:
+                    self._settled(plan[0])
                 if ack:
-                    print(f"[scheduler] {airport_code} finished flight: {ack}")
+                    self._plans_done.inc()
+                    self.log(f"[scheduler] {airport_code} finished flight: {ack}")
             except OSError as exc:
-                print(f"[scheduler] lost connection to {addr}: {exc}")
-
-    def _make_plan_for(self, origin: str) -> str:
-        """Pick a destination and optional hub, then build a tiny text message."""
-        with self._lock:
-            self._flight_counter += 1
-            if self._flight_counter > 9999:
-                self._flight_counter = 1
-            flight_id = self._flight_counter
-            candidates = [code for code in self.airports if code != origin]
-            if not candidates:
-                return f"FLIGHT {origin} | holding pattern | id:{flight_id:04d}"
-            destination = random.choice(candidates)
-            layover_options = self.default_hub.get(destination, [])
+                self.log(f"[scheduler] lost connection to {addr}: {exc}")
+            finally:
+                stream.release()
+                self._sessions.dec()
+
+    def _handle_framed_client(self, conn: socket.socket, addr: Tuple[str, int], stream: wire.FrameStream) -> None:
+        """Framed session. Multiplexes any mix of REGISTER/LEASE/DONE until the node hangs up.
+
+        REGISTER gets one plan back (the v1 flow), LEASE n gets n plans in one write,
+        and DONE frames can come back whenever, in any order, for any plan still out.
+        On v5 a plan is done when some final hop sends COMPLETE for it (on that
+        hop's own session); the report is passed on to the origin's session.
+        """
+        session: Optional[_Session] = None
+        try:
+            frame = stream.read_frame()
+            if frame is None or frame[1] != wire.HELLO:
+                return
+            session = _Session(stream, wire.negotiate(frame[0]))
+            session.send(wire.encode_hello("scheduler", session.version))
+
+            while True:
+                frame = stream.read_frame()
+                if frame is None:
+                    break
+                self.handle_frame(session, frame[1], frame[2], addr)
+        except (wire.FrameError, UnicodeDecodeError) as exc:
+            self.log(f"[scheduler] bad frame from {addr}: {exc}")
+        finally:
+            if session is not None:
+                with self._live_lock:
+                    if self._live.get(session.code) is session:
+                        del self._live[session.code]
+                stranded = session.drain()
+                if stranded:
+                    self.log(f"[scheduler] {session.code} session closed with {len(stranded)} plans outstanding")
+                for legs in stranded:
+                    self._settled(legs)
+
+    def handle_frame(self, session: _Session, frame_type: int, body: bytes, addr: Tuple[str, int]) -> None:
+        """One frame off an airport's session; replies go out through session.send."""
+        if frame_type == wire.REGISTER:
+            self._claim(session, str(body, "ascii").strip().upper())
+            self.log(f"[scheduler] {session.code} registered from {addr}")
+            plan = self._make_plan(session.code)
+            self._issue(session, [plan])
+            session.send(wire.encode_plan(*plan))
+        elif frame_type == wire.LEASE:
+            airport_code, count = wire.decode_lease(body)
+            self._claim(session, airport_code)
+            self.log(f"[scheduler] {airport_code} leased {count} plans from {addr}")
+            plans = self.make_plans([airport_code], count)
+            for plan in plans:
+                self.log(f"[scheduler] plan for {airport_code}: {wire.format_plan(*plan)}")
+            self._issue(session, plans)
+            session.send(b"".join(wire.encode_plan(*plan) for plan in plans))
+        elif frame_type == wire.DONE:
+            # flown as far as the origin knows (pre-v5), or given up on waiting for COMPLETE
+            flight_id = str(body, "ascii")
+            settled = session.settle(flight_id)
+            if settled is not None:
+                self._settled(settled[1])
+                self._plans_done.inc()
+                self.log(f"[scheduler] {session.code} finished flight: {session.code} complete (id:{flight_id})")
+        elif frame_type == wire.COMPLETE:
+            self._complete(bytes(body))
+        else:
+            self.log(f"[scheduler] ignoring frame type {frame_type} from {addr}")
+
+    def _issue(self, session: _Session, plans: Sequence[Plan]) -> None:
+        """Plans are going out on this session: remember them until they settle, and count their load."""
+        session.issued(plans, self.clock())
+        for plan in plans:
+            self._flying(plan[0])
+
+    def _flying(self, legs: List[str]) -> None:
+        balancer = self._balancer
+        if balancer is not None:
+            balancer.flying(legs)
+
+    def _settled(self, legs: List[str]) -> None:
+        balancer = self._balancer
+        if balancer is not None:
+            balancer.landed(legs)
+
+    def _claim(self, session: _Session, airport_code: str) -> None:
+        """This session speaks for airport_code now (a reconnect replaces the old one)."""
+        if session.code == airport_code:
+            return
+        session.code = airport_code
+        with self._live_lock:
+            self._live[airport_code] = session
+
+    def _complete(self, body: bytes) -> None:
+        """A final hop says a flight landed: count it, and tell the origin so it frees the slot."""
+        origin, final, flight_id = wire.decode_complete_body(body)
+        owner = self._live.get(origin)
+        settled = owner.settle(flight_id) if owner is not None else None
+        if settled is None:
+            return  # origin's session is gone, or it already gave up on this one
+        issued, legs = settled
+        self._settled(legs)
+        self._plans_done.inc()
+        self._flight_seconds.observe(self.clock() - issued)
+        self.log(f"[scheduler] {origin} finished flight: landed at {final} (id:{flight_id})")
+        if owner.version >= wire.COMPLETE_VERSION:
+            try:
+                owner.send(wire.encode_frame(wire.COMPLETE, body))
+            except OSError:
+                pass  # origin hung up; its session thread cleans up
+
+    def _make_plan(self, origin: str) -> Plan:
+        """Pick a destination and optional hub. Returns (legs, payload, flight_id)."""
+        plan = self._build_plan(origin, self._next_flight_id(), self._rng())
+        self._plans_issued.inc()
+        self.log(f"[scheduler] plan for {origin}: {wire.format_plan(*plan)}")
+        return plan
+
+    def make_plans(self, origins: Sequence[str], n: int = 1) -> List[Plan]:
+        """Bulk version of _make_plan: n plans for every origin, in origin order.
+
+        Ids come out of one reserved block and everything else is table lookups,
+        so thousands of plans cost about as much as building the lists. Nothing
+        is printed; callers decide what to announce.
+        """
+        rng = self._rng()
+        ids = self._flight_id_block(len(origins) * n)
+        build = self._build_plan
+        self._plans_issued.inc(len(ids))
+        return [build(origin, ids[i], rng) for i, origin in enumerate(o for o in origins for _ in range(n))]
+
+    def _build_plan(self, origin: str, flight_id: int, rng: random.Random) -> Plan:
+        codes, code_index, layovers, layovers_without = self._tables
+        balancer = self._balancer
+        hub: Optional[str] = None
+        if balancer is not None:
+            picked = balancer.pick(origin, rng)
+            if picked is None:
+                return [origin], "holding pattern", f"{flight_id:04d}"
+            destination, hub = picked
+        else:
+            origin_idx = code_index.get(origin)
+            # pick uniformly among every airport except the origin without building a list:
+            # draw from n-1 slots and skip over the origin's own slot
+            choices = len(codes) - (1 if origin_idx is not None else 0)
+            if choices <= 0:
+                return [origin], "holding pattern", f"{flight_id:04d}"
+            pick = int(rng.random() * choices)
+            if origin_idx is not None and pick >= origin_idx:
+                pick += 1
+            destination = codes[pick]
 
         # Route String
         legs = [origin]
-        layover = None
-        if layover_options:
-            viable = [hub for hub in layover_options if hub != origin]
-            if viable:
-                layover = random.choice(viable)
-        if layover:
-            legs.append(layover)
+        viable = layovers.get(destination, ())
+        if hub is not None and hub != origin:
+            legs.append(hub)  # the balancer already picked it, with the destination
+        else:
+            if origin in viable:
+                viable = layovers_without[(destination, origin)]
+            if len(viable) == 1:
+                legs.append(viable[0])
+            elif viable:
+                legs.append(balancer.pick_layover(viable, rng) if balancer is not None else viable[int(rng.random() * len(viable))])
         legs.append(destination)
 
-        payload = random.choice(PAYLOADS)()
-        route_str = " >> ".join(legs)
-        message = f"FLIGHT {route_str} | {payload} | id:{flight_id:04d}"
-        print(f"[scheduler] plan for {origin}: {message}")
-        return message
+        payload = PAYLOADS[int(rng.random() * len(PAYLOADS))](self._names())
+        return legs, payload, f"{flight_id:04d}"
 
 
 def bootstrap_scheduler() -> Scheduler:
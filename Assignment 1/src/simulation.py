@@ -0,0 +1,575 @@
+import argparse
+import heapq
+import itertools
+import json
+import random
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from config.generate import PROBE_CODE, generate_topology
+from config.parser import load_airports, load_routes
+from . import wire
+from .balance import balance_mode
+from .metrics import Registry
+from .node import BUSY_RETRIES, QUEUE_WAIT, WINDOW_POLL, Node
+from .routing import RoutingTable
+from .scheduler import Scheduler, _Session
+from .window import FlightWindow
+from .workers import retry_hint
+
+# Discrete-event simulation of the whole network, for topologies too big to
+# run for real (10k airports means 10k listeners on loopback).
+#
+#   python -m src.simulation                                    the yaml config, 60 virtual seconds
+#   python -m src.simulation --generate 10000 --hubs 25 --no-logs --out sim.json
+#   python -m src.simulation --latency 0.02 --jitter 0.01 --loss 0.01 --hub-latency 0.005
+#   python -m src.simulation --trace && python -m src.flighttrace --logs logs/sim show 0042
+#
+# The airports are real Node objects (SimNode) and the plans come from a real
+# Scheduler: leasing, windowing, forwarding, COMPLETE reports and all the log
+# lines are the same code. Only the I/O is swapped out:
+#   - every socket write becomes an event on a heap, delivered after the
+#     link's latency (LinkModel: fixed + jitter, TCP-like loss that costs a
+#     resend timeout per lost try)
+#   - an airport serves arriving legs with `handlers` servers and a queue of
+#     `accept_queue`, `service_time` each, and sheds with BUSY past that, like
+#     the real accept loop (workers.py)
+#   - the clock is virtual, so the run takes as long as the events take to
+#     process, not as long as the flights take to fly
+#   - no sockets, threads or handler pools get built (SimNode._init_io), and
+#     metrics go to the run's own Registry instead of the process-wide one
+# One thread, one seeded RNG, ties broken by insertion order: the same seed
+# gives the same logs and the same numbers every time.
+#
+# What it doesn't model: scheduler traffic only gets latency (no loss, no
+# queueing), a handler is busy for service_time per leg rather than for the
+# life of a pooled link, and UDP legs are treated like TCP ones.
+
+DEFAULT_LATENCY = 0.002  # one way, seconds
+SERVICE_TIME = 0.0005  # handler time per arriving leg
+RESEND_TIMEOUT = 0.2  # first resend after a lost try, doubling each time (TCP's minimum RTO)
+MAX_TRIES = 5
+LOG_FLUSH_LINES = 512  # lines buffered per airport before they're appended to its file
+
+Event = Tuple[float, int, Callable[..., None], Tuple[Any, ...]]
+
+
+class LinkModel:
+    """Delay and loss for a link, one direction at a time."""
+
+    def __init__(
+        self,
+        latency: float = DEFAULT_LATENCY,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        jitter_kind: str = "uniform",
+        rto: float = RESEND_TIMEOUT,
+        max_tries: int = MAX_TRIES,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.jitter_kind = jitter_kind  # "uniform": 0..jitter extra, "exp": exponential with mean jitter
+        self.rto = rto
+        self.max_tries = max_tries
+
+    def delay(self, rng: random.Random) -> Optional[float]:
+        """Seconds until the bytes get there, resends included. None if every try was lost."""
+        waited = 0.0
+        rto = self.rto
+        for _ in range(self.max_tries):
+            if not self.loss or rng.random() >= self.loss:
+                return waited + self._one_way(rng)
+            waited += rto
+            rto *= 2
+        return None
+
+    def _one_way(self, rng: random.Random) -> float:
+        if not self.jitter:
+            return self.latency
+        if self.jitter_kind == "exp":
+            return self.latency + rng.expovariate(1 / self.jitter)
+        return self.latency + rng.random() * self.jitter
+
+
+class SimLog:
+    """The usual "[HH:MM:SS] text" airport logs, stamped with virtual time (00:00:00 = start).
+
+    Lines are buffered per file and appended in chunks, so 10k airports don't
+    need 10k open files. Each file is truncated the first time it's written.
+    """
+
+    def __init__(self, folder: Path, clock: Callable[[], float]) -> None:
+        self.folder = folder
+        self.clock = clock
+        self._pending: Dict[Path, List[str]] = {}
+        self._started: Dict[Path, bool] = {}
+        self._second = -1
+        self._stamp = ""
+        folder.mkdir(parents=True, exist_ok=True)
+
+    def write(self, path: Path, text: str) -> None:
+        second = int(self.clock())
+        if second != self._second:
+            self._second = second
+            self._stamp = f"[{second // 3600 % 24:02d}:{second // 60 % 60:02d}:{second % 60:02d}] "
+        lines = self._pending.get(path)
+        if lines is None:
+            lines = self._pending[path] = []
+        lines.append(self._stamp + text + "\n")
+        if len(lines) >= LOG_FLUSH_LINES:
+            self._flush(path, lines)
+
+    def write_raw(self, path: Path, line: str) -> None:
+        """A line that brings its own timestamp (trace records) and newline."""
+        lines = self._pending.get(path)
+        if lines is None:
+            lines = self._pending[path] = []
+        lines.append(line)
+        if len(lines) >= LOG_FLUSH_LINES:
+            self._flush(path, lines)
+
+    def close(self) -> None:
+        for path, lines in self._pending.items():
+            if lines:
+                self._flush(path, lines)
+
+    def _flush(self, path: Path, lines: List[str]) -> None:
+        mode = "a" if self._started.get(path) else "w"
+        self._started[path] = True
+        with open(path, mode, encoding="utf-8") as fh:
+            fh.write("".join(lines))
+        lines.clear()
+
+
+class _SessionPipe:
+    """What the scheduler's _Session writes to: frames reach the airport after the control latency."""
+
+    def __init__(self, sim: "Simulation", node: "SimNode") -> None:
+        self.sim = sim
+        self.node = node
+
+    def send(self, frame: bytes) -> None:
+        delay = self.sim.control.delay(self.sim.rng) or 0.0
+        offset = 0
+        while offset < len(frame):  # a LEASE reply is several PLAN frames in one write
+            _, frame_type, length = wire.decode_header_from(frame, offset)
+            start = offset + wire.HEADER_SIZE
+            offset = start + length
+            self.sim.after(delay, self.node._from_scheduler, frame_type, frame[start:offset])
+
+
+class SimNode(Node):
+    """A Node whose sockets are the simulation's event heap; everything above the sockets is Node's own code."""
+
+    def __init__(self, sim: "Simulation", code: str, airports: Dict[str, str], **options) -> None:
+        super().__init__(code, "sim", 0, airports, links_per_peer=0, registry=sim.registry, **options)
+        self.sim = sim
+        self.running = True
+        self.window = FlightWindow(self.window.size, self.window.timeout, self._room_freed, sim.clock)
+        self.log_path = sim.log_dir / f"{self.code.lower()}.log"
+        if self.trace_path is not None:
+            self.trace_path = sim.log_dir / self.trace_path.name if sim.log is not None else None
+        self.trace_clock = lambda: round(sim.now * 1e9)
+        self.rng = sim.rng
+        self.session = _Session(_SessionPipe(sim, self), wire.PROTOCOL_VERSION)
+        self._addr = self._lookup_airport(self.code)
+        # arrivals: legs being served, and (queued at, leg) waiting for a handler
+        self._serving = 0
+        self._waiting: Deque[Tuple[float, "SimNode", Dict[str, Any], str, float, int]] = deque()
+        # the lease loop: only the newest scheduled tick counts; set while parked waiting for room
+        self._tick_gen = 0
+        self._waiting_room = False
+        self._launched_at: Dict[str, float] = {}
+        # for the capacity report
+        self.legs_in = 0
+        self.busy_seconds = 0.0
+        self.max_queue = 0
+        self.shed = 0
+        self.launched = 0
+        self.landed = 0
+        self.unconfirmed = 0
+
+    def _init_io(self) -> None:
+        """No sockets or threads: legs, handlers and the scheduler session all run on the event heap."""
+
+    def _queue_depth(self) -> int:
+        return len(self._waiting)
+
+    def _log(self, text: str) -> None:
+        if self.sim.log is not None:
+            self.sim.log.write(self.log_path, text)
+
+    def _write_trace(self, line: str) -> None:
+        self.sim.log.write_raw(self.trace_path, line)
+
+    # -- the lease loop (Node._windowed_session, one step per event) --
+
+    def start_sim(self, offset: float) -> None:
+        self._schedule_tick(offset)
+
+    def _schedule_tick(self, delay: float) -> None:
+        self._tick_gen += 1
+        self.sim.after(delay, self._tick, self._tick_gen)
+
+    def _tick(self, gen: int) -> None:
+        if gen != self._tick_gen:
+            return
+        self._waiting_room = False
+        for flight_id in self.window.expire():
+            self._give_up(flight_id, f"no landing report after {self.window.timeout:g}s")
+        room = min(self.window.room(), self.lease_size)
+        if room > 0:
+            self.window.reserve(room)
+            self._to_scheduler(wire.encode_lease(self.code, room))
+            if self.flight_interval:
+                self._schedule_tick(self.flight_interval)
+                return
+        if self.window.room() > 0:
+            self._schedule_tick(0.0)
+            return
+        # full: park like wait_for_room, until a slot frees or the oldest flight is overdue
+        self._waiting_room = True
+        deadline = self.window.next_deadline()
+        self._schedule_tick(max(0.0, deadline - self.sim.now) if deadline is not None else WINDOW_POLL)
+
+    def _room_freed(self) -> None:
+        if self._waiting_room:
+            self._waiting_room = False
+            self._schedule_tick(0.0)
+
+    # -- scheduler session --
+
+    def _to_scheduler(self, frame: bytes) -> bool:
+        _, frame_type, length = wire.decode_header(frame[: wire.HEADER_SIZE])
+        delay = self.sim.control.delay(self.sim.rng) or 0.0
+        self.sim.after(delay, self.sim.scheduler.handle_frame, self.session, frame_type, frame[wire.HEADER_SIZE :], self._addr)
+        return True
+
+    def _from_scheduler(self, frame_type: int, body: bytes) -> None:
+        """Node._read_session for one frame."""
+        if frame_type == wire.PLAN:
+            plan = self._decode_plan(body)
+            if plan is None:
+                self.window.unreserve()
+                return
+            self.window.launched(plan[2])
+            self._launched_at[plan[2]] = self.sim.now
+            self.launched += 1
+            self._launch(plan)
+        elif frame_type == wire.COMPLETE:
+            self._confirmed(*wire.decode_complete_body(body)[1:])
+
+    def _confirmed(self, final: str, flight_id: str) -> None:
+        launched = self._launched_at.pop(flight_id, None)
+        if launched is not None and self.window.finish(flight_id):
+            self._log(f"Flight {flight_id} confirmed landed at {final}.")
+            self._trace(flight_id, "confirm", final=final)
+            self.landed += 1
+            self.sim.flight_times.append(self.sim.now - launched)
+
+    def _give_up(self, flight_id: str, reason: str) -> None:
+        self._launched_at.pop(flight_id, None)
+        self.unconfirmed += 1
+        super()._give_up(flight_id, reason)
+
+    # -- legs --
+
+    def _send_flight(self, target_code: str, flight: Dict[str, Any], summary: str) -> bool:
+        """Put the leg on the wire; the ACK (or BUSY) comes back as an event."""
+        self._trace_leg("depart", flight, to=target_code)
+        target = self.sim.nodes.get(target_code)
+        delay = self.sim.link(self.code, target_code).delay(self.sim.rng) if target is not None else None
+        if delay is None:
+            self._connect_failures.inc()
+            reason = "timed out" if target is not None else f"Missing airport config for {target_code}"
+            self._log(f"Could not reach {target_code} for flight {flight['flight_id']}: {reason}")
+            self._trace_leg("fail", flight, to=target_code, reason=reason)
+            return False
+        self.sim.after(delay, target._arrive, self, flight, summary, self.sim.now, 1)
+        return True
+
+    def _arrive(self, sender: "SimNode", flight: Dict[str, Any], summary: str, sent_at: float, attempt: int) -> None:
+        """A leg reached us: serve it, queue it, or shed it, same as the accept loop."""
+        if self._serving < self.handlers:
+            self._serve(sender, flight, summary, sent_at)
+        elif len(self._waiting) < self.accept_queue:
+            self._waiting.append((self.sim.now, sender, flight, summary, sent_at, attempt))
+            self.max_queue = max(self.max_queue, len(self._waiting))
+        else:
+            self._turn_away(sender, flight, summary, sent_at, attempt)
+
+    def _serve(self, sender: "SimNode", flight: Dict[str, Any], summary: str, sent_at: float) -> None:
+        self._serving += 1
+        self.legs_in += 1
+        self.busy_seconds += self.sim.service_time
+        self.sim.after(self.sim.service_time, self._served, sender, flight, summary, sent_at)
+
+    def _served(self, sender: "SimNode", flight: Dict[str, Any], summary: str, sent_at: float) -> None:
+        # the order _serve_frames does it in: log, ACK, then forward
+        self._log_arrival(flight)
+        back = self.sim.link(self.code, sender.code).delay(self.sim.rng)
+        if back is not None:  # a lost ACK just leaves the sender's log without its Reply line
+            self.sim.after(back, sender._acked, flight, summary, sent_at, self.code)
+        self._after_arrival(flight)
+        self._serving -= 1
+        while self._waiting and self._serving < self.handlers:
+            queued_at, *leg = self._waiting.popleft()
+            if self.sim.now - queued_at > QUEUE_WAIT:
+                self._turn_away(*leg)
+            else:
+                self._serve(*leg[:4])
+
+    def _acked(self, flight: Dict[str, Any], summary: str, sent_at: float, target_code: str) -> None:
+        self._ack_latency.observe(self.sim.now - sent_at)
+        self._log(f"{summary} | Reply: ACK from {target_code}")
+        self._trace_leg("ack", flight, to=target_code)
+
+    def _turn_away(self, sender: "SimNode", flight: Dict[str, Any], summary: str, sent_at: float, attempt: int) -> None:
+        depth = len(self._waiting)
+        retry_after = retry_hint(depth, self.handlers)
+        self.shed += 1
+        self._note_shed(sender._addr, retry_after, depth)
+        back = self.sim.link(self.code, sender.code).delay(self.sim.rng) or 0.0
+        self.sim.after(back, sender._busy_reply, self, wire.PeerBusy(retry_after, depth), flight, summary, sent_at, attempt)
+
+    def _busy_reply(
+        self, target: "SimNode", busy: wire.PeerBusy, flight: Dict[str, Any], summary: str, sent_at: float, attempt: int
+    ) -> None:
+        """Node._send_flight's BUSY retry loop, one try per event."""
+        self._busy_peer.inc()
+        if attempt >= BUSY_RETRIES:
+            self._connect_failures.inc()
+            self._log(f"Could not reach {target.code} for flight {flight['flight_id']}: {busy}")
+            self._trace_leg("fail", flight, to=target.code, reason=str(busy))
+            self._leg_failed(flight)
+            return
+        delay = self.sim.link(self.code, target.code).delay(self.sim.rng)
+        if delay is None:
+            self._connect_failures.inc()
+            self._log(f"Could not reach {target.code} for flight {flight['flight_id']}: timed out")
+            self._trace_leg("fail", flight, to=target.code, reason="timed out")
+            self._leg_failed(flight)
+            return
+        self.sim.after(self._busy_wait(busy) + delay, target._arrive, self, flight, summary, sent_at, attempt + 1)
+
+
+class Simulation:
+    """The event heap, the virtual clock, and the airports and scheduler living on them."""
+
+    def __init__(
+        self,
+        airports: Dict[str, str],
+        hubs: List[str],
+        default_hub: Dict[str, List[str]],
+        seed: int = 0,
+        link: Optional[LinkModel] = None,
+        hub_link: Optional[LinkModel] = None,
+        control: Optional[LinkModel] = None,
+        service_time: float = SERVICE_TIME,
+        routing: str = "source",
+        balance: str = "load",
+        log_dir: Optional[Path] = Path("logs") / "sim",
+        **node_options,
+    ) -> None:
+        self.now = 0.0
+        self._events: List[Event] = []
+        self._seq = itertools.count()
+        # everything random in the run (links, plans, BUSY jitter) draws from this, never the module RNG
+        self.rng = random.Random(seed)
+        # the run's metrics (thousands of airports' worth), kept out of the process-wide REGISTRY
+        self.registry = Registry()
+        self.hubs = set(hubs)
+        self.default_link = link or LinkModel()
+        self.hub_link = hub_link  # hub <-> hub, when it differs from everything else
+        self.control = control or LinkModel(self.default_link.latency)
+        self.service_time = service_time
+        self.flight_times: List[float] = []
+        self.log_dir = log_dir or Path("logs") / "sim"
+        self.log: Optional[SimLog] = SimLog(log_dir, self.clock) if log_dir is not None else None
+        self._scheduler_log = self.log_dir / "scheduler.log"
+
+        self.scheduler = Scheduler(airports, hubs, default_hub, seed=seed, balance=balance_mode(balance, routing), rng=self.rng, registry=self.registry)
+        self.scheduler.log = self._log_scheduler
+        self.scheduler.clock = self.clock
+        routes = RoutingTable.from_config(airports, hubs, default_hub) if routing == "table" else None
+        self.nodes: Dict[str, SimNode] = {code: SimNode(self, code, airports, routes=routes, **node_options) for code in airports}
+
+    def clock(self) -> float:
+        return self.now
+
+    def after(self, delay: float, fn: Callable[..., None], *args: Any) -> None:
+        heapq.heappush(self._events, (self.now + delay, next(self._seq), fn, args))
+
+    def link(self, a: str, b: str) -> LinkModel:
+        if self.hub_link is not None and a in self.hubs and b in self.hubs:
+            return self.hub_link
+        return self.default_link
+
+    def run(self, duration: float, top: int = 10) -> Dict[str, Any]:
+        """Fly for `duration` virtual seconds and return the report (see summary())."""
+        for node in self.nodes.values():
+            # real nodes come up a few ms apart; starting them all on the same tick would fly in lockstep
+            node.start_sim(self.rng.random() * 0.01)
+        started = time.perf_counter()
+        events = self._events
+        pop = heapq.heappop
+        count = 0
+        while events and events[0][0] <= duration:
+            when, _, fn, args = pop(events)
+            self.now = when
+            fn(*args)
+            count += 1
+        self.now = duration
+        wall = time.perf_counter() - started
+        if self.log is not None:
+            self.log.close()
+        return self.summary(duration, wall, count, top)
+
+    def summary(self, duration: float, wall: float, events: int, top: int = 10) -> Dict[str, Any]:
+        nodes = list(self.nodes.values())
+        handlers = nodes[0].handlers if nodes else 1
+        times = sorted(self.flight_times)
+
+        def pct(p: float) -> Optional[float]:
+            return round(times[min(len(times) - 1, int(p * len(times)))], 6) if times else None
+
+        busiest = sorted(nodes, key=lambda n: (-n.legs_in, n.code))[:top]
+        return {
+            "airports": len(nodes),
+            "virtual_seconds": duration,
+            "wall_seconds": round(wall, 3),
+            "speedup": round(duration / wall, 1) if wall else None,
+            "events": events,
+            "flights": {
+                "launched": sum(n.launched for n in nodes),
+                "landed": sum(n.landed for n in nodes),
+                "unconfirmed": sum(n.unconfirmed for n in nodes),
+                "in_air": sum(len(n.window) for n in nodes),
+            },
+            "flight_seconds": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": pct(1.0)},
+            "busiest": [
+                {
+                    "code": n.code,
+                    "hub": n.code in self.hubs,
+                    "legs": n.legs_in,
+                    "legs_per_second": round(n.legs_in / duration, 1),
+                    "utilization": round(n.busy_seconds / (handlers * duration), 4),
+                    "max_queue": n.max_queue,
+                    "shed": n.shed,
+                }
+                for n in busiest
+            ],
+        }
+
+    def _log_scheduler(self, text: str) -> None:
+        if self.log is not None:
+            self.log.write(self._scheduler_log, text)
+
+
+def generated_topology(count: int, hub_count: int, seed: int) -> Tuple[Dict[str, str], List[str], Dict[str, List[str]]]:
+    """The loadtest's made-up network, minus its probe airport."""
+    airports, hubs, default_hub = generate_topology(count, hub_count, 20000, seed)
+    airports.pop(PROBE_CODE, None)
+    default_hub.pop(PROBE_CODE, None)
+    return airports, hubs, default_hub
+
+
+def _print_summary(report: Dict[str, Any]) -> None:
+    flights = report["flights"]
+    times = report["flight_seconds"]
+    print(
+        f"[sim] {report['airports']} airports, {report['virtual_seconds']:g} virtual s in {report['wall_seconds']:.2f} s "
+        f"({report['speedup']}x), {report['events']} events"
+    )
+    print(
+        f"[sim] flights: {flights['launched']} launched, {flights['landed']} landed, "
+        f"{flights['unconfirmed']} unconfirmed, {flights['in_air']} still in the air"
+    )
+    if times["p50"] is not None:
+        print(f"[sim] flight time p50 {times['p50'] * 1000:.1f} ms, p95 {times['p95'] * 1000:.1f} ms, p99 {times['p99'] * 1000:.1f} ms")
+    print(f"[sim] {'airport':<8}{'legs/s':>10}{'util':>8}{'max queue':>11}{'shed':>8}")
+    for row in report["busiest"]:
+        label = row["code"] + (" (hub)" if row["hub"] else "")
+        print(f"[sim] {label:<8}{row['legs_per_second']:>10}{row['utilization']:>8.1%}{row['max_queue']:>11}{row['shed']:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate the airport network on a virtual clock")
+    parser.add_argument("--airports", default="src/airports.yaml", help="path to airports.yaml")
+    parser.add_argument("--routes", default="src/routes.yaml", help="path to routes.yaml")
+    parser.add_argument("--generate", type=int, metavar="N", help="made-up network of N airports instead of the yaml files")
+    parser.add_argument("--hubs", type=int, default=10, help="hubs in a --generate network")
+    parser.add_argument("--duration", type=float, default=60.0, help="virtual seconds to fly")
+    parser.add_argument("--seed", type=int, default=0, help="same seed, same run")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="one-way link latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra latency on top, up to (uniform) or averaging (exp) this")
+    parser.add_argument("--jitter-kind", choices=("uniform", "exp"), default="uniform")
+    parser.add_argument("--loss", type=float, default=0.0, help="chance each try of a leg is lost and resent")
+    parser.add_argument("--hub-latency", type=float, help="one-way latency between two hubs (default: --latency)")
+    parser.add_argument("--hub-loss", type=float, help="loss between two hubs (default: --loss)")
+    parser.add_argument("--service-time", type=float, default=SERVICE_TIME, help="handler seconds per arriving leg")
+    parser.add_argument("--handlers", type=int, default=64, help="legs an airport serves at once")
+    parser.add_argument("--accept-queue", type=int, default=128, help="legs allowed to wait for a handler before BUSY")
+    parser.add_argument("--window", type=int, default=4, help="flights each airport keeps in the air")
+    parser.add_argument("--lease-size", type=int, default=4)
+    parser.add_argument("--flight-interval", type=float, default=1.0)
+    parser.add_argument("--flight-timeout", type=float, default=10.0)
+    parser.add_argument("--routing", choices=("source", "table"), default="source", help="table builds all-pairs routes; slow for big networks")
+    parser.add_argument("--balance", choices=("load", "uniform"), default="load", help="how the scheduler picks destinations and layovers")
+    parser.add_argument("--log-dir", default="logs/sim", help="where the per-airport logs go")
+    parser.add_argument("--no-logs", action="store_true", help="skip the logs (much faster for big networks)")
+    parser.add_argument("--trace", action="store_true", help="also write <code>.trace.jsonl records (see flighttrace.py)")
+    parser.add_argument("--top", type=int, default=10, help="busiest airports to list")
+    parser.add_argument("--out", help="write the report as JSON here")
+    args = parser.parse_args()
+
+    if args.generate:
+        airports, hubs, default_hub = generated_topology(args.generate, args.hubs, args.seed)
+    else:
+        airports = load_airports(args.airports)
+        hubs, default_hub = load_routes(args.routes)
+    link = LinkModel(args.latency, args.jitter, args.loss, args.jitter_kind)
+    hub_link = None
+    if args.hub_latency is not None or args.hub_loss is not None:
+        hub_link = LinkModel(
+            args.latency if args.hub_latency is None else args.hub_latency,
+            args.jitter,
+            args.loss if args.hub_loss is None else args.hub_loss,
+            args.jitter_kind,
+        )
+
+    if balance_mode(args.balance, args.routing) != args.balance:
+        print("[sim] --routing table picks its own layovers, so load balancing is off (--balance uniform)")
+    built = time.perf_counter()
+    sim = Simulation(
+        airports,
+        hubs,
+        default_hub,
+        seed=args.seed,
+        link=link,
+        hub_link=hub_link,
+        service_time=args.service_time,
+        routing=args.routing,
+        balance=args.balance,
+        log_dir=None if args.no_logs else Path(args.log_dir),
+        handlers=args.handlers,
+        accept_queue=args.accept_queue,
+        window=args.window,
+        lease_size=args.lease_size,
+        flight_interval=args.flight_interval,
+        flight_timeout=args.flight_timeout,
+        trace=args.trace,
+    )
+    print(f"[sim] built {len(airports)} airports in {time.perf_counter() - built:.2f} s")
+    report = sim.run(args.duration, args.top)
+    _print_summary(report)
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"[sim] report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
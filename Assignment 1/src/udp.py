@@ -0,0 +1,320 @@
+import random
+import select
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from . import wire
+from .metrics import REGISTRY, Registry
+
+# UDP transport for flight legs, for loopback/LAN where a TCP link per peer is overkill.
+#
+# Every leg is one datagram: a DATAGRAM frame holding a sequence number and
+# the same FLIGHT/ROUTED frame a TCP link would carry (see wire.py). No
+# handshake, no connection, one sendto per leg.
+#
+#   sender                                  receiver
+#   DATAGRAM(seq=7, flight) ------------->  drains everything queued on the socket,
+#   DATAGRAM(seq=8, flight) ------------->  then one SACK per sender for the lot
+#                           <-------------  SACK(SEA, [7, 8])
+#
+# The sender keeps each leg until its sequence number shows up in a SACK.
+# Legs whose timer runs out are resent on their own (selective, not go-back-N)
+# with the timeout doubling each try; after MAX_TRIES the leg is reported as
+# failed, like a refused TCP connect. The timeout itself follows the measured
+# round trip (RFC 6298 style smoothing, resends don't count as samples).
+# Receivers remember recent sequence numbers per sender, so a resend whose
+# SACK got lost is ACKed again but delivered only once.
+#
+# Each airport binds one UDP socket on the same port number as its TCP
+# listener and uses it both ways, so SACKs come back to the socket that
+# reads arrivals. One background thread per airport does all the receiving,
+# ACKing and resending; sends happen on the caller's thread and never block.
+# That thread sleeps in select() until a datagram arrives or the earliest
+# resend is due, so an idle airport costs no wakeups. A send that finds
+# nothing else in flight pokes it with an empty datagram to itself, since it
+# may be halfway through a long idle sleep.
+
+Addr = Tuple[str, int]
+# done(ack_text, None) once ACKed, done(None, error) once we gave up
+AckCallback = Callable[[Optional[str], Optional[Exception]], None]
+# (frame type, frame body, sender) for each new leg in a burst
+Arrival = Tuple[int, bytes, Addr]
+
+MAX_DATAGRAM = 65507
+INITIAL_RTO = 0.1  # seconds, before we've measured anything
+MIN_RTO = 0.01
+MAX_RTO = 2.0
+MAX_TRIES = 6
+IDLE_WAIT = 1.0  # receive loop's longest sleep when nothing is waiting for a SACK
+DRAIN_LIMIT = 256  # datagrams handled per burst before ACKing
+SACK_MAX = 256  # sequence numbers per SACK datagram
+RECV_BUFFER = 1 << 20  # bytes; the kernel may cap it (net.core.rmem_max)
+SEEN_WINDOW = 4096  # sequence numbers remembered per sender for duplicate checks
+
+
+class _Pending:
+    __slots__ = ("addr", "datagram", "first_sent", "sent_at", "tries", "rto", "done")
+
+    def __init__(self, addr: Addr, datagram: bytes, now: float, rto: float, done: AckCallback) -> None:
+        self.addr = addr
+        self.datagram = datagram
+        self.first_sent = now
+        self.sent_at = now
+        self.tries = 1
+        self.rto = rto
+        self.done = done
+
+
+class UdpTransport:
+    """One airport's UDP socket: sends legs, ACKs arrivals in batches, resends what wasn't ACKed."""
+
+    def __init__(
+        self,
+        owner_code: str,
+        host: str,
+        port: int,
+        deliver: Callable[[List[Arrival]], None],
+        max_tries: int = MAX_TRIES,
+        registry: Registry = REGISTRY,
+    ) -> None:
+        self.owner_code = owner_code
+        self.host = host
+        self.port = port
+        self.deliver = deliver
+        self.max_tries = max_tries
+        self.registry = registry
+        self.sock: Optional[socket.socket] = None
+        self._self_addr: Optional[Addr] = None
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._lock = threading.Lock()
+        # random start so a restarted sender doesn't look like a pile of duplicates
+        self._next_seq = random.getrandbits(32)
+        self._pending: Dict[int, _Pending] = {}
+        self._srtt: Optional[float] = None
+        self._rttvar = 0.0
+        self._rto = INITIAL_RTO
+        self._seen: Dict[Addr, Tuple[Set[int], Deque[int]]] = {}
+        # one max-size datagram buffer for the receive thread, instead of recvfrom() allocating 64 KB per read
+        self._recv_view = memoryview(bytearray(MAX_DATAGRAM))
+        datagrams = "UDP leg datagrams, by airport and kind."
+        self._sent = registry.counter("node_udp_datagrams_total", datagrams, airport=owner_code, kind="sent")
+        self._resent = registry.counter("node_udp_datagrams_total", datagrams, airport=owner_code, kind="resent")
+        self._received = registry.counter("node_udp_datagrams_total", datagrams, airport=owner_code, kind="received")
+        self._duplicates = registry.counter("node_udp_datagrams_total", datagrams, airport=owner_code, kind="duplicate")
+        self._sacks = registry.counter("node_udp_datagrams_total", datagrams, airport=owner_code, kind="sack")
+        self._given_up = registry.counter(
+            "node_udp_legs_failed_total", "UDP legs dropped after every resend went unanswered.", airport=owner_code
+        )
+        registry.gauge_fn("node_udp_unacked", "UDP legs sent and not ACKed yet.", self.unacked, airport=owner_code)
+
+    def open(self) -> None:
+        """Bind the socket and start the receive loop (raises OSError if the port is taken)."""
+        if self.sock is not None:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # bursts of legs (and resends) arrive faster than one thread drains them
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+        except OSError:
+            pass  # keep the OS default
+        try:
+            sock.bind((self.host, self.port))
+        except OSError:
+            sock.close()
+            raise
+        sock.setblocking(False)
+        self._self_addr = sock.getsockname()
+        self.sock = sock
+        self._thread = threading.Thread(target=self._run, name=f"udp-{self.owner_code}", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """Stop receiving. Legs still waiting for a SACK are dropped without a callback."""
+        self._closed = True
+        if self.sock is not None:
+            self._sendto(b"", self._self_addr)  # cut its select() short
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        with self._lock:
+            self._pending.clear()
+        self.registry.remove("node_udp_unacked", airport=self.owner_code)
+
+    def unacked(self) -> int:
+        return len(self._pending)
+
+    def send(self, addr: Addr, frame: bytes, done: AckCallback) -> None:
+        """Send one FLIGHT/ROUTED frame to addr; done() runs on the receive thread later."""
+        sock = self.sock
+        if sock is None:
+            raise ConnectionError("UDP transport is not open")
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq = (seq + 1) & 0xFFFFFFFF
+            datagram = wire.encode_datagram(seq, frame)
+            if len(datagram) > MAX_DATAGRAM:
+                raise wire.FrameError(f"flight too large for one datagram: {len(datagram)} bytes")
+            was_idle = not self._pending
+            # registered before it goes out, so even an instant SACK finds it
+            self._pending[seq] = _Pending(addr, datagram, time.monotonic(), self._rto, done)
+        self._sendto(datagram, addr)
+        self._sent.inc()
+        if was_idle:
+            self._sendto(b"", self._self_addr)  # wake the receive loop so it arms the resend timer
+
+    def send_wait(self, addr: Addr, frame: bytes, timeout: float = 10.0) -> str:
+        """Blocking send(): returns the ACK text or raises like a TCP send would."""
+        finished = threading.Event()
+        outcome: List = [None, None]
+
+        def done(ack: Optional[str], exc: Optional[Exception]) -> None:
+            outcome[0], outcome[1] = ack, exc
+            finished.set()
+
+        self.send(addr, frame, done)
+        if not finished.wait(timeout):
+            raise TimeoutError(f"no ACK from {addr[0]}:{addr[1]} within {timeout:.0f}s")
+        if outcome[1] is not None:
+            raise outcome[1]
+        return outcome[0]
+
+    def _sendto(self, datagram: bytes, addr: Addr) -> None:
+        try:
+            self.sock.sendto(datagram, addr)
+        except (BlockingIOError, AttributeError):
+            pass  # socket buffer full (or closed under us); the resend timer covers it
+        except OSError:
+            pass  # e.g. ICMP unreachable on Windows; same thing, the leg will time out
+
+    def _run(self) -> None:
+        while not self._closed:
+            sock = self.sock
+            try:
+                readable, _, _ = select.select([sock], [], [], self._next_wait())
+            except (OSError, ValueError, TypeError):
+                return  # socket closed
+            if readable:
+                self._drain(sock)
+            self._resend_due()
+
+    def _next_wait(self) -> float:
+        """Seconds until the earliest unACKed leg is due for a resend (IDLE_WAIT if none)."""
+        with self._lock:
+            if not self._pending:
+                return IDLE_WAIT
+            due = min(pending.sent_at + pending.rto for pending in self._pending.values())
+        return min(IDLE_WAIT, max(0.0, due - time.monotonic()))
+
+    def _drain(self, sock: socket.socket) -> None:
+        """Read every queued datagram, SACK the new legs per sender, then hand them over."""
+        owed: Dict[Addr, List[int]] = {}
+        arrivals: List[Arrival] = []
+        view = self._recv_view
+        for _ in range(DRAIN_LIMIT):
+            try:
+                count, addr = sock.recvfrom_into(view)
+            except BlockingIOError:
+                break
+            except ConnectionResetError:
+                continue  # Windows reports ICMP errors from earlier sends here
+            except OSError:
+                return
+            try:
+                frame_type, body = wire.decode_packet(view[:count])
+                if frame_type == wire.SACK:
+                    self._acked(*wire.decode_sack_body(body))
+                    continue
+                if frame_type != wire.DATAGRAM:
+                    continue
+                seq, inner_type, inner = wire.decode_datagram_body(body)
+            except wire.FrameError:
+                continue  # a wake-up poke, or not ours / mangled (the sender will resend)
+            self._received.inc()
+            owed.setdefault(addr, []).append(seq)
+            if self._seen_before(addr, seq):
+                self._duplicates.inc()
+                continue
+            # the next recvfrom_into overwrites the buffer, so this one small frame gets copied out
+            arrivals.append((inner_type, bytes(inner), addr))
+
+        # ACK before delivering, so forwarding a leg never holds up the sender's timer
+        for addr, seqs in owed.items():
+            for start in range(0, len(seqs), SACK_MAX):
+                self._sendto(wire.encode_sack(self.owner_code, seqs[start : start + SACK_MAX]), addr)
+                self._sacks.inc()
+        if arrivals:
+            self.deliver(arrivals)
+
+    def _seen_before(self, addr: Addr, seq: int) -> bool:
+        seen = self._seen.get(addr)
+        if seen is None:
+            seen = self._seen[addr] = (set(), deque())
+        members, order = seen
+        if seq in members:
+            return True
+        members.add(seq)
+        order.append(seq)
+        if len(order) > SEEN_WINDOW:
+            members.discard(order.popleft())
+        return False
+
+    def _acked(self, code: str, seqs: Tuple[int, ...]) -> None:
+        now = time.monotonic()
+        finished: List[_Pending] = []
+        with self._lock:
+            for seq in seqs:
+                pending = self._pending.pop(seq, None)
+                if pending is None:
+                    continue  # duplicate SACK for a resend
+                if pending.tries == 1:
+                    self._sample_rtt(now - pending.first_sent)
+                finished.append(pending)
+        reply = f"ACK from {code}"
+        for pending in finished:
+            self._finish(pending, reply, None)
+
+    def _sample_rtt(self, rtt: float) -> None:
+        # caller holds the lock
+        if self._srtt is None:
+            self._srtt, self._rttvar = rtt, rtt / 2
+        else:
+            self._rttvar = 0.75 * self._rttvar + 0.25 * abs(self._srtt - rtt)
+            self._srtt = 0.875 * self._srtt + 0.125 * rtt
+        self._rto = min(MAX_RTO, max(MIN_RTO, self._srtt + 4 * self._rttvar))
+
+    def _resend_due(self) -> None:
+        now = time.monotonic()
+        resend: List[_Pending] = []
+        failed: List[_Pending] = []
+        with self._lock:
+            for seq, pending in list(self._pending.items()):
+                if now - pending.sent_at < pending.rto:
+                    continue
+                if pending.tries >= self.max_tries:
+                    del self._pending[seq]
+                    failed.append(pending)
+                    continue
+                pending.tries += 1
+                pending.sent_at = now
+                pending.rto = min(MAX_RTO, pending.rto * 2)
+                resend.append(pending)
+        for pending in resend:
+            self._sendto(pending.datagram, pending.addr)
+            self._resent.inc()
+        for pending in failed:
+            self._given_up.inc()
+            host, port = pending.addr
+            self._finish(pending, None, TimeoutError(f"no ACK from {host}:{port} after {pending.tries} tries"))
+
+    def _finish(self, pending: _Pending, ack: Optional[str], exc: Optional[Exception]) -> None:
+        try:
+            pending.done(ack, exc)
+        except Exception as err:  # a broken callback mustn't take the receive loop down with it
+            print(f"[udp {self.owner_code}] ack callback failed: {err}")
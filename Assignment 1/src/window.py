@@ -0,0 +1,121 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# How many flights one airport has in the air at once.
+#
+# A flight takes a slot from the moment its plan is leased until the final
+# hop's COMPLETE report comes back (final hop -> scheduler -> origin), so the
+# origin never waits on a leg's ACK to start the next flight, and a slow hub
+# only holds up the slots that are actually stuck behind it. A flight whose
+# report never shows up (lost, or the final hop predates COMPLETE) gives its
+# slot back after `timeout` seconds.
+#
+# Slots go through two states:
+#   reserved  asked the scheduler for a plan, plan not here yet
+#   flying    plan launched, waiting for its report
+#
+# Everything happens under one lock; the threaded Node blocks in
+# wait_for_room(), AsyncNode passes on_room to get poked on its loop instead.
+# Deadlines come from `clock` (time.monotonic, or simulation.py's virtual one).
+
+FLIGHT_TIMEOUT = 10.0  # seconds to wait for a COMPLETE report before giving the slot back
+
+
+class FlightWindow:
+    """Bookkeeping for one origin's outbound flights, capped at `size`."""
+
+    def __init__(
+        self,
+        size: int,
+        timeout: float = FLIGHT_TIMEOUT,
+        on_room: Optional[Callable[[], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.on_room = on_room
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._reserved = 0
+        self._flying: Dict[str, float] = {}  # flight id -> deadline, in clock() time
+
+    def room(self) -> int:
+        with self._cond:
+            return self._room_locked()
+
+    def _room_locked(self) -> int:
+        return self.size - self._reserved - len(self._flying)
+
+    def reserve(self, count: int) -> None:
+        """`count` plans were just asked for."""
+        with self._cond:
+            self._reserved += count
+
+    def unreserve(self, count: int = 1) -> None:
+        """A reserved plan isn't coming (odd frame, or the session ended)."""
+        with self._cond:
+            self._reserved = max(0, self._reserved - count)
+            self._freed_locked()
+
+    def launched(self, flight_id: str) -> None:
+        """A reserved plan arrived and is being flown."""
+        with self._cond:
+            self._reserved = max(0, self._reserved - 1)
+            self._flying[flight_id] = self.clock() + self.timeout
+
+    def finish(self, flight_id: str) -> bool:
+        """Report came back (or the flight failed). False if it wasn't ours, or already timed out."""
+        with self._cond:
+            if self._flying.pop(flight_id, None) is None:
+                return False
+            self._freed_locked()
+            return True
+
+    def expire(self) -> List[str]:
+        """Drop and return the flights whose report is overdue."""
+        now = self.clock()
+        with self._cond:
+            overdue = [flight_id for flight_id, deadline in self._flying.items() if deadline <= now]
+            for flight_id in overdue:
+                del self._flying[flight_id]
+            if overdue:
+                self._freed_locked()
+            return overdue
+
+    def next_deadline(self) -> Optional[float]:
+        with self._cond:
+            return min(self._flying.values()) if self._flying else None
+
+    def clear(self) -> int:
+        """Forget everything (the scheduler session is gone, reports for it won't come). Returns flights dropped."""
+        with self._cond:
+            dropped = len(self._flying)
+            self._flying.clear()
+            self._reserved = 0
+            self._freed_locked()
+            return dropped
+
+    def wake(self) -> None:
+        """Get a wait_for_room() caller out early, e.g. because the session died."""
+        with self._cond:
+            self._freed_locked()
+
+    def wait_for_room(self, timeout: float) -> int:
+        """Block until a slot is free, a flight is overdue, wake() is called, or `timeout` passes. Returns free slots."""
+        with self._cond:
+            if self._room_locked() <= 0:
+                wait = timeout
+                if self._flying:
+                    wait = min(wait, min(self._flying.values()) - self.clock())
+                if wait > 0:
+                    self._cond.wait(wait)
+            return max(0, self._room_locked())
+
+    def __len__(self) -> int:
+        return len(self._flying)
+
+    def _freed_locked(self) -> None:
+        self._cond.notify_all()
+        if self.on_room is not None:
+            self.on_room()
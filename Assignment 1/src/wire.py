@@ -0,0 +1,479 @@
+import asyncio
+import json
+import socket
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+from .buffers import POOL, BufferPool
+
+# Length-prefixed binary framing for flight traffic.
+#
+# Every frame is a 7 byte header followed by the body:
+#   magic (1 byte, 0xA7) | version (1) | type (1) | body length (4, big endian)
+#
+# 0xA7 can never start a UTF-8 string, and the old protocol is either JSON
+# ('{') or plain text (an airport code), so a receiver can tell the two
+# apart from the very first byte. That is how old and new nodes (and the
+# scheduler) keep talking during a rollout:
+#   new client -> HELLO(max version)   new server -> HELLO(agreed version)
+#   new client -> HELLO(...)           old server -> some text ACK / nothing
+#                                                   => client drops to JSON/text
+#
+# Flight body (FLIGHT / PLAN frames):
+#   flight_id: u8 len + ascii | from_idx u8 | to_idx u8 | leg count u8
+#   legs: 3 ascii bytes each (IATA codes are always 3 letters)
+#   payload: u32 len + utf-8
+#
+# Routed body (ROUTED frames, v3+), the same size however long the trip is:
+#   flight_id: u8 len + ascii | origin, prev hop, destination: 3 bytes each
+#   hop count u8 | payload: u32 len + utf-8
+#
+# UDP legs (v4+, see udp.py), one frame per datagram:
+#   DATAGRAM body: sequence u32 | a whole FLIGHT or ROUTED frame
+#   SACK body:     acking airport (3 bytes) | sequence u32 * n
+#
+# Completion reports (v5+), on scheduler sessions only:
+#   COMPLETE body: origin (3 bytes) | final hop (3 bytes) | flight_id ascii
+#   the final hop sends it to the scheduler, which passes the same frame on
+#   to the origin's session
+#
+# Load shedding (v6+), the whole reply from a server with no room for us:
+#   BUSY body: retry after, ms (u32) | connections queued ahead (u32)
+#   sent in place of the HELLO answer, then the server hangs up. Text peers get
+#   "BUSY <ms>" instead, as a line (LINK handshake) or the whole reply.
+
+MAGIC = 0xA7
+PROTOCOL_VERSION = 6
+MIN_VERSION = 1
+LEASE_VERSION = 2  # v2 added LEASE: many plans per scheduler session
+ROUTED_VERSION = 3  # v3 added ROUTED: forward by destination, no legs list
+UDP_VERSION = 4  # v4 added DATAGRAM/SACK for the UDP leg transport
+COMPLETE_VERSION = 5  # v5 added COMPLETE: end-to-end reports and windowed sessions
+BUSY_VERSION = 6  # v6 added BUSY: "full, come back in n ms" instead of a HELLO
+MAX_FRAME = 1 << 20  # 1 MB is far past any sane flight
+
+HELLO = 1
+FLIGHT = 2
+ACK = 3
+REGISTER = 4
+PLAN = 5
+DONE = 6
+LEASE = 7
+ROUTED = 8
+DATAGRAM = 9
+SACK = 10
+COMPLETE = 11
+BUSY = 12
+
+BUSY_TEXT = "BUSY"
+
+_HEADER = struct.Struct(">BBBI")
+HEADER_SIZE = _HEADER.size
+_IDX = struct.Struct(">BBB")
+_U32 = struct.Struct(">I")
+_U16 = struct.Struct(">H")
+
+# bytes -> str for airport codes, so decoding the same code twice hands back
+# the same string object instead of a fresh one every hop.
+_CODE_CACHE: Dict[bytes, str] = {}
+
+
+class FrameError(ValueError):
+    """Raised when bytes on the wire are not a valid frame."""
+
+
+class PeerBusy(ConnectionError):
+    """The other side shed this connection; try again after `retry_after` seconds."""
+
+    def __init__(self, retry_after: float, depth: int = 0) -> None:
+        super().__init__(f"busy, retry after {retry_after * 1000:.0f} ms ({depth} queued)")
+        self.retry_after = retry_after
+        self.depth = depth
+
+
+def is_framed(first_bytes: bytes) -> bool:
+    """True if the first bytes off a socket look like a binary frame."""
+    return bool(first_bytes) and first_bytes[0] == MAGIC
+
+
+def encode_frame(frame_type: int, body: bytes = b"", version: int = PROTOCOL_VERSION) -> bytes:
+    if len(body) > MAX_FRAME:
+        raise FrameError(f"frame body too large: {len(body)} bytes")
+    return _HEADER.pack(MAGIC, version, frame_type, len(body)) + body
+
+
+def decode_header(header: bytes) -> Tuple[int, int, int]:
+    """Return (version, type, body length) for a 7 byte header."""
+    return decode_header_from(header, 0)
+
+
+def decode_header_from(buf, offset: int) -> Tuple[int, int, int]:
+    """decode_header straight out of a bigger buffer, without slicing it first."""
+    magic, version, frame_type, length = _HEADER.unpack_from(buf, offset)
+    if magic != MAGIC:
+        raise FrameError(f"bad magic byte {magic:#x}")
+    if length > MAX_FRAME:
+        raise FrameError(f"frame body too large: {length} bytes")
+    return version, frame_type, length
+
+
+def _code_bytes(code: str) -> bytes:
+    raw = code.encode("ascii")
+    if len(raw) != 3:
+        raise FrameError(f"airport code must be 3 letters: {code!r}")
+    return raw
+
+
+def _code_str(raw: bytes) -> str:
+    code = _CODE_CACHE.get(raw)
+    if code is None:
+        code = _CODE_CACHE.setdefault(bytes(raw), raw.decode("ascii"))
+    return code
+
+
+def encode_hello(name: str, version: int = PROTOCOL_VERSION) -> bytes:
+    """HELLO body is just who is talking (airport code or 'scheduler'); the header carries the version."""
+    return encode_frame(HELLO, name.encode("ascii"), version)
+
+
+def negotiate(their_version: int) -> int:
+    """Pick the version both sides speak, or raise if there is none."""
+    agreed = min(their_version, PROTOCOL_VERSION)
+    if agreed < MIN_VERSION:
+        raise FrameError(f"no common protocol version (peer speaks {their_version})")
+    return agreed
+
+
+def encode_flight_body(flight_id: str, payload: str, legs: List[str], from_idx: int, to_idx: int) -> bytes:
+    fid = flight_id.encode("ascii")
+    text = payload.encode("utf-8")
+    if len(fid) > 255 or len(legs) > 255 or to_idx > 255:
+        raise FrameError("flight too long for the binary format")
+    return b"".join(
+        (
+            bytes((len(fid),)),
+            fid,
+            _IDX.pack(from_idx, to_idx, len(legs)),
+            b"".join(_code_bytes(code) for code in legs),
+            _U32.pack(len(text)),
+            text,
+        )
+    )
+
+
+def decode_flight_body(body: bytes) -> Dict[str, Any]:
+    """Inverse of encode_flight_body; returns the same dict shape the JSON path builds."""
+    try:
+        view = memoryview(body)
+        fid_len = view[0]
+        pos = 1 + fid_len
+        flight_id = bytes(view[1:pos]).decode("ascii")
+        from_idx, to_idx, count = _IDX.unpack_from(view, pos)
+        pos += _IDX.size
+        legs = [_code_str(bytes(view[pos + i * 3 : pos + i * 3 + 3])) for i in range(count)]
+        pos += count * 3
+        (text_len,) = _U32.unpack_from(view, pos)
+        pos += _U32.size
+        payload = bytes(view[pos : pos + text_len]).decode("utf-8")
+    except (IndexError, struct.error, UnicodeDecodeError) as exc:
+        raise FrameError(f"bad flight body: {exc}") from exc
+    if pos + text_len != len(body):
+        raise FrameError("flight body length mismatch")
+    return {
+        "flight_id": flight_id,
+        "payload": payload,
+        "legs": legs,
+        "from_idx": from_idx,
+        "to_idx": to_idx,
+    }
+
+
+def encode_flight(flight_id: str, payload: str, legs: List[str], from_idx: int, to_idx: int) -> bytes:
+    return encode_frame(FLIGHT, encode_flight_body(flight_id, payload, legs, from_idx, to_idx))
+
+
+def encode_routed(flight_id: str, payload: str, origin: str, prev: str, dest: str, hops: int) -> bytes:
+    fid = flight_id.encode("ascii")
+    text = payload.encode("utf-8")
+    if len(fid) > 255 or hops > 255:
+        raise FrameError("flight too long for the binary format")
+    body = b"".join(
+        (
+            bytes((len(fid),)),
+            fid,
+            _code_bytes(origin),
+            _code_bytes(prev),
+            _code_bytes(dest),
+            bytes((hops,)),
+            _U32.pack(len(text)),
+            text,
+        )
+    )
+    return encode_frame(ROUTED, body)
+
+
+def decode_routed_body(body: bytes) -> Dict[str, Any]:
+    try:
+        view = memoryview(body)
+        pos = 1 + view[0]
+        flight_id = bytes(view[1:pos]).decode("ascii")
+        origin = _code_str(bytes(view[pos : pos + 3]))
+        prev = _code_str(bytes(view[pos + 3 : pos + 6]))
+        dest = _code_str(bytes(view[pos + 6 : pos + 9]))
+        hops = view[pos + 9]
+        (text_len,) = _U32.unpack_from(view, pos + 10)
+        pos += 10 + _U32.size
+        payload = bytes(view[pos : pos + text_len]).decode("utf-8")
+    except (IndexError, struct.error, UnicodeDecodeError) as exc:
+        raise FrameError(f"bad routed body: {exc}") from exc
+    if pos + text_len != len(body):
+        raise FrameError("routed body length mismatch")
+    return {
+        "flight_id": flight_id,
+        "payload": payload,
+        "origin": origin,
+        "prev": prev,
+        "dest": dest,
+        "hops": hops,
+    }
+
+
+def flight_frame(flight: Dict[str, Any], version: int = PROTOCOL_VERSION) -> bytes:
+    """Frame for a flight dict: ROUTED if it has a destination and the peer is new enough, else FLIGHT.
+
+    Routed flights also carry a fallback 'legs' path, so older peers get a
+    normal FLIGHT frame and source-route the rest of the way.
+    """
+    if "dest" in flight and version >= ROUTED_VERSION:
+        return encode_routed(
+            flight["flight_id"], flight["payload"], flight["origin"], flight["prev"], flight["dest"], flight["hops"]
+        )
+    return encode_flight(flight["flight_id"], flight["payload"], flight["legs"], flight["from_idx"], flight["to_idx"])
+
+
+def decode_flight_frame(frame_type: int, body: bytes) -> Dict[str, Any]:
+    """Body of a FLIGHT or ROUTED frame -> flight dict."""
+    if frame_type == FLIGHT:
+        return decode_flight_body(body)
+    if frame_type == ROUTED:
+        return decode_routed_body(body)
+    raise FrameError(f"unexpected frame type {frame_type}")
+
+
+def decode_packet(data: bytes) -> Tuple[int, bytes]:
+    """(type, body) of a frame that has to be exactly `data`, e.g. one datagram."""
+    if len(data) < HEADER_SIZE:
+        raise FrameError("short frame")
+    _, frame_type, length = decode_header_from(data, 0)
+    if HEADER_SIZE + length != len(data):
+        raise FrameError("frame length mismatch")
+    return frame_type, data[HEADER_SIZE:]
+
+
+def encode_datagram(seq: int, frame: bytes) -> bytes:
+    return encode_frame(DATAGRAM, _U32.pack(seq) + frame)
+
+
+def decode_datagram_body(body: bytes) -> Tuple[int, int, bytes]:
+    """(sequence, inner frame type, inner frame body) from a DATAGRAM body."""
+    if len(body) < _U32.size:
+        raise FrameError("short datagram")
+    (seq,) = _U32.unpack_from(body)
+    frame_type, inner = decode_packet(body[_U32.size :])
+    return seq, frame_type, inner
+
+
+def encode_sack(code: str, seqs: List[int]) -> bytes:
+    return encode_frame(SACK, _code_bytes(code) + struct.pack(f">{len(seqs)}I", *seqs))
+
+
+def decode_sack_body(body: bytes) -> Tuple[str, Tuple[int, ...]]:
+    """(acking airport, sequence numbers) from a SACK body."""
+    count, rest = divmod(len(body) - 3, _U32.size)
+    if count < 0 or rest:
+        raise FrameError("bad sack body")
+    return _code_str(bytes(body[:3])), struct.unpack_from(f">{count}I", body, 3)
+
+
+def encode_ack(code: str) -> bytes:
+    return encode_frame(ACK, _code_bytes(code))
+
+
+def encode_plan(legs: List[str], payload: str, flight_id: str) -> bytes:
+    """A scheduler plan travels as a flight body that hasn't left the origin yet."""
+    return encode_frame(PLAN, encode_flight_body(flight_id, payload, legs, 0, 0))
+
+
+def encode_lease(code: str, count: int) -> bytes:
+    """LEASE body: how many plans (u16) followed by the airport code."""
+    return encode_frame(LEASE, _U16.pack(count) + _code_bytes(code))
+
+
+def decode_lease(body: bytes) -> Tuple[str, int]:
+    """Return (airport code, plan count) from a LEASE body."""
+    if len(body) != _U16.size + 3:
+        raise FrameError("bad lease body")
+    (count,) = _U16.unpack_from(body)
+    return _code_str(bytes(body[_U16.size :])), count
+
+
+def encode_complete(origin: str, final: str, flight_id: str) -> bytes:
+    return encode_frame(COMPLETE, _code_bytes(origin) + _code_bytes(final) + flight_id.encode("ascii"))
+
+
+def decode_complete_body(body: bytes) -> Tuple[str, str, str]:
+    """(origin, final hop, flight_id) from a COMPLETE body."""
+    if len(body) < 7:
+        raise FrameError("bad complete body")
+    try:
+        flight_id = bytes(body[6:]).decode("ascii")
+    except UnicodeDecodeError as exc:
+        raise FrameError(f"bad complete body: {exc}") from exc
+    return _code_str(bytes(body[:3])), _code_str(bytes(body[3:6])), flight_id
+
+
+def encode_busy(retry_after: float, depth: int) -> bytes:
+    return encode_frame(BUSY, _U32.pack(int(retry_after * 1000)) + _U32.pack(depth))
+
+
+def decode_busy_body(body: bytes) -> PeerBusy:
+    """The PeerBusy a BUSY body stands for (callers raise it)."""
+    if len(body) != 2 * _U32.size:
+        raise FrameError("bad busy body")
+    (millis,) = _U32.unpack_from(body)
+    (depth,) = _U32.unpack_from(body, _U32.size)
+    return PeerBusy(millis / 1000, depth)
+
+
+def busy_text(retry_after: float) -> str:
+    return f"{BUSY_TEXT} {int(retry_after * 1000)}"
+
+
+def parse_busy_text(text: str) -> Optional[PeerBusy]:
+    """PeerBusy if a text reply is a shed notice ("BUSY 250"), else None."""
+    if not text.startswith(BUSY_TEXT + " "):
+        return None
+    try:
+        return PeerBusy(int(text[len(BUSY_TEXT) + 1 :].strip()) / 1000)
+    except ValueError:
+        return None
+
+
+def ack_text(body: bytes) -> str:
+    """Render an ACK frame body the way the text protocol spells it."""
+    return f"ACK from {_code_str(bytes(body))}"
+
+
+def flight_json(flight_id: str, payload: str, legs: List[str], from_idx: int, to_idx: int) -> str:
+    """The original JSON packet, still used for old peers."""
+    return json.dumps(
+        {
+            "flight_id": flight_id,
+            "payload": payload,
+            "legs": legs,
+            "from_idx": from_idx,
+            "to_idx": to_idx,
+        }
+    )
+
+
+def format_plan(legs: List[str], payload: str, flight_id: str) -> str:
+    """Text form of a plan, e.g. 'FLIGHT SEA >> ANC >> OME | Cargo | id:0002'."""
+    return f"FLIGHT {' >> '.join(legs)} | {payload} | id:{flight_id}"
+
+
+class FrameStream:
+    """Reads whole frames off a blocking socket, starting from bytes already received.
+
+    Everything lands in one pooled buffer via recv_into (see buffers.py).
+    read_frame() unpacks the header in place and returns the body as a
+    memoryview into that buffer: decode it (or copy it) before the next
+    read_frame(), which may reuse the space. release() hands the buffer
+    back once the connection is done.
+    """
+
+    def __init__(self, sock: socket.socket, initial: bytes = b"", pool: BufferPool = POOL) -> None:
+        self.sock = sock
+        self.pool = pool
+        self._buf = pool.acquire()
+        if len(initial) > len(self._buf):
+            self._buf = bytearray(len(initial))
+        self._view = memoryview(self._buf)
+        self._start = 0  # first byte not handed out yet
+        self._end = len(initial)  # one past the last byte received
+        self._buf[: self._end] = initial
+
+    def peek(self) -> memoryview:
+        """Whatever is buffered, receiving once first if nothing is. Empty means the peer closed.
+
+        Lets a server sniff the protocol from the first bytes without copying them out.
+        """
+        if self._start == self._end:
+            self._start = self._end = 0
+            self._end = self.sock.recv_into(self._view)
+        return self._view[self._start : self._end]
+
+    def _fill(self, size: int) -> None:
+        """Make sure `size` unread bytes are buffered."""
+        while self._end - self._start < size:
+            if self._start + size > len(self._buf):
+                # not enough room after the unread bytes: slide them to the front, or grow for a big frame
+                pending = self._end - self._start
+                if size > len(self._buf):
+                    grown = bytearray(size)
+                    grown[:pending] = self._view[self._start : self._end]
+                    self._buf, self._view = grown, memoryview(grown)
+                else:
+                    # bytes() because the source overlaps the destination; rare, it only runs on a split frame
+                    self._buf[:pending] = bytes(self._view[self._start : self._end])
+                self._start, self._end = 0, pending
+            count = self.sock.recv_into(self._view[self._end :])
+            if not count:
+                raise ConnectionResetError("peer closed mid-frame")
+            self._end += count
+
+    def read_frame(self) -> Optional[Tuple[int, int, memoryview]]:
+        """Return (version, type, body), or None on a clean close between frames."""
+        if self._start == self._end and not self.peek():
+            return None
+        self._fill(HEADER_SIZE)
+        version, frame_type, length = decode_header_from(self._buf, self._start)
+        self._fill(HEADER_SIZE + length)
+        body_start = self._start + HEADER_SIZE
+        self._start = body_start + length
+        return version, frame_type, self._view[body_start : self._start]
+
+    def send(self, frame: bytes) -> None:
+        self.sock.sendall(frame)
+
+    def release(self) -> None:
+        """Give the buffer back to the pool. Don't touch the stream (or bodies it returned) afterwards."""
+        buf, self._buf = self._buf, bytearray()
+        self._view = memoryview(self._buf)
+        self._start = self._end = 0
+        self.pool.release(buf)
+
+
+async def read_frame_async(reader, prefix: bytearray) -> Optional[Tuple[int, int, bytes]]:
+    """asyncio version of FrameStream.read_frame; prefix holds bytes read earlier and is consumed."""
+
+    async def take(size: int) -> bytes:
+        data = b""
+        if prefix:
+            data = bytes(prefix[:size])
+            del prefix[:size]
+        try:
+            if len(data) < size:
+                data += await reader.readexactly(size - len(data))
+        except asyncio.IncompleteReadError as exc:
+            raise ConnectionResetError("peer closed mid-frame") from exc
+        return data
+
+    if not prefix:
+        first = await reader.read(1)
+        if not first:
+            return None
+        prefix += first
+    version, frame_type, length = decode_header(await take(HEADER_SIZE))
+    body = await take(length) if length else b""
+    return version, frame_type, body
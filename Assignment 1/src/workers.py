@@ -0,0 +1,160 @@
+import queue
+import socket
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from . import wire
+
+# Fixed set of handler threads fed from a bounded queue, for accept loops.
+#
+# Node and Scheduler used to start one thread per accepted connection, so a
+# burst meant thousands of threads (or refused connects once listen(4) filled
+# up). Now the accept loop submit()s each connection instead:
+#   a handler is free   -> it picks the connection up right away
+#   all handlers busy   -> the connection waits in the queue (at most max_wait)
+#   queue full          -> submit() says no and the caller sheds it
+# Shedding means turn_away(): a BUSY reply with a retry-after hint, then close,
+# so the peer backs off for a bit instead of piling on or hanging.
+
+BUSY_RETRY_AFTER = 0.1  # retry hint when the queue just filled up; grows with how deep it is
+BUSY_RETRY_CAP = 5.0  # same ceiling as a node's scheduler backoff
+SHED_READ_TIMEOUT = 0.05  # how long turn_away waits for the peer's first bytes
+
+# (fn, args, when it was queued); None for work that is never handed to on_stale
+Job = Tuple[Callable[..., None], Tuple[Any, ...], Optional[float]]
+
+
+class WorkerPool:
+    """`workers` threads running jobs from a queue that holds at most `queue_size`."""
+
+    def __init__(
+        self,
+        name: str,
+        workers: int,
+        queue_size: int,
+        max_wait: Optional[float] = None,
+        on_stale: Optional[Callable[..., None]] = None,
+        log: Callable[[str], None] = print,
+    ) -> None:
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        # a job that sat in the queue longer than max_wait goes to on_stale (same args) instead
+        self.max_wait = max_wait
+        self.on_stale = on_stale
+        # where a handler that blew up gets reported (the owner's log, so it lands in its log file)
+        self.log = log
+        # queue.Queue(0) would be unbounded; size 0 here means "no waiting, handler or shed"
+        self._jobs: "queue.Queue[Optional[Job]]" = queue.Queue(max(1, self.queue_size))
+        self._threads: List[threading.Thread] = []
+        self._busy = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn: Callable[..., None], *args: Any) -> bool:
+        """Queue fn(*args) for the next free handler. False if the queue is full (or the pool is stopped)."""
+        return self._put((fn, args, time.monotonic()))
+
+    def submit_accepted(self, fn: Callable[..., None], *args: Any) -> bool:
+        """Like submit(), for work the peer was already told we took (a SACKed UDP leg): it runs however
+        long it queued, and is dropped rather than passed to on_stale if the pool stops first."""
+        return self._put((fn, args, None))
+
+    def _put(self, job: Job) -> bool:
+        if self._closed:
+            return False
+        with self._lock:
+            if self.queue_size == 0 and self._busy + self._jobs.qsize() >= self.workers:
+                return False
+        try:
+            self._jobs.put_nowait(job)
+        except queue.Full:
+            return False
+        return True
+
+    def depth(self) -> int:
+        """Connections waiting for a handler."""
+        return self._jobs.qsize()
+
+    def busy(self) -> int:
+        """Handlers in the middle of a job."""
+        return self._busy
+
+    def retry_after(self) -> float:
+        return retry_hint(self.depth(), self.workers)
+
+    def stop(self) -> None:
+        """Stop taking jobs; whatever is still queued goes to on_stale. Running jobs finish on their own."""
+        self._closed = True
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None and job[2] is not None and self.on_stale is not None:
+                self.on_stale(*job[1])
+        for _ in self._threads:
+            try:
+                self._jobs.put_nowait(None)
+            except queue.Full:
+                break  # the rest are daemons blocked in get(); they go down with the process
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None or self._closed:
+                if job is not None and job[2] is not None and self.on_stale is not None:
+                    self.on_stale(*job[1])
+                return
+            fn, args, queued_at = job
+            if queued_at is not None and self.max_wait is not None and self.on_stale is not None and time.monotonic() - queued_at > self.max_wait:
+                fn = self.on_stale  # the peer already waited long enough; tell it to come back later
+            with self._lock:
+                self._busy += 1
+            try:
+                fn(*args)
+            except Exception as exc:  # one bad connection shouldn't take a handler down with it
+                self.log(f"[{self.name}] handler failed: {exc!r}")
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+
+def retry_hint(depth: int, workers: int) -> float:
+    """What to tell a shed peer: longer the deeper the queue is relative to the handlers draining it."""
+    return min(BUSY_RETRY_CAP, BUSY_RETRY_AFTER * (1 + depth / max(1, workers)))
+
+
+def busy_reply(first: bytes, retry_after: float, depth: int) -> bytes:
+    """BUSY in the protocol the peer opened with: a frame, or a text line for JSON/LINK peers."""
+    if not first or wire.is_framed(first):
+        return wire.encode_busy(retry_after, depth)
+    return f"{wire.busy_text(retry_after)}\n".encode("utf-8")
+
+
+def turn_away(conn: socket.socket, retry_after: float, depth: int) -> None:
+    """Shed an accepted connection: BUSY in whatever protocol it opened with, then close.
+
+    The peer's first bytes are read before answering, both to pick frame vs
+    text and so the close doesn't reset the connection under our reply.
+    """
+    with conn:
+        try:
+            conn.settimeout(SHED_READ_TIMEOUT)
+            try:
+                first = conn.recv(4096)
+            except socket.timeout:
+                first = b""
+            conn.sendall(busy_reply(first, retry_after, depth))
+            conn.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass  # it hung up first, nothing to tell it
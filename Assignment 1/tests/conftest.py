@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the code imports itself as src.* / config.* from the "Assignment 1" folder (python -m src.main)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
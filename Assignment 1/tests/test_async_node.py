@@ -0,0 +1,119 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from src import async_node, wire
+from src.async_node import AsyncNode, AsyncRuntime
+from src.logsink import default_sink
+from src.metrics import Registry
+
+
+class FakeScheduler:
+    """v6 scheduler that plans one ANC >> SEA flight and passes COMPLETEs on to the origin, like the real one."""
+
+    def __init__(self):
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        self.sessions = {}
+        self.completes = []
+        self.planned = False
+        self.lock = threading.Lock()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        stream = wire.FrameStream(conn)
+        with conn:
+            try:
+                stream.read_frame()  # HELLO
+                conn.sendall(wire.encode_hello("SCH"))
+                while True:
+                    frame = stream.read_frame()
+                    if frame is None:
+                        return
+                    _, frame_type, body = frame
+                    with self.lock:
+                        if frame_type == wire.LEASE:
+                            code, _ = wire.decode_lease(bytes(body))
+                            self.sessions[code] = conn
+                            if code == "ANC" and not self.planned:
+                                self.planned = True
+                                conn.sendall(wire.encode_plan(["ANC", "SEA"], "hi", "0001"))
+                        elif frame_type == wire.COMPLETE:
+                            origin, final, flight_id = wire.decode_complete_body(bytes(body))
+                            self.completes.append((origin, final, flight_id))
+                            self.sessions[origin].sendall(wire.encode_complete(origin, final, flight_id))
+            except OSError:
+                pass
+
+    def close(self):
+        self.server.close()
+
+
+def free_ports(count):
+    socks = [socket.socket() for _ in range(count)]
+    try:
+        for sock in socks:
+            sock.bind(("127.0.0.1", 0))
+        return [sock.getsockname()[1] for sock in socks]
+    finally:
+        for sock in socks:
+            sock.close()
+
+
+def wait_for(check, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not check() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return check()
+
+
+@pytest.mark.parametrize("transport", ["tcp", "udp"])
+def test_leg_is_acked_and_landing_reported_back_to_the_origin(transport, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # nodes log to ./logs
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(async_node, "SCHEDULER_PORT", scheduler.port)
+    airports = {code: f"127.0.0.1:{port}" for code, port in zip(("ANC", "SEA"), free_ports(2))}
+    registry = Registry()
+    runtime = AsyncRuntime()
+    runtime.start()
+    nodes = [
+        AsyncNode(code, "127.0.0.1", int(airports[code].rsplit(":", 1)[1]), airports, runtime, transport=transport, registry=registry)
+        for code in airports
+    ]
+    anc, sea = nodes
+    try:
+        for node in nodes:
+            node.start_listener()
+            assert node.ready.wait(5.0)
+        sea.start_flying()
+        assert wait_for(lambda: "SEA" in scheduler.sessions)  # SEA's session is where its COMPLETE goes
+        anc.start_flying()
+
+        assert wait_for(lambda: scheduler.completes)
+        assert scheduler.completes == [("ANC", "SEA", "0001")]
+        # ANC got the COMPLETE back and gave the window slot up
+        assert wait_for(lambda: len(anc.window) == 0 and scheduler.planned)
+        assert registry.value("node_legs_total", airport="ANC", kind="sent") == 1
+        assert sum(anc._ack_latency.snapshot()[0]) == 1  # observed once SEA's ACK was in
+        assert registry.value("node_connect_failures_total", airport="ANC") == 0
+        assert registry.value("node_legs_total", airport="SEA", kind="received") == 1
+        assert registry.value("node_completions_reported_total", airport="SEA") == 1
+        assert registry.value("node_flights_unconfirmed_total", airport="ANC") == 0
+        if transport == "tcp":
+            assert anc.async_pool.stats()["open"] == 1  # the leg went over a pooled link, ACK and all
+    finally:
+        for node in nodes:
+            node.stop()
+        runtime.stop()
+        scheduler.close()
+        default_sink().close()  # write the log lines out before the chdir is undone
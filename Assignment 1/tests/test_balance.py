@@ -0,0 +1,118 @@
+import random
+from collections import Counter
+from itertools import accumulate
+
+import pytest
+
+from src.balance import SCALE, Fenwick, LoadBalancer, balance_mode, weight
+
+
+def expected_index(weights, target):
+    """Brute force for Fenwick.find: first index whose running total passes target."""
+    for i, running in enumerate(accumulate(weights)):
+        if target < running:
+            return i
+    raise AssertionError("target past the total")
+
+
+def check(tree, weights):
+    assert tree.total() == sum(weights)
+    running = 0
+    for i, w in enumerate(weights):
+        if w:
+            # both ends of every slice land on that index
+            assert tree.find(running) == i
+            assert tree.find(running + w - 1) == i
+        running += w
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 7, 8, 9, 64, 100])
+def test_fenwick_build_matches_prefix_sums(n):
+    rng = random.Random(n)
+    weights = [rng.randrange(0, 50) for _ in range(n)]
+    weights[0] = weights[0] or 1
+    check(Fenwick(weights), weights)
+
+
+def test_fenwick_updates_keep_prefix_sums():
+    rng = random.Random(1)
+    weights = [rng.randrange(1, 20) for _ in range(37)]
+    tree = Fenwick(weights)
+    for _ in range(500):
+        i = rng.randrange(len(weights))
+        weights[i] = rng.randrange(0, 30)
+        tree.set(i, weights[i])
+        if sum(weights):
+            check(tree, weights)
+            target = rng.randrange(tree.total())
+            assert tree.find(target) == expected_index(weights, target)
+
+
+def test_fenwick_sample_follows_weights():
+    tree = Fenwick([1, 0, 3])
+    rng = random.Random(7)
+    picks = Counter(tree.sample(rng) for _ in range(4000))
+    assert picks[1] == 0
+    assert 2.5 < picks[2] / picks[0] < 3.5
+
+
+def test_weight_falls_off_with_load():
+    assert weight(0) == SCALE
+    assert weight(1) == SCALE // 4
+    assert weight(10**6) >= 1
+    assert all(weight(n) > weight(n + 1) for n in range(100))
+
+
+def balancer():
+    # FAI/BRW lay over at ANC, OME at ANC or SEA, hubs fly direct
+    layovers = {"FAI": ("ANC",), "BRW": ("ANC",), "OME": ("ANC", "SEA"), "JNU": ("SEA",)}
+    return LoadBalancer(["ANC", "SEA", "FAI", "BRW", "OME", "JNU"], layovers)
+
+
+def test_pick_never_returns_the_origin_and_uses_real_hubs():
+    lb = balancer()
+    rng = random.Random(3)
+    for _ in range(2000):
+        destination, hub = lb.pick("FAI", rng)
+        assert destination != "FAI"
+        if destination in ("ANC", "SEA"):
+            assert hub is None
+        elif destination == "OME":
+            assert hub in ("ANC", "SEA")
+        else:
+            assert hub == ("SEA" if destination == "JNU" else "ANC")
+
+
+def test_pick_steers_away_from_a_loaded_hub():
+    lb = balancer()
+    rng = random.Random(5)
+    for _ in range(3):
+        lb.flying(["FAI", "ANC", "BRW"])
+    assert lb.load("ANC") == 3 and lb.load("BRW") == 3
+    hubs = Counter(hub for destination, hub in (lb.pick("SEA", rng) for _ in range(4000)) if destination == "OME")
+    assert hubs["SEA"] > 5 * hubs["ANC"]
+    assert lb.pick_layover(("ANC", "SEA"), rng) in ("ANC", "SEA")
+
+
+def test_landing_undoes_flying():
+    lb = balancer()
+    before = lb._top.total()
+    legs = ["FAI", "ANC", "OME"]
+    lb.flying(legs)
+    assert lb._top.total() < before
+    lb.landed(legs)
+    lb.landed(legs)  # settling twice never takes a load below zero
+    assert lb.snapshot() == {}
+    assert lb._top.total() == before
+
+
+def test_nowhere_to_go():
+    lb = LoadBalancer(["ANC"], {})
+    assert lb.pick("ANC", random.Random(0)) is None
+    assert LoadBalancer(["ANC", "SEA"], {}).pick("ANC", random.Random(0)) == ("SEA", None)
+
+
+def test_balance_mode_only_applies_to_source_routing():
+    assert balance_mode("load", "source") == "load"
+    assert balance_mode("load", "table") == "uniform"
+    assert balance_mode("uniform", "table") == "uniform"
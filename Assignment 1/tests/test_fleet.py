@@ -0,0 +1,52 @@
+import gc
+import socket
+import time
+import weakref
+
+import pytest
+
+from src.fleet import Fleet
+from src.logsink import default_sink
+from src.metrics import Registry
+
+
+def free_ports(count):
+    socks = [socket.socket() for _ in range(count)]
+    try:
+        for sock in socks:
+            sock.bind(("127.0.0.1", 0))
+        return [sock.getsockname()[1] for sock in socks]
+    finally:
+        for sock in socks:
+            sock.close()
+
+
+@pytest.mark.parametrize("engine", ["threaded", "async"])
+def test_pruned_airports_stop_being_scraped(engine, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # nodes log to ./logs
+    airports = {code: f"127.0.0.1:{port}" for code, port in zip(("ANC", "SEA", "FAI"), free_ports(3))}
+    registry = Registry()
+    fleet = Fleet(airports, ["ANC"], {"SEA": ["ANC"], "FAI": ["ANC"]}, engine=engine, transport="udp", registry=registry)
+    try:
+        fleet.start(fly=False)
+        for code in airports:
+            assert registry.value("node_pool_links_open", airport=code) == 0
+            assert registry.value("node_udp_unacked", airport=code) == 0
+        gone = weakref.ref(fleet.nodes["FAI"])
+
+        assert fleet.prune(["ANC", "SEA"]) == ["FAI"]
+        rendered = registry.render()
+        assert 'airport="SEA"' in rendered
+        for name in ("node_pool_links_open", "node_flights_in_air", "node_accept_queue_depth", "node_udp_unacked"):
+            assert f'{name}{{airport="FAI"}}' not in rendered
+            assert registry.value(name, airport="FAI") is None
+
+        # nothing in the registry holds the stopped node any more
+        deadline = time.monotonic() + 5.0
+        while gone() is not None and time.monotonic() < deadline:
+            gc.collect()
+            time.sleep(0.05)
+        assert gone() is None
+    finally:
+        fleet.stop()
+        default_sink().close()  # write the log lines out before the chdir is undone
@@ -0,0 +1,122 @@
+import json
+import os
+
+from src.flighttrace import SPAN_GAP, TraceIndex, describe, hop_latencies, record, split_runs
+
+MS = 1_000_000  # trace times are ns
+
+
+def one_run(t, origin, via, dest):
+    """(file, line) pairs for flight 0042 going origin -> via -> dest, starting at t ms."""
+    at = lambda code: f"{code.lower()}.trace.jsonl"
+    return [
+        (at(origin), record(t * MS, "0042", origin, "plan", origin, route=[origin, via, dest])),
+        (at(origin), record((t + 1) * MS, "0042", origin, "depart", origin, 1, to=via)),
+        (at(via), record((t + 3) * MS, "0042", origin, "arrive", via, 1, **{"from": origin})),
+        (at(origin), record((t + 4) * MS, "0042", origin, "ack", origin, 1, to=via)),
+        (at(via), record((t + 5) * MS, "0042", origin, "depart", via, 2, to=dest)),
+        (at(dest), record((t + 12) * MS, "0042", origin, "arrive", dest, 2, **{"from": via})),
+        (at(dest), record((t + 12) * MS, "0042", origin, "land", dest, 2)),
+        (at(origin), record((t + 20) * MS, "0042", origin, "confirm", origin, final=dest)),
+    ]
+
+
+def filler(code, count, t=0):
+    """Other flights' records at one airport."""
+    return [(f"{code.lower()}.trace.jsonl", record(t + n, f"{n % 7:04d}", code, "arrive", code, 1, **{"from": "XXX"}))
+            for n in range(count)]
+
+
+def write(folder, lines, mode="a"):
+    files = {}
+    for name, line in lines:
+        files.setdefault(name, []).append(line)
+    for name, chunk in files.items():
+        with open(folder / name, mode, encoding="utf-8") as fh:
+            fh.write("".join(chunk))
+
+
+def where(events):
+    return [(e["at"], e["event"]) for e in events]
+
+
+def test_split_runs_and_hop_latencies():
+    lines = one_run(0, "SEA", "ANC", "OME") + one_run(50, "FAI", "ANC", "OME") + one_run(100, "SEA", "ANC", "BRW")
+    events = sorted((json.loads(line) for _, line in lines), key=lambda e: e["t"])
+    runs = split_runs(events)
+    assert [(run[0]["origin"], run[0]["event"], run[0]["t"] // MS, len(run)) for run in runs] == [
+        ("SEA", "plan", 0, 8), ("FAI", "plan", 50, 8), ("SEA", "plan", 100, 8)
+    ]
+    assert hop_latencies(runs[-1]) == [
+        {"hop": 1, "from": "SEA", "to": "ANC", "ms": 2.0, "ack_ms": 3.0},
+        {"hop": 2, "from": "ANC", "to": "BRW", "ms": 7.0, "ack_ms": None},
+    ]
+    summary = describe(runs[-1])
+    assert summary["status"] == "landed at BRW"
+    assert (summary["end_to_end_ms"], summary["confirmed_ms"]) == (12.0, 20.0)
+
+
+def test_index_follows_rotation_and_truncation(tmp_path):
+    write(tmp_path, filler("SEA", 50) + one_run(0, "SEA", "ANC", "OME") + filler("ANC", 50))
+    index = TraceIndex(tmp_path)
+    try:
+        assert index.update() == (3, 108)
+        assert where(index.events("0042")) == [
+            ("SEA", "plan"), ("SEA", "depart"), ("ANC", "arrive"), ("SEA", "ack"),
+            ("ANC", "depart"), ("OME", "arrive"), ("OME", "land"), ("SEA", "confirm"),
+        ]
+        assert index.update() == (0, 0)  # nothing new, nothing rescanned
+
+        # sea's log rotates, the id wraps and SEA flies 0042 again, through BRW this time
+        os.rename(tmp_path / "sea.trace.jsonl", tmp_path / "sea.trace.jsonl.1")
+        write(tmp_path, one_run(1000, "SEA", "BRW", "OME"))
+        partial = record(1030 * MS, "0042", "SEA", "drop", "OME", reason="test")
+        with open(tmp_path / "ome.trace.jsonl", "a", encoding="utf-8") as fh:
+            fh.write(partial[:20])  # a line still being written
+        # new sea file, brw, and the rest of ome; the renamed .1 keeps its rows and isn't rescanned
+        assert index.update() == (3, 8)
+        names = {name for (name,) in index.db.execute("SELECT name FROM files")}
+        assert names == {"sea.trace.jsonl", "sea.trace.jsonl.1", "anc.trace.jsonl", "ome.trace.jsonl", "brw.trace.jsonl"}
+
+        runs = split_runs(index.events("0042"))
+        assert [describe(run)["route"] for run in runs] == [["SEA", "ANC", "OME"], ["SEA", "BRW", "OME"]]
+        assert [(h["from"], h["to"], h["ms"], h["ack_ms"]) for h in describe(runs[1])["hops"]] == [
+            ("SEA", "BRW", 2.0, 3.0), ("BRW", "OME", 7.0, None)
+        ]
+
+        # the half-written line gets picked up once it's finished
+        with open(tmp_path / "ome.trace.jsonl", "a", encoding="utf-8") as fh:
+            fh.write(partial[20:])
+        assert index.update() == (1, 1)
+        assert index.events("0042")[-1]["event"] == "drop"
+
+        # anc's log is truncated and started over: its old records leave the index
+        write(tmp_path, filler("ANC", 3, t=5000 * MS), mode="w")
+        index.update()
+        assert ("ANC", "arrive") not in where(index.events("0042"))
+        assert [e["t"] for e in index.events("0000") if e["at"] == "ANC"] == [5000 * MS]
+
+        # the rotated file is deleted: its rows go with it, so the first flight starts at OME now
+        os.remove(tmp_path / "sea.trace.jsonl.1")
+        index.update()
+        first, second = split_runs(index.events("0042"))
+        assert where(first) == [("OME", "arrive"), ("OME", "land")]
+        assert second[0]["event"] == "plan" and len(second) == 9
+    finally:
+        index.close()
+
+
+def test_records_far_apart_get_their_own_span(tmp_path):
+    lines = [("sea.trace.jsonl", record(1, "0042", "SEA", "plan", "SEA"))]
+    lines += filler("SEA", SPAN_GAP // 60 + 10, t=10)  # well past SPAN_GAP bytes of other flights
+    lines += [("sea.trace.jsonl", record(2 * MS, "0042", "SEA", "depart", "SEA", 1, to="ANC")),
+              ("sea.trace.jsonl", record(3 * MS, "0042", "SEA", "ack", "SEA", 1, to="ANC"))]
+    write(tmp_path, lines)
+    index = TraceIndex(tmp_path)
+    try:
+        index.update()
+        spans = index.db.execute("SELECT records FROM spans WHERE flight = '0042' ORDER BY first").fetchall()
+        assert spans == [(1,), (2,)]  # the two close together share one row
+        assert [e["event"] for e in index.events("0042")] == ["plan", "depart", "ack"]
+    finally:
+        index.close()
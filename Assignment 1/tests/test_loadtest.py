@@ -0,0 +1,23 @@
+import socket
+
+from scripts.loadtest import _parse_args, run
+
+
+def free_port():
+    # the generated network numbers its airports up from here
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_probe_flights_come_home():
+    args = _parse_args([
+        "--airports", "6", "--hubs", "2", "--rate", "20", "--duration", "1", "--drain", "5",
+        "--base-port", str(free_port()), "--startup-timeout", "20",
+    ])
+    result = run(args)
+    assert result["sent"] > 0 and result["failed"] == 0
+    assert result["completed"] > 0
+    # CPU is over the drive + drain window, so a sane percentage even for a short run
+    for usage in result["cpu"].values():
+        assert usage is None or 0 <= usage["cpu_pct"] < 100 * 64
@@ -0,0 +1,59 @@
+from src.logsink import LogSink
+
+
+def write_lines(sink, path, lines):
+    # close() after each line so every line is its own batch and rotation is deterministic
+    for line in lines:
+        sink.write(path, line)
+        sink.close()
+
+
+def test_lines_land_in_order_per_file(tmp_path):
+    sink = LogSink(flush_interval=0.01, mirror_stdout=False)
+    anc, sea = tmp_path / "logs" / "anc.log", tmp_path / "logs" / "sea.log"
+    for idx in range(100):
+        sink.write(anc, f"anc {idx}\n")
+        sink.write(sea, f"sea {idx}\n")
+    sink.close()
+    assert anc.read_text().splitlines() == [f"anc {idx}" for idx in range(100)]
+    assert sea.read_text().splitlines() == [f"sea {idx}" for idx in range(100)]
+
+
+def test_rotation_shifts_backups_and_drops_the_oldest(tmp_path):
+    sink = LogSink(flush_interval=0.0, max_bytes=20, backups=2, mirror_stdout=False)
+    path = tmp_path / "anc.log"
+    write_lines(sink, path, [f"line {idx:03d}\n" for idx in range(8)])  # 9 bytes each, 2 per file
+    assert path.read_text() == "line 006\nline 007\n"
+    assert (tmp_path / "anc.log.1").read_text() == "line 004\nline 005\n"
+    assert (tmp_path / "anc.log.2").read_text() == "line 002\nline 003\n"
+    assert not (tmp_path / "anc.log.3").exists()
+
+
+def test_no_backups_just_truncates(tmp_path):
+    sink = LogSink(flush_interval=0.0, max_bytes=20, backups=0, mirror_stdout=False)
+    path = tmp_path / "anc.log"
+    write_lines(sink, path, [f"line {idx:03d}\n" for idx in range(5)])
+    assert path.read_text() == "line 004\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["anc.log"]
+
+
+def test_rotation_counts_what_was_already_on_disk(tmp_path):
+    path = tmp_path / "anc.log"
+    path.write_text("x" * 15)
+    sink = LogSink(flush_interval=0.0, max_bytes=20, backups=1, mirror_stdout=False)
+    write_lines(sink, path, ["line 000\n"])
+    assert path.read_text() == "line 000\n"
+    assert (tmp_path / "anc.log.1").read_text() == "x" * 15
+
+
+def test_echo_goes_to_stdout_only_when_mirroring(tmp_path, capsys):
+    path = tmp_path / "anc.log"
+    quiet = LogSink(flush_interval=0.0, mirror_stdout=False)
+    quiet.write(path, "to file\n", echo="to screen")
+    quiet.close()
+    assert capsys.readouterr().out == ""
+    loud = LogSink(flush_interval=0.0)
+    loud.write(None, "", echo="screen only")
+    loud.close()
+    assert capsys.readouterr().out == "screen only\n"
+    assert path.read_text() == "to file\n"
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from src.metrics import Counter, Gauge, Histogram, Registry
+
+
+def in_threads(count, fn):
+    threads = [threading.Thread(target=fn) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_counter_sums_every_threads_cell():
+    counter = Counter()
+    in_threads(8, lambda: [counter.inc() for _ in range(10000)])
+    counter.inc(5)
+    assert counter.value == 80005
+    assert len(counter._cells) >= 2  # one per thread that recorded, not one shared cell
+
+
+def test_gauge_goes_both_ways_across_threads():
+    gauge = Gauge()
+    in_threads(4, lambda: [gauge.inc(2) for _ in range(1000)])
+    in_threads(4, lambda: [gauge.dec() for _ in range(1000)])
+    assert gauge.value == 4000
+    gauge.set(7)
+    assert gauge.value == 7
+
+
+def test_histogram_buckets_and_sum_across_threads():
+    hist = Histogram((0.1, 1.0))
+    in_threads(4, lambda: [hist.observe(v) for v in (0.05, 0.1, 0.5, 2.0)])
+    counts, total = hist.snapshot()
+    # le=0.1 (0.05 and 0.1), le=1.0 (0.5), +Inf (2.0)
+    assert counts == [8, 4, 4]
+    assert total == pytest.approx(4 * 2.65)
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    registry.counter("legs_total", "Legs.", airport="ANC", kind="sent").inc(3)
+    registry.gauge_fn("in_air", "In the air.", lambda: 2.5, airport="SEA")
+    hist = registry.histogram("ack_seconds", "ACK latency.", (0.01, 0.1), airport="ANC")
+    for value in (0.005, 0.05, 0.05, 3.0):
+        hist.observe(value)
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP ack_seconds ACK latency.", "# TYPE ack_seconds histogram"]
+    assert 'ack_seconds_bucket{airport="ANC",le="0.01"} 1' in lines
+    assert 'ack_seconds_bucket{airport="ANC",le="0.1"} 3' in lines  # buckets are cumulative
+    assert 'ack_seconds_bucket{airport="ANC",le="+Inf"} 4' in lines
+    assert 'ack_seconds_count{airport="ANC"} 4' in lines
+    assert 'ack_seconds_sum{airport="ANC"} 3.105' in lines
+    assert 'in_air{airport="SEA"} 2.5' in lines
+    assert 'legs_total{airport="ANC",kind="sent"} 3' in lines
+    assert "# TYPE legs_total counter" in lines
+
+
+def test_same_labels_same_child_and_kinds_dont_mix():
+    registry = Registry()
+    assert registry.counter("x", "X.", a="1") is registry.counter("x", "X.", a="1")
+    assert registry.counter("x", "X.", a="1") is not registry.counter("x", "X.", a="2")
+    with pytest.raises(ValueError):
+        registry.gauge("x", "X.")
+
+
+def test_remove_and_broken_callbacks():
+    registry = Registry()
+    registry.gauge_fn("hub_load", "Load.", lambda: 1, hub="ANC")
+    registry.gauge_fn("hub_load", "Load.", lambda: 1 / 0, hub="SEA")
+    rendered = registry.render()
+    assert 'hub_load{hub="ANC"} 1' in rendered and "SEA" not in rendered
+    assert registry.remove("hub_load", hub="ANC")
+    assert not registry.remove("hub_load", hub="ANC")
+    assert registry.value("hub_load", hub="ANC") is None
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter("odd", "Odd.", host='a"b\\c').inc()
+    assert 'odd{host="a\\"b\\\\c"} 1' in registry.render()
@@ -0,0 +1,37 @@
+import threading
+
+from src import wire
+from src.logsink import default_sink
+from src.metrics import Registry
+from src.node import Node
+
+FLIGHT = {"flight_id": "0001", "payload": "hi", "legs": ["ANC", "SEA", "FAI"], "from_idx": 0, "to_idx": 1}
+
+
+def test_udp_arrivals_are_forwarded_off_the_receive_thread(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # nodes log to ./logs
+    node = Node("SEA", "127.0.0.1", 0, {}, registry=Registry())
+    release = threading.Event()
+    forwarded = []
+    done = threading.Event()
+
+    def slow_forward(flight):
+        release.wait(5.0)  # a TCP next hop taking its time
+        forwarded.append((flight["flight_id"], threading.current_thread().name))
+        done.set()
+
+    node._after_arrival = slow_forward
+    node.arrivals.start()
+    try:
+        frame_type, body = wire.decode_packet(wire.flight_frame(FLIGHT))
+        node._on_datagrams([(frame_type, body, ("127.0.0.1", 1))])
+        # back already, so the transport can SACK whatever comes next
+        assert forwarded == []
+        release.set()
+        assert done.wait(2.0)
+        assert forwarded[0][0] == "0001"
+        assert forwarded[0][1].startswith("SEA-arrivals")
+    finally:
+        release.set()
+        node.stop()
+        default_sink().close()  # write the log lines out before the chdir is undone
@@ -0,0 +1,122 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from src import wire
+from src.pool import AsyncConnectionPool, ConnectionPool
+
+FLIGHT = {"flight_id": "0001", "payload": "hi", "legs": ["ANC", "SEA"], "from_idx": 0, "to_idx": 1}
+
+
+class FakePeer:
+    """Framed peer on localhost that answers each FLIGHT with the next scripted reply ("ack" or "busy")."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.hold = threading.Event()
+        self.hold.set()
+        self.got_flight = threading.Event()
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.addr = self.server.getsockname()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        stream = wire.FrameStream(conn)
+        with conn:
+            try:
+                stream.read_frame()  # HELLO
+                conn.sendall(wire.encode_hello("SEA"))
+                while stream.read_frame() is not None:
+                    self.got_flight.set()
+                    self.hold.wait(5.0)
+                    if self.replies.pop(0) == "busy":
+                        conn.sendall(wire.encode_busy(0.25, 3))
+                    else:
+                        conn.sendall(wire.encode_ack("SEA"))
+            except OSError:
+                pass
+
+    def close(self):
+        self.server.close()
+
+
+@pytest.fixture
+def peer_factory():
+    peers = []
+
+    def make(replies):
+        peer = FakePeer(replies)
+        peers.append(peer)
+        return peer
+
+    yield make
+    for peer in peers:
+        peer.close()
+
+
+def test_links_are_reused(peer_factory):
+    peer = peer_factory(["ack", "ack", "ack"])
+    pool = ConnectionPool("ANC")
+    for _ in range(3):
+        assert pool.send(peer.addr, FLIGHT).startswith("ACK")
+    assert pool.stats() == {"peers": 1, "open": 1, "idle": 1}
+    pool.close()
+    assert pool.stats()["open"] == 0
+
+
+def test_busy_reply_keeps_the_link_checked_in(peer_factory):
+    peer = peer_factory(["busy", "ack"])
+    pool = ConnectionPool("ANC", max_per_peer=1)
+    with pytest.raises(wire.PeerBusy) as info:
+        pool.send(peer.addr, FLIGHT)
+    assert (info.value.retry_after, info.value.depth) == (0.25, 3)
+    # the link went back to the pool, so with one link per peer this doesn't block forever
+    assert pool.stats() == {"peers": 1, "open": 1, "idle": 1}
+    assert pool.send(peer.addr, FLIGHT).startswith("ACK")
+    pool.close()
+
+
+def test_close_also_closes_links_that_were_busy(peer_factory):
+    peer = peer_factory(["ack"])
+    peer.hold.clear()
+    pool = ConnectionPool("ANC")
+    replies = []
+    sender = threading.Thread(target=lambda: replies.append(pool.send(peer.addr, FLIGHT)))
+    sender.start()
+    assert peer.got_flight.wait(5.0)
+    pool.close()
+    assert pool.stats() == {"peers": 1, "open": 1, "idle": 0}
+    peer.hold.set()
+    sender.join(5.0)
+    assert replies and replies[0].startswith("ACK")
+    assert pool.stats() == {"peers": 1, "open": 0, "idle": 0}
+
+
+def test_async_pool_busy_and_close(peer_factory):
+    peer = peer_factory(["busy", "ack", "ack"])
+
+    async def run():
+        pool = AsyncConnectionPool("ANC", max_per_peer=1)
+        with pytest.raises(wire.PeerBusy):
+            await pool.send(peer.addr, FLIGHT)
+        assert pool.stats()["idle"] == 1
+        peer.hold.clear()
+        peer.got_flight.clear()
+        in_flight = asyncio.ensure_future(pool.send(peer.addr, FLIGHT))
+        await asyncio.get_running_loop().run_in_executor(None, peer.got_flight.wait, 5.0)
+        await pool.close()
+        peer.hold.set()
+        assert (await in_flight).startswith("ACK")
+        return pool.stats()
+
+    assert asyncio.run(run()) == {"peers": 1, "open": 0, "idle": 0}
@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+from config.generate import generate_topology
+from src.routing import RoutingTable, config_links
+
+HUBS = ["ANC", "SEA"]
+DEFAULT_HUB = {"FAI": ["ANC"], "BRW": ["ANC"], "OME": ["ANC", "SEA"], "JNU": ["SEA"], "ANC": ["SEA"], "SEA": ["ANC"]}
+AIRPORTS = ["ANC", "SEA", "FAI", "BRW", "OME", "JNU"]
+
+
+def fresh(table):
+    """Full Dijkstra from scratch over whatever links table has now."""
+    return RoutingTable(list(table._graph), [], {}, weights=table.links())
+
+
+def path_cost(links, path):
+    return sum(links[(a, b) if a <= b else (b, a)] for a, b in zip(path, path[1:]))
+
+
+def assert_same_routes(table, exact=True):
+    reference = fresh(table)
+    links = table.links()
+    for source in table._graph:
+        for dest in table._graph:
+            assert table.distance(source, dest) == pytest.approx(reference.distance(source, dest))
+            path = table.path(source, dest)
+            if reference.distance(source, dest) == float("inf"):
+                assert path == [] and table.next_hop(source, dest) is None
+                continue
+            assert path[0] == source and path[-1] == dest
+            assert path_cost(links, path) == pytest.approx(reference.distance(source, dest))
+            if exact:
+                assert table.next_hop(source, dest) == reference.next_hop(source, dest)
+
+
+def test_config_links():
+    links = config_links(HUBS, DEFAULT_HUB)
+    assert links[("ANC", "SEA")] == 1.0
+    assert ("ANC", "OME") in links and ("OME", "SEA") in links
+    assert not any(a == b for a, b in links)
+
+
+def test_hub_and_spoke_paths():
+    table = RoutingTable(AIRPORTS, HUBS, DEFAULT_HUB)
+    assert table.path("FAI", "BRW") == ["FAI", "ANC", "BRW"]
+    assert table.path("FAI", "JNU") == ["FAI", "ANC", "SEA", "JNU"]
+    assert table.next_hop("FAI", "FAI") is None
+    assert table.path("FAI", "FAI") == ["FAI"]
+
+
+def test_set_link_matches_full_recompute():
+    # distinct random weights, so there are no ties and next hops must agree exactly
+    rng = random.Random(11)
+    airports, hubs, default_hub = generate_topology(30, 4, 0, seed=2)
+    table = RoutingTable(airports, hubs, default_hub)
+    codes = list(airports)
+    for _ in range(80):
+        a, b = rng.sample(codes, 2)
+        roll = rng.random()
+        if roll < 0.2:
+            existing = list(table.links())
+            a, b = existing[rng.randrange(len(existing))]
+            recomputed = table.set_link(a, b, None)
+        else:
+            recomputed = table.set_link(a, b, round(rng.uniform(0.5, 5.0), 6) + rng.random() * 1e-6)
+        assert 0 <= recomputed <= len(table._graph)
+        assert_same_routes(table)
+
+
+def test_set_link_with_ties_still_gives_shortest_paths():
+    table = RoutingTable(AIRPORTS, HUBS, DEFAULT_HUB)
+    table.set_link("FAI", "OME", 1.0)  # now FAI -> OME direct
+    assert table.path("FAI", "OME") == ["FAI", "OME"]
+    table.set_link("ANC", "SEA", None)  # hubs cut apart: JNU only through OME
+    assert table.path("FAI", "JNU") == ["FAI", "OME", "SEA", "JNU"]
+    table.set_link("OME", "SEA", None)
+    table.set_link("OME", "ANC", None)
+    assert table.path("FAI", "JNU") == []
+    assert_same_routes(table, exact=False)
+
+
+def test_unchanged_link_recomputes_nothing():
+    table = RoutingTable(AIRPORTS, HUBS, DEFAULT_HUB)
+    assert table.set_link("FAI", "ANC", 1.0) == 0
+
+
+def test_sync_to_reloaded_routes():
+    table = RoutingTable(AIRPORTS, HUBS, DEFAULT_HUB)
+    moved = dict(DEFAULT_HUB, FAI=["SEA"])
+    assert table.sync(HUBS, moved) == 2  # FAI-SEA added, FAI-ANC removed
+    assert table.path("FAI", "BRW") == ["FAI", "SEA", "ANC", "BRW"]
+    assert table.links() == config_links(HUBS, moved)
+    assert_same_routes(table, exact=False)
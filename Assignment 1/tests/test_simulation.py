@@ -0,0 +1,31 @@
+import random
+import threading
+
+from src.metrics import REGISTRY
+from src.simulation import Simulation, generated_topology
+
+
+def make_sim(seed, **options):
+    airports, hubs, default_hub = generated_topology(30, 3, seed=1)
+    return Simulation(airports, hubs, default_hub, seed=seed, log_dir=None, **options)
+
+
+def strip_wall(report):
+    return {key: value for key, value in report.items() if key not in ("wall_seconds", "speedup")}
+
+
+def test_same_seed_same_run():
+    first = strip_wall(make_sim(7).run(5.0))
+    assert first["flights"]["landed"] > 0
+    assert strip_wall(make_sim(7).run(5.0)) == first
+
+
+def test_leaves_the_process_alone():
+    random.seed(123)
+    rng_before = random.getstate()
+    metrics_before = REGISTRY.render()
+    threads_before = threading.active_count()
+    make_sim(3, routing="table").run(2.0)
+    assert random.getstate() == rng_before
+    assert REGISTRY.render() == metrics_before
+    assert threading.active_count() == threads_before
@@ -0,0 +1,125 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from src import wire
+from src.metrics import Registry
+from src.udp import UdpTransport
+
+FLIGHT = {"flight_id": "0001", "payload": "hi", "legs": ["ANC", "SEA"], "from_idx": 0, "to_idx": 1}
+
+
+def raw_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2.0)
+    return sock
+
+
+def unthreaded(deliver):
+    """A receiving transport whose socket is bound but has no receive loop, so a test decides when it drains."""
+    transport = UdpTransport("SEA", "127.0.0.1", 0, deliver, registry=Registry())
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.setblocking(False)
+    transport.sock, transport._self_addr = sock, sock.getsockname()
+    return transport
+
+
+def read_sack(sock):
+    frame_type, body = wire.decode_packet(sock.recv(65536))
+    assert frame_type == wire.SACK
+    return wire.decode_sack_body(body)
+
+
+def read_datagram_seq(sock):
+    frame_type, body = wire.decode_packet(sock.recv(65536))
+    assert frame_type == wire.DATAGRAM
+    return wire.decode_datagram_body(body)[0]
+
+
+@pytest.fixture
+def cleanup():
+    things = []
+    yield things.append
+    for thing in things:
+        thing.close()
+
+
+def test_one_sack_per_sender_per_burst_and_duplicates_delivered_once(cleanup):
+    delivered = []
+    receiver = unthreaded(delivered.extend)
+    cleanup(receiver)
+    sender = raw_socket()
+    cleanup(sender)
+    frame = wire.flight_frame(FLIGHT)
+    for seq in (7, 8, 9, 8):  # 8 again: a resend whose SACK got lost
+        sender.sendto(wire.encode_datagram(seq, frame), receiver._self_addr)
+    time.sleep(0.05)
+    receiver._drain(receiver.sock)
+
+    assert read_sack(sender) == ("SEA", (7, 8, 9, 8))  # the resend is ACKed again
+    sender.settimeout(0.1)
+    with pytest.raises(socket.timeout):
+        sender.recv(65536)  # ...all in that one SACK
+    assert len(delivered) == 3
+    assert all(wire.decode_flight_frame(kind, body)["flight_id"] == "0001" for kind, body, _ in delivered)
+    assert {addr for _, _, addr in delivered} == {sender.getsockname()}
+
+    # a later resend is still recognised
+    sender.sendto(wire.encode_datagram(9, frame), receiver._self_addr)
+    time.sleep(0.05)
+    receiver._drain(receiver.sock)
+    assert read_sack(sender) == ("SEA", (9,))
+    assert len(delivered) == 3
+    assert receiver.registry.value("node_udp_datagrams_total", airport="SEA", kind="duplicate") == 2
+
+
+def test_only_the_unacked_leg_is_resent(cleanup):
+    acks = []
+    sender = UdpTransport("ANC", "127.0.0.1", 0, lambda arrivals: None, registry=Registry())
+    sender.open()
+    cleanup(sender)
+    peer = raw_socket()
+    cleanup(peer)
+    for _ in range(3):
+        sender.send(peer.getsockname(), wire.flight_frame(FLIGHT), lambda ack, exc: acks.append((ack, exc)))
+    first, second, third = (read_datagram_seq(peer) for _ in range(3))
+    peer.sendto(wire.encode_sack("SEA", [first, third]), sender._self_addr)
+
+    assert read_datagram_seq(peer) == second  # selective: just the one that wasn't ACKed
+    peer.sendto(wire.encode_sack("SEA", [second]), sender._self_addr)
+    deadline = time.monotonic() + 2.0
+    while len(acks) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert acks == [("ACK from SEA", None)] * 3
+    assert sender.unacked() == 0
+    assert sender.registry.value("node_udp_datagrams_total", airport="ANC", kind="resent") >= 1
+
+
+def test_gives_up_after_max_tries(cleanup):
+    sender = UdpTransport("ANC", "127.0.0.1", 0, lambda arrivals: None, max_tries=2, registry=Registry())
+    sender.open()
+    cleanup(sender)
+    silent = raw_socket()
+    cleanup(silent)
+    with pytest.raises(TimeoutError, match="after 2 tries"):
+        sender.send_wait(silent.getsockname(), wire.flight_frame(FLIGHT), timeout=5.0)
+    original, resend = read_datagram_seq(silent), read_datagram_seq(silent)
+    assert original == resend
+    assert sender.registry.value("node_udp_legs_failed_total", airport="ANC") == 1
+
+
+def test_two_transports_end_to_end(cleanup):
+    arrived = threading.Event()
+    got = []
+    receiver = UdpTransport("SEA", "127.0.0.1", 0, lambda arrivals: (got.extend(arrivals), arrived.set()), registry=Registry())
+    sender = UdpTransport("ANC", "127.0.0.1", 0, lambda arrivals: None, registry=Registry())
+    for transport in (receiver, sender):
+        transport.open()
+        cleanup(transport)
+    assert sender.send_wait(receiver._self_addr, wire.flight_frame(FLIGHT)) == "ACK from SEA"
+    assert arrived.wait(2.0)
+    assert wire.decode_flight_frame(got[0][0], got[0][1])["legs"] == ["ANC", "SEA"]
@@ -0,0 +1,101 @@
+import threading
+import time
+
+from src.window import FlightWindow
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_slots_go_reserved_then_flying_then_free():
+    window = FlightWindow(3, timeout=5.0)
+    window.reserve(2)
+    assert window.room() == 1
+    window.launched("0001")
+    assert (window.room(), len(window)) == (1, 1)
+    window.unreserve()
+    assert window.room() == 2
+    assert window.finish("0001")
+    assert not window.finish("0001")  # already settled
+    assert window.room() == 3 and len(window) == 0
+
+
+def test_wait_for_room_blocks_until_a_report_frees_a_slot():
+    window = FlightWindow(1, timeout=60.0)
+    window.reserve(1)
+    window.launched("0001")
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(window.wait_for_room(5.0)))
+    waiter.start()
+    time.sleep(0.05)
+    assert waiter.is_alive() and not result
+    window.finish("0001")
+    waiter.join(1.0)
+    assert result == [1]
+
+
+def test_wait_for_room_returns_at_once_when_there_is_room_and_times_out_when_not():
+    window = FlightWindow(2, timeout=60.0)
+    assert window.wait_for_room(5.0) == 2
+    window.reserve(2)
+    started = time.monotonic()
+    assert window.wait_for_room(0.05) == 0
+    assert time.monotonic() - started < 1.0
+
+
+def test_wake_gets_a_waiter_out_early():
+    window = FlightWindow(1, timeout=60.0)
+    window.reserve(1)
+    done = threading.Event()
+    waiter = threading.Thread(target=lambda: (window.wait_for_room(5.0), done.set()))
+    waiter.start()
+    time.sleep(0.05)
+    window.wake()
+    assert done.wait(1.0)
+
+
+def test_on_room_fires_whenever_a_slot_frees():
+    pokes = []
+    clock = FakeClock()
+    window = FlightWindow(4, timeout=10.0, on_room=lambda: pokes.append(window.room()), clock=clock)
+    window.reserve(3)
+    window.launched("a")
+    window.launched("b")
+    assert pokes == []
+    window.finish("a")
+    window.unreserve()
+    assert pokes == [2, 3]
+    window.finish("nope")
+    assert pokes == [2, 3]  # nothing freed, nobody poked
+    clock.now = 10.0
+    assert window.expire() == ["b"]
+    assert pokes == [2, 3, 4]
+    assert window.expire() == []
+    assert len(pokes) == 3
+
+
+def test_expiry_and_deadlines_follow_the_clock():
+    clock = FakeClock()
+    window = FlightWindow(2, timeout=10.0, clock=clock)
+    assert window.next_deadline() is None
+    window.reserve(2)
+    window.launched("a")
+    clock.now = 4.0
+    window.launched("b")
+    assert window.next_deadline() == 10.0
+    clock.now = 9.9
+    assert window.expire() == []
+    clock.now = 10.0
+    assert window.expire() == ["a"]
+    assert window.next_deadline() == 14.0
+    assert window.clear() == 1
+    assert window.room() == 2
+
+
+def test_size_is_at_least_one():
+    assert FlightWindow(0).room() == 1
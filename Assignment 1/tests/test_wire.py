@@ -0,0 +1,284 @@
+import asyncio
+import socket
+import struct
+
+import pytest
+
+from src import wire
+from src.buffers import BufferPool
+
+
+def split(frame):
+    """(version, type, body) of one whole frame."""
+    version, frame_type, length = wire.decode_header(frame[: wire.HEADER_SIZE])
+    body = frame[wire.HEADER_SIZE :]
+    assert len(body) == length
+    return version, frame_type, body
+
+
+# -- v1: HELLO / FLIGHT / ACK / REGISTER / PLAN / DONE --
+
+
+def test_hello_carries_name_and_version():
+    version, frame_type, body = split(wire.encode_hello("ANC", version=3))
+    assert (version, frame_type, body) == (3, wire.HELLO, b"ANC")
+    assert wire.is_framed(wire.encode_hello("ANC"))
+    assert not wire.is_framed(b'{"flight_id": "0001"}')
+    assert not wire.is_framed(b"")
+
+
+def test_negotiate_picks_the_lower_version():
+    assert wire.negotiate(wire.PROTOCOL_VERSION + 5) == wire.PROTOCOL_VERSION
+    assert wire.negotiate(wire.MIN_VERSION) == wire.MIN_VERSION
+    with pytest.raises(wire.FrameError):
+        wire.negotiate(0)
+
+
+def test_flight_round_trip():
+    frame = wire.encode_flight("0042", "Passenger: Ada Lovelace ✈", ["FAI", "ANC", "BRW"], 1, 2)
+    _, frame_type, body = split(frame)
+    assert frame_type == wire.FLIGHT
+    assert wire.decode_flight_body(body) == {
+        "flight_id": "0042",
+        "payload": "Passenger: Ada Lovelace ✈",
+        "legs": ["FAI", "ANC", "BRW"],
+        "from_idx": 1,
+        "to_idx": 2,
+    }
+
+
+def test_flight_codes_are_interned():
+    body = split(wire.encode_flight("1", "x", ["SEA", "ANC"], 0, 1))[2]
+    assert wire.decode_flight_body(body)["legs"][1] is wire.decode_flight_body(body)["legs"][1]
+
+
+def test_ack_round_trip():
+    _, frame_type, body = split(wire.encode_ack("SEA"))
+    assert frame_type == wire.ACK
+    assert wire.ack_text(body) == "ACK from SEA"
+
+
+def test_register_and_done_are_plain_ascii():
+    _, frame_type, body = split(wire.encode_frame(wire.REGISTER, b"ANC"))
+    assert (frame_type, body) == (wire.REGISTER, b"ANC")
+    _, frame_type, body = split(wire.encode_frame(wire.DONE, b"0007"))
+    assert (frame_type, body) == (wire.DONE, b"0007")
+
+
+def test_plan_round_trip():
+    _, frame_type, body = split(wire.encode_plan(["SEA", "ANC", "OME"], "Cargo", "0002"))
+    assert frame_type == wire.PLAN
+    plan = wire.decode_flight_body(body)
+    assert (plan["legs"], plan["payload"], plan["flight_id"]) == (["SEA", "ANC", "OME"], "Cargo", "0002")
+    assert wire.format_plan(plan["legs"], plan["payload"], plan["flight_id"]) == "FLIGHT SEA >> ANC >> OME | Cargo | id:0002"
+
+
+# -- v2: LEASE --
+
+
+def test_lease_round_trip():
+    _, frame_type, body = split(wire.encode_lease("ANC", 300))
+    assert frame_type == wire.LEASE
+    assert wire.decode_lease(body) == ("ANC", 300)
+
+
+# -- v3: ROUTED --
+
+
+def test_routed_round_trip():
+    frame = wire.encode_routed("0099", "Cargo", "FAI", "ANC", "SEA", 2)
+    _, frame_type, body = split(frame)
+    assert frame_type == wire.ROUTED
+    assert wire.decode_flight_frame(frame_type, body) == {
+        "flight_id": "0099",
+        "payload": "Cargo",
+        "origin": "FAI",
+        "prev": "ANC",
+        "dest": "SEA",
+        "hops": 2,
+    }
+
+
+def test_flight_frame_falls_back_to_legs_for_old_peers():
+    flight = {
+        "flight_id": "0001",
+        "payload": "Cargo",
+        "origin": "FAI",
+        "prev": "FAI",
+        "dest": "SEA",
+        "hops": 1,
+        "legs": ["FAI", "ANC", "SEA"],
+        "from_idx": 0,
+        "to_idx": 1,
+    }
+    assert split(wire.flight_frame(flight))[1] == wire.ROUTED
+    _, frame_type, body = split(wire.flight_frame(flight, wire.ROUTED_VERSION - 1))
+    assert frame_type == wire.FLIGHT
+    assert wire.decode_flight_frame(frame_type, body)["legs"] == ["FAI", "ANC", "SEA"]
+
+
+# -- v4: DATAGRAM / SACK --
+
+
+def test_datagram_round_trip():
+    inner = wire.encode_flight("0005", "Cargo", ["ANC", "SEA"], 0, 1)
+    frame_type, body = wire.decode_packet(wire.encode_datagram(2**32 - 1, inner))
+    assert frame_type == wire.DATAGRAM
+    seq, inner_type, inner_body = wire.decode_datagram_body(body)
+    assert (seq, inner_type) == (2**32 - 1, wire.FLIGHT)
+    assert wire.decode_flight_body(inner_body)["flight_id"] == "0005"
+
+
+def test_sack_round_trip():
+    frame_type, body = wire.decode_packet(wire.encode_sack("SEA", [7, 8, 1000]))
+    assert frame_type == wire.SACK
+    assert wire.decode_sack_body(body) == ("SEA", (7, 8, 1000))
+    assert wire.decode_sack_body(wire.decode_packet(wire.encode_sack("SEA", []))[1]) == ("SEA", ())
+
+
+# -- v5: COMPLETE --
+
+
+def test_complete_round_trip():
+    _, frame_type, body = split(wire.encode_complete("FAI", "BRW", "0123"))
+    assert frame_type == wire.COMPLETE
+    assert wire.decode_complete_body(body) == ("FAI", "BRW", "0123")
+
+
+# -- v6: BUSY --
+
+
+def test_busy_round_trip():
+    _, frame_type, body = split(wire.encode_busy(0.25, 17))
+    assert frame_type == wire.BUSY
+    busy = wire.decode_busy_body(body)
+    assert isinstance(busy, wire.PeerBusy)
+    assert (busy.retry_after, busy.depth) == (0.25, 17)
+
+
+def test_busy_text_round_trip():
+    busy = wire.parse_busy_text(wire.busy_text(1.5))
+    assert busy is not None and busy.retry_after == 1.5
+    assert wire.parse_busy_text("ACK from ANC") is None
+    assert wire.parse_busy_text("BUSY soon") is None
+
+
+# -- broken frames --
+
+
+@pytest.mark.parametrize(
+    "frame",
+    [
+        wire.encode_flight("0042", "Cargo", ["FAI", "ANC", "BRW"], 0, 1),
+        wire.encode_routed("0042", "Cargo", "FAI", "ANC", "BRW", 1),
+        wire.encode_plan(["FAI", "ANC"], "Cargo", "0042"),
+    ],
+)
+def test_truncated_flight_bodies(frame):
+    _, frame_type, body = split(frame)
+    decode = wire.decode_routed_body if frame_type == wire.ROUTED else wire.decode_flight_body
+    for cut in (0, 1, 5, len(body) - 1):
+        with pytest.raises(wire.FrameError):
+            decode(body[:cut])
+    with pytest.raises(wire.FrameError):
+        decode(body + b"x")
+
+
+@pytest.mark.parametrize(
+    "frame, decode",
+    [
+        (wire.encode_lease("ANC", 4), wire.decode_lease),
+        (wire.encode_complete("FAI", "BRW", "0001"), wire.decode_complete_body),
+        (wire.encode_busy(0.1, 3), wire.decode_busy_body),
+        (wire.encode_sack("SEA", [1, 2]), wire.decode_sack_body),
+    ],
+)
+def test_truncated_small_bodies(frame, decode):
+    body = split(frame)[2]
+    with pytest.raises(wire.FrameError):
+        decode(body[:2])
+
+
+def test_truncated_packets():
+    frame = wire.encode_datagram(1, wire.encode_ack("ANC"))
+    with pytest.raises(wire.FrameError):
+        wire.decode_packet(frame[:-1])
+    with pytest.raises(wire.FrameError):
+        wire.decode_packet(frame[: wire.HEADER_SIZE - 1])
+    with pytest.raises(wire.FrameError):
+        wire.decode_packet(frame + b"\0")
+    with pytest.raises(wire.FrameError):
+        wire.decode_datagram_body(b"\0\0")
+    # the sequence number is there, the frame inside it is cut short
+    with pytest.raises(wire.FrameError):
+        wire.decode_datagram_body(split(frame)[2][:-1])
+
+
+def test_oversized_frames():
+    with pytest.raises(wire.FrameError):
+        wire.encode_frame(wire.FLIGHT, bytes(wire.MAX_FRAME + 1))
+    header = struct.pack(">BBBI", wire.MAGIC, wire.PROTOCOL_VERSION, wire.FLIGHT, wire.MAX_FRAME + 1)
+    with pytest.raises(wire.FrameError):
+        wire.decode_header(header)
+    with pytest.raises(wire.FrameError):
+        wire.encode_flight("x" * 256, "Cargo", ["ANC", "SEA"], 0, 1)
+    with pytest.raises(wire.FrameError):
+        wire.encode_routed("0001", "Cargo", "ANC", "ANC", "SEA", 256)
+
+
+def test_bad_magic_and_codes():
+    with pytest.raises(wire.FrameError):
+        wire.decode_header(b"{" + bytes(wire.HEADER_SIZE - 1))
+    with pytest.raises(wire.FrameError):
+        wire.encode_ack("ANCH")
+    with pytest.raises(wire.FrameError):
+        wire.decode_flight_frame(wire.ACK, b"ANC")
+
+
+# -- reading frames off sockets --
+
+
+def test_frame_stream_reassembles_split_and_large_frames():
+    small = wire.encode_ack("ANC")
+    large = wire.encode_flight("0001", "x" * 5000, ["ANC", "SEA"], 0, 1)
+    pool = BufferPool(size=64, keep=2)
+    a, b = socket.socketpair()
+    with a, b:
+        stream = wire.FrameStream(b, initial=small[:3], pool=pool)
+        a.sendall(small[3:] + large)
+        assert bytes(stream.read_frame()[2]) == b"ANC"
+        version, frame_type, body = stream.read_frame()
+        assert (version, frame_type) == (wire.PROTOCOL_VERSION, wire.FLIGHT)
+        assert wire.decode_flight_body(body)["payload"] == "x" * 5000
+        a.shutdown(socket.SHUT_WR)
+        assert stream.read_frame() is None
+        stream.release()
+
+
+def test_frame_stream_mid_frame_close():
+    a, b = socket.socketpair()
+    with a, b:
+        stream = wire.FrameStream(b)
+        a.sendall(wire.encode_ack("ANC")[:-1])
+        a.shutdown(socket.SHUT_WR)
+        with pytest.raises(ConnectionResetError):
+            stream.read_frame()
+        stream.release()
+
+
+def test_read_frame_async():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(wire.encode_hello("SEA") + wire.encode_lease("SEA", 2)[:4])
+        prefix = bytearray()
+        hello = await wire.read_frame_async(reader, prefix)
+        reader.feed_data(wire.encode_lease("SEA", 2)[4:])
+        reader.feed_eof()
+        lease = await wire.read_frame_async(reader, prefix)
+        end = await wire.read_frame_async(reader, prefix)
+        return hello, lease, end
+
+    hello, lease, end = asyncio.run(run())
+    assert hello == (wire.PROTOCOL_VERSION, wire.HELLO, b"SEA")
+    assert wire.decode_lease(lease[2]) == ("SEA", 2)
+    assert end is None
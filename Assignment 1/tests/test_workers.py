@@ -0,0 +1,53 @@
+import threading
+import time
+
+from src.workers import WorkerPool
+
+
+def test_failures_go_to_the_owners_log():
+    lines = []
+    done = threading.Event()
+    pool = WorkerPool("ANC-arrivals", 1, 4, log=lines.append)
+    pool.start()
+
+    def boom():
+        raise ValueError("bad frame")
+
+    assert pool.submit(boom)
+    assert pool.submit(done.set)  # the handler survived and took the next job
+    assert done.wait(2.0)
+    pool.stop()
+    assert lines == ["[ANC-arrivals] handler failed: ValueError('bad frame')"]
+
+
+def test_full_queue_sheds_and_stop_hands_leftovers_to_on_stale():
+    stale = []
+    release = threading.Event()
+    started = threading.Event()
+    pool = WorkerPool("SEA-arrivals", 1, 1, on_stale=stale.append)
+    pool.start()
+    assert pool.submit(lambda _: (started.set(), release.wait(2.0)), "first")
+    assert started.wait(2.0)
+    assert pool.submit(stale.append, "queued")
+    assert not pool.submit(stale.append, "shed")
+    pool.stop()
+    release.set()
+    assert stale == ["queued"]
+    assert not pool.submit(stale.append, "late")
+
+
+def test_accepted_work_runs_however_long_it_queued():
+    stale, ran = [], []
+    release, started, done = threading.Event(), threading.Event(), threading.Event()
+    pool = WorkerPool("SEA-arrivals", 1, 4, max_wait=0.01, on_stale=stale.append)
+    pool.start()
+    assert pool.submit(lambda: (started.set(), release.wait(2.0)))
+    assert started.wait(2.0)
+    assert pool.submit_accepted(lambda leg: (ran.append(leg), done.set()), "leg")
+    assert pool.submit(ran.append, "connection")
+    time.sleep(0.05)  # both now waited past max_wait
+    release.set()
+    assert done.wait(2.0)
+    pool.stop()
+    assert ran == ["leg"]
+    assert stale == ["connection"]
@@ -12,7 +12,13 @@ class House:
         return f"House(id={self.ssn}, name={self.name}, email={self.email}, address={self.address})"
 '''
 
+# these are fine for a handful of tenants. for a whole complex (lookups by
+# ssn/email/unit, vacancy checks) use TenantRegistry in tenant_registry.py,
+# which keeps tenants in columns with hash indexes instead of lists of objects.
+
 class Tenant:
+    __slots__ = ("ssn", "name", "email", "unit_number")
+
     def __init__(self, ssn, name, email, unit_number):
         self.ssn = ssn
         self.name = name
@@ -23,6 +29,8 @@ class Tenant:
         return f"Tenant(ssn={self.ssn}, name={self.name}, email={self.email}, unit={self.unit_number})"
 
 class Apartment:
+    __slots__ = ("building_number", "address", "units", "tenants")
+
     def __init__(self, building_number, address, units):
         self.building_number = building_number
         self.address = address
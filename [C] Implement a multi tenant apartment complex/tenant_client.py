@@ -0,0 +1,124 @@
+import argparse
+import json
+import random
+import socket
+import time
+
+# client for tenant_service.py
+#
+#   python tenant_client.py get --ssn 000000042
+#   python tenant_client.py get --building 3 --unit 17
+#   python tenant_client.py lease 123456789 "Ann Lee" ann@example.com 3
+#   python tenant_client.py bench --tenants 10000 --count 100000 --depth 64
+#
+# bench compares three ways of asking for `count` random tenants (the --demo
+# ssns): one request per round trip, pipelined (keep `depth` requests in
+# flight, read replies as they come), and batches of `depth` per request.
+
+HOST = '127.0.0.1'
+PORT = 12346
+
+
+class TenantClient:
+    def __init__(self, host=HOST, port=PORT):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def send(self, *requests):
+        # write requests without waiting for anything
+        self.sock.sendall(b"".join(json.dumps(r).encode() + b"\n" for r in requests))
+
+    def receive(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("service closed the connection")
+        return json.loads(line)
+
+    def call(self, request):
+        self.send(request)
+        return self.receive()
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+def bench(client, tenants, count, depth):
+    rng = random.Random(1)
+    queries = [{"op": "get", "ssn": f"{rng.randrange(tenants):09d}"} for _ in range(count)]
+
+    start = time.perf_counter()
+    for q in queries:
+        client.call(q)
+    one_by_one = time.perf_counter() - start
+
+    start = time.perf_counter()
+    in_flight = 0
+    for q in queries:
+        if in_flight == depth:
+            client.receive()
+            in_flight -= 1
+        client.send(q)
+        in_flight += 1
+    for _ in range(in_flight):
+        client.receive()
+    pipelined = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, count, depth):
+        client.call({"op": "batch", "queries": queries[i:i + depth]})
+    batched = time.perf_counter() - start
+
+    for label, took in (("one at a time", one_by_one), (f"pipelined x{depth}", pipelined), (f"batches of {depth}", batched)):
+        print(f"{label:>16}: {count / took:>10,.0f} lookups/s")
+    print(client.call({"op": "stats"}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="talk to tenant_service.py")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("get")
+    p.add_argument("--ssn")
+    p.add_argument("--email")
+    p.add_argument("--building")
+    p.add_argument("--unit")
+
+    p = sub.add_parser("lease")
+    p.add_argument("ssn")
+    p.add_argument("name")
+    p.add_argument("email")
+    p.add_argument("building")
+    p.add_argument("unit", nargs="?")
+
+    p = sub.add_parser("vacate")
+    p.add_argument("ssn")
+
+    p = sub.add_parser("vacancies")
+    p.add_argument("building")
+
+    sub.add_parser("stats")
+
+    p = sub.add_parser("bench")
+    p.add_argument("--tenants", type=int, default=10000, help="what the service was started with (--demo)")
+    p.add_argument("--count", type=int, default=20000)
+    p.add_argument("--depth", type=int, default=64)
+
+    args = parser.parse_args()
+    client = TenantClient(args.host, args.port)
+    try:
+        if args.command == "bench":
+            bench(client, args.tenants, args.count, args.depth)
+            return
+        request = {k: v for k, v in vars(args).items() if v is not None and k not in ("host", "port", "command")}
+        request["op"] = args.command
+        print(json.dumps(client.call(request), indent=2))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
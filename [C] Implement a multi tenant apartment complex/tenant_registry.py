@@ -0,0 +1,301 @@
+import argparse
+import time
+from array import array
+
+# indexed tenant registry for a big complex (lots of buildings, millions of tenants)
+#
+# multi-tenant.py keeps a list of units and a list of Tenant objects per
+# Apartment, so every lookup or vacancy check is a scan, and every tenant is a
+# whole object with its own __dict__. here nothing is stored per tenant except
+# a row in a few columns:
+#   tenants   row -> ssn / name / email (lists) and unit slot (array)
+#   units     slot -> building, label, tenant row, spot in the vacancy list
+# plus dicts pointing into those rows:
+#   ssn -> row, email -> row, (building, unit) -> slot
+# vacancies are a free list per building (an array used as a stack). leasing
+# the "next free unit" pops it, leasing a particular one swaps it out with the
+# last entry (we remember where every unit sits), vacating pushes it back. so
+# lease / vacate / lookups / vacancy checks are all O(1).
+#
+# rows of tenants that moved out are reused, so the columns don't grow forever.
+# a lookup hands back a TenantView: three slots, made on demand, reading the columns.
+# it remembers whose row it is, so one kept past a vacate raises KeyError instead
+# of reading whoever moved into that row next.
+
+NO_ONE = -1  # unit slot with no tenant / tenant row with no unit
+
+
+class TenantView:
+    __slots__ = ("registry", "row", "key")
+
+    def __init__(self, registry, row):
+        self.registry = registry
+        self.row = row
+        self.key = registry._ssn[row]  # whose row this is; rows get reused after a vacate
+
+    def _row(self):
+        # a view kept past its tenant's vacate must not quietly read whoever got the row next
+        if self.registry._ssn[self.row] != self.key:
+            raise KeyError(f"tenant {self.key} moved out")
+        return self.row
+
+    @property
+    def ssn(self):
+        return self.registry._ssn[self._row()]
+
+    @property
+    def name(self):
+        return self.registry._name[self._row()]
+
+    @property
+    def email(self):
+        return self.registry._email[self._row()]
+
+    @property
+    def building_number(self):
+        reg = self.registry
+        return reg._building_number[reg._unit_building[reg._tenant_unit[self._row()]]]
+
+    @property
+    def unit_number(self):
+        reg = self.registry
+        return reg._unit_label[reg._tenant_unit[self._row()]]
+
+    def __eq__(self, other):
+        return (isinstance(other, TenantView) and other.registry is self.registry
+                and other.row == self.row and other.key == self.key)
+
+    def __hash__(self):
+        return hash((id(self.registry), self.row, self.key))
+
+    def __str__(self):
+        return (f"Tenant(ssn={self.ssn}, name={self.name}, email={self.email}, "
+                f"building={self.building_number}, unit={self.unit_number})")
+
+    __repr__ = __str__
+
+
+class TenantRegistry:
+    def __init__(self):
+        # tenant columns, indexed by row
+        self._ssn = []
+        self._name = []
+        self._email = []
+        self._tenant_unit = array("q")
+        self._free_rows = []  # rows of tenants that moved out, reused first
+
+        # unit columns, indexed by slot
+        self._unit_building = array("q")  # building index
+        self._unit_label = []
+        self._unit_tenant = array("q")  # tenant row or NO_ONE
+        self._vacant_pos = array("q")  # where the slot sits in its building's vacancy list (-1 = leased)
+
+        # building columns, indexed by building index
+        self._building_number = []
+        self._building_address = []
+        self._vacant = []  # per building: array of vacant unit slots
+        self._slots = []  # per building: array of all its unit slots, in the order they were added
+
+        # hash indexes
+        self._buildings = {}  # building number -> building index
+        self._units = {}  # (building number, unit) -> slot
+        self._by_ssn = {}  # ssn -> row
+        self._by_email = {}  # email (casefolded) -> row
+
+    # -- buildings and units --
+
+    def add_building(self, building_number, address, units=()):
+        if building_number in self._buildings:
+            raise ValueError(f"building {building_number} already exists")
+        self._buildings[building_number] = len(self._building_number)
+        self._building_number.append(building_number)
+        self._building_address.append(address)
+        self._vacant.append(array("q"))
+        self._slots.append(array("q"))
+        self.add_units(building_number, units)
+
+    def add_units(self, building_number, units):
+        b = self._building(building_number)
+        vacant = self._vacant[b]
+        slots = self._slots[b]
+        for unit in units:
+            key = (building_number, unit)
+            if key in self._units:
+                raise ValueError(f"unit {unit} already exists in building {building_number}")
+            slot = len(self._unit_label)
+            self._units[key] = slot
+            self._unit_building.append(b)
+            self._unit_label.append(unit)
+            self._unit_tenant.append(NO_ONE)
+            self._vacant_pos.append(len(vacant))
+            vacant.append(slot)
+            slots.append(slot)
+
+    def address(self, building_number):
+        return self._building_address[self._building(building_number)]
+
+    def buildings(self):
+        return list(self._building_number)
+
+    def units(self, building_number):
+        return [self._unit_label[slot] for slot in self._slots[self._building(building_number)]]
+
+    # -- vacancies --
+
+    def vacancies(self, building_number):
+        return len(self._vacant[self._building(building_number)])
+
+    def vacant_units(self, building_number):
+        return [self._unit_label[slot] for slot in self._vacant[self._building(building_number)]]
+
+    def is_vacant(self, building_number, unit):
+        return self._unit_tenant[self._slot(building_number, unit)] == NO_ONE
+
+    def next_vacant(self, building_number):
+        # the unit lease() would hand out without a unit number, or None if full
+        vacant = self._vacant[self._building(building_number)]
+        return self._unit_label[vacant[-1]] if vacant else None
+
+    # -- leases --
+
+    def lease(self, ssn, name, email, building_number, unit=None):
+        # move a new tenant in; unit=None takes any vacant unit in the building
+        if ssn in self._by_ssn:
+            raise ValueError(f"tenant {ssn} already has a lease")
+        email_key = email.casefold()
+        if email_key in self._by_email:
+            raise ValueError(f"email {email} is already in use")
+
+        if unit is None:
+            vacant = self._vacant[self._building(building_number)]
+            if not vacant:
+                raise ValueError(f"building {building_number} has no vacant units")
+            slot = vacant[-1]
+        else:
+            slot = self._slot(building_number, unit)
+            if self._unit_tenant[slot] != NO_ONE:
+                raise ValueError(f"unit {unit} in building {building_number} is taken")
+        self._take(slot)
+
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._ssn[row] = ssn
+            self._name[row] = name
+            self._email[row] = email
+            self._tenant_unit[row] = slot
+        else:
+            row = len(self._ssn)
+            self._ssn.append(ssn)
+            self._name.append(name)
+            self._email.append(email)
+            self._tenant_unit.append(slot)
+        self._unit_tenant[slot] = row
+        self._by_ssn[ssn] = row
+        self._by_email[email_key] = row
+        return TenantView(self, row)
+
+    def vacate(self, ssn):
+        # move a tenant out; returns (building, unit) they left
+        row = self._by_ssn.pop(ssn, None)
+        if row is None:
+            raise KeyError(f"no tenant with ssn {ssn}")
+        del self._by_email[self._email[row].casefold()]
+        slot = self._tenant_unit[row]
+        self._unit_tenant[slot] = NO_ONE
+        self._give_back(slot)
+        left = (self._building_number[self._unit_building[slot]], self._unit_label[slot])
+
+        # drop the strings now, the row waits for the next tenant
+        self._ssn[row] = self._name[row] = self._email[row] = None
+        self._tenant_unit[row] = NO_ONE
+        self._free_rows.append(row)
+        return left
+
+    # -- lookups, None when nobody matches --
+
+    def by_ssn(self, ssn):
+        row = self._by_ssn.get(ssn)
+        return None if row is None else TenantView(self, row)
+
+    def by_email(self, email):
+        row = self._by_email.get(email.casefold())
+        return None if row is None else TenantView(self, row)
+
+    def at(self, building_number, unit):
+        slot = self._units.get((building_number, unit))
+        if slot is None or self._unit_tenant[slot] == NO_ONE:
+            return None
+        return TenantView(self, self._unit_tenant[slot])
+
+    def tenants(self, building_number=None):
+        # every tenant (or every tenant of one building); a scan, it's for reports
+        b = None if building_number is None else self._building(building_number)
+        for row, slot in enumerate(self._tenant_unit):
+            if slot != NO_ONE and (b is None or self._unit_building[slot] == b):
+                yield TenantView(self, row)
+
+    def __len__(self):
+        return len(self._by_ssn)
+
+    def __contains__(self, ssn):
+        return ssn in self._by_ssn
+
+    def __str__(self):
+        return f"TenantRegistry(buildings={len(self._building_number)}, units={len(self._unit_label)}, tenants={len(self)})"
+
+    # -- helpers --
+
+    def _building(self, building_number):
+        try:
+            return self._buildings[building_number]
+        except KeyError:
+            raise KeyError(f"no building {building_number}") from None
+
+    def _slot(self, building_number, unit):
+        try:
+            return self._units[(building_number, unit)]
+        except KeyError:
+            raise KeyError(f"no unit {unit} in building {building_number}") from None
+
+    def _take(self, slot):
+        # swap the slot with the last vacancy and pop it
+        vacant = self._vacant[self._unit_building[slot]]
+        pos = self._vacant_pos[slot]
+        last = vacant[-1]
+        vacant[pos] = last
+        self._vacant_pos[last] = pos
+        vacant.pop()
+        self._vacant_pos[slot] = -1
+
+    def _give_back(self, slot):
+        vacant = self._vacant[self._unit_building[slot]]
+        self._vacant_pos[slot] = len(vacant)
+        vacant.append(slot)
+
+
+def main():
+    # quick fill-and-look-up run: python tenant_registry.py --buildings 1000 --units 1000
+    parser = argparse.ArgumentParser(description="fill a registry and time the lookups")
+    parser.add_argument("--buildings", type=int, default=100)
+    parser.add_argument("--units", type=int, default=1000, help="units per building")
+    args = parser.parse_args()
+
+    reg = TenantRegistry()
+    start = time.perf_counter()
+    for b in range(args.buildings):
+        reg.add_building(b, f"{b} Main St", range(1, args.units + 1))
+    for n in range(args.buildings * args.units):
+        reg.lease(f"{n:09d}", f"Tenant {n}", f"tenant{n}@example.com", n % args.buildings)
+    filled = time.perf_counter() - start
+    print(reg, f"filled in {filled:.2f}s")
+
+    start = time.perf_counter()
+    count = len(reg)
+    for n in range(count):
+        reg.by_ssn(f"{n:09d}")
+    looked = time.perf_counter() - start
+    print(f"{count} ssn lookups in {looked:.2f}s ({looked / count * 1e6:.2f} us each)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import argparse
+import json
+import selectors
+import socket
+from collections import OrderedDict
+
+from tenant_registry import TenantRegistry
+from tenant_store import TenantStore
+
+# tenant lookups over tcp, for the front desk systems
+#
+# one request per line, json in, json out:
+#   {"op": "get", "ssn": "123-45-6789"}            also "email", or "building" + "unit"
+#   {"op": "batch", "queries": [{"ssn": ...}, {"email": ...}, ...]}   many gets, one reply
+#       (a query that can't be looked up gets {"error": "..."} in its place, the rest still answer)
+#   {"op": "lease", "ssn", "name", "email", "building", "unit" (optional)}
+#   {"op": "vacate", "ssn": ...}
+#   {"op": "vacancies", "building": ...}
+#   {"op": "stats"}
+# replies are {"ok": true, ...} or {"ok": false, "error": "..."}, and carry
+# back the request's "id" if it had one.
+#
+# pipelining: replies always come back in request order, so a client can
+# write as many requests as it likes before reading anything. the server takes
+# every complete line it has, answers them all and sends the replies in one go.
+# one thread, one selector, same shape as tcp_server_events.py.
+#
+# hot records sit in an LRU cache in front of the store/registry (misses too,
+# "nobody in 4B" is a common question). a lease or vacate drops the cached
+# entries for that tenant's ssn, email and unit, so nothing stale is served.
+#
+# run:  python tenant_service.py --store complex.db      (see tenant_store.py import)
+#       python tenant_service.py --demo 10000            (made-up tenants in memory)
+
+HOST = '127.0.0.1'
+PORT = 12346
+RECV_SIZE = 65536
+CACHE_SIZE = 100000
+MAX_OUTBOX = 1 << 20  # stop reading from a client that isn't reading its replies
+MAX_LINE = 1 << 20
+BACKLOG = 1024
+
+
+class LRUCache:
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        # (True, value) or (False, None)
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def drop(self, key):
+        self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _record(tenant):
+    if tenant is None:
+        return None
+    return {"ssn": tenant.ssn, "name": tenant.name, "email": tenant.email,
+            "building": tenant.building_number, "unit": tenant.unit_number}
+
+
+class TenantService:
+    # the request handling, no sockets; `tenants` is a TenantStore or a TenantRegistry
+    def __init__(self, tenants, cache_size=CACHE_SIZE):
+        self.tenants = tenants
+        self.cache = LRUCache(cache_size)
+        self.requests = 0
+
+    def handle(self, request):
+        self.requests += 1
+        try:
+            op = request.get("op")
+            if op == "get":
+                reply = {"ok": True, "tenant": self.lookup(request)}
+            elif op == "batch":
+                queries = request.get("queries")
+                if not isinstance(queries, list):
+                    raise ValueError("batch needs a list of queries")
+                reply = {"ok": True, "tenants": [self._batch_lookup(q) for q in queries]}
+            elif op == "lease":
+                reply = {"ok": True, "tenant": self.lease(request)}
+            elif op == "vacate":
+                reply = {"ok": True, "left": self.vacate(request)}
+            elif op == "vacancies":
+                reply = {"ok": True, "vacancies": self.tenants.vacancies(_field(request, "building"))}
+            elif op == "stats":
+                reply = {"ok": True, "tenants": len(self.tenants), "requests": self.requests,
+                         "cached": len(self.cache), "hits": self.cache.hits, "misses": self.cache.misses}
+            else:
+                raise ValueError(f"unknown op {op!r}")
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            message = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+            reply = {"ok": False, "error": str(message)}
+        if isinstance(request, dict) and "id" in request:
+            reply["id"] = request["id"]
+        return reply
+
+    def _batch_lookup(self, query):
+        try:
+            return self.lookup(query)
+        except ValueError as e:
+            return {"error": str(e)}
+
+    def lookup(self, query):
+        if not isinstance(query, dict):
+            raise ValueError("a lookup is a json object")
+        if "ssn" in query:
+            key = ("ssn", str(query["ssn"]))
+        elif "email" in query:
+            key = ("email", str(query["email"]).casefold())
+        elif "building" in query and "unit" in query:
+            key = ("unit", str(query["building"]), str(query["unit"]))
+        else:
+            raise ValueError("a lookup needs ssn, email, or building and unit")
+        found, record = self.cache.get(key)
+        if found:
+            return record
+        if key[0] == "ssn":
+            record = _record(self.tenants.by_ssn(key[1]))
+        elif key[0] == "email":
+            record = _record(self.tenants.by_email(key[1]))
+        else:
+            record = _record(self.tenants.at(key[1], key[2]))
+        self.cache.put(key, record)
+        return record
+
+    def lease(self, request):
+        unit = request.get("unit")
+        tenant = self.tenants.lease(_field(request, "ssn"), _field(request, "name"), _field(request, "email"),
+                                    _field(request, "building"), None if unit is None else str(unit))
+        record = _record(tenant)
+        self._forget(record)
+        return record
+
+    def vacate(self, request):
+        ssn = _field(request, "ssn")
+        record = _record(self.tenants.by_ssn(ssn))
+        building, unit = self.tenants.vacate(ssn)
+        if record is not None:
+            self._forget(record)
+        return {"building": building, "unit": unit}
+
+    def _forget(self, record):
+        # everything that could have answered differently before this write
+        self.cache.drop(("ssn", record["ssn"]))
+        self.cache.drop(("email", record["email"].casefold()))
+        self.cache.drop(("unit", str(record["building"]), str(record["unit"])))
+
+
+def _field(request, name):
+    value = request.get(name)
+    if value is None:
+        raise ValueError(f"missing {name!r}")
+    return str(value)
+
+
+class Client:
+    __slots__ = ("sock", "addr", "inbox", "outbox")
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.inbox = bytearray()  # a partial request line, waiting for its newline
+        self.outbox = bytearray()  # replies the socket wasn't ready to take yet
+
+
+class TenantServer:
+    def __init__(self, service, host=HOST, port=PORT, quiet=False):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.quiet = quiet
+        self.sel = selectors.DefaultSelector()
+        self.listener = None
+
+    def log(self, *parts):
+        if not self.quiet:
+            print(*parts)
+
+    def serve_forever(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((self.host, self.port))
+        s.listen(BACKLOG)
+        s.setblocking(False)
+        self.listener = s
+        self.sel.register(s, selectors.EVENT_READ)
+        print("tenant service on", self.host, self.port, "with", len(self.service.tenants), "tenants")
+
+        try:
+            while True:
+                for key, mask in self.sel.select():
+                    if key.fileobj is s:
+                        self.accept()
+                        continue
+                    client = key.data
+                    if mask & selectors.EVENT_READ:
+                        self.read(client)
+                    if mask & selectors.EVENT_WRITE and client.sock.fileno() != -1:
+                        self.flush(client)
+        except KeyboardInterrupt:
+            print("\nservice stopping")
+        finally:
+            for key in list(self.sel.get_map().values()):
+                if key.data is not None:
+                    self.close(key.data)
+            self.sel.close()
+            s.close()
+
+    def accept(self):
+        while True:
+            try:
+                c, addr = self.listener.accept()
+            except BlockingIOError:
+                return
+            except OSError as e:
+                print("accept failed:", e)
+                return
+            c.setblocking(False)
+            c.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sel.register(c, selectors.EVENT_READ, Client(c, addr))
+            self.log("client", addr, "connected")
+
+    def read(self, client):
+        try:
+            data = client.sock.recv(RECV_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.log("client error", client.addr, e)
+            self.close(client)
+            return
+        if not data:
+            self.close(client)
+            return
+
+        # answer every complete line we have, in order, then send all the replies at once
+        client.inbox += data
+        end = client.inbox.rfind(b"\n")
+        if end < 0:
+            if len(client.inbox) > MAX_LINE:
+                self.log("request too long from", client.addr)
+                self.close(client)
+            return
+        lines = client.inbox[:end].split(b"\n")
+        del client.inbox[:end + 1]
+        replies = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                replies.append({"ok": False, "error": "bad json"})
+                continue
+            if not isinstance(request, dict):
+                replies.append({"ok": False, "error": "a request is a json object"})
+                continue
+            replies.append(self.service.handle(request))
+        client.outbox += "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in replies).encode()
+        self.flush(client)
+
+    def flush(self, client):
+        if client.outbox:
+            try:
+                sent = client.sock.send(client.outbox)
+            except BlockingIOError:
+                sent = 0
+            except OSError as e:
+                self.log("client error", client.addr, e)
+                self.close(client)
+                return
+            del client.outbox[:sent]
+        # wait for write room while replies are stuck; stop reading while too many are
+        wanted = selectors.EVENT_WRITE if client.outbox else 0
+        if len(client.outbox) < MAX_OUTBOX:
+            wanted |= selectors.EVENT_READ
+        if self.sel.get_key(client.sock).events != wanted:
+            self.sel.modify(client.sock, wanted, client)
+
+    def close(self, client):
+        try:
+            self.sel.unregister(client.sock)
+        except (KeyError, ValueError):
+            return
+        client.sock.close()
+        self.log("client", client.addr, "closed")
+
+
+def demo_registry(tenants, units_per_building=100):
+    # made-up complex: ssn 000000000.., email tenantN@example.com, buildings "0".., units "1"..
+    reg = TenantRegistry()
+    buildings = max(1, -(-tenants * 5 // 4 // units_per_building))  # room to spare for new leases
+    for b in range(buildings):
+        reg.add_building(str(b), f"{b} Main St", [str(u) for u in range(1, units_per_building + 1)])
+    for n in range(tenants):
+        reg.lease(f"{n:09d}", f"Tenant {n}", f"tenant{n}@example.com", str(n % buildings))
+    return reg
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tenant lookup/lease service")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--store", help="tenant store file (tenant_store.py import makes one)")
+    source.add_argument("--demo", type=int, metavar="TENANTS", help="serve made-up tenants from memory")
+    parser.add_argument("--cache", type=int, default=CACHE_SIZE, help="LRU entries (0 = no cache)")
+    parser.add_argument("--sync", action="store_true", help="fsync every lease/vacate (store only)")
+    parser.add_argument("--quiet", action="store_true", help="no per-client connect/close lines")
+    args = parser.parse_args()
+
+    tenants = TenantStore(args.store, sync=args.sync) if args.store else demo_registry(args.demo)
+    try:
+        TenantServer(TenantService(tenants, args.cache), args.host, args.port, args.quiet).serve_forever()
+    finally:
+        if args.store:
+            tenants.close()
+
+
+if __name__ == "__main__":
+    main()
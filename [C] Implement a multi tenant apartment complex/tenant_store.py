@@ -0,0 +1,566 @@
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+from tenant_registry import TenantRegistry
+
+# tenants and units on disk, opened with mmap so startup is just "map the file"
+#
+# the file is a snapshot ("base") followed by a log of leases/vacates made since:
+#
+#   header      counts and index sizes (HEADER below)
+#   buildings   number, address, first unit, unit count     one column each
+#   units       building, label, tenant row (-1 = vacant)
+#   tenants     ssn, name, email, unit
+#   indexes     ssn -> row, email -> row, (building, unit) -> unit
+#               open addressing tables, crc32 of the key, 0 = empty slot
+#   heap        every string, utf-8, back to back
+#   log         LEASE / VACATE records appended after the snapshot
+#
+# every column is int64s, so each is one memoryview cast over the map, nothing
+# gets parsed up front. strings in columns are "refs": heap offset << 20 | length.
+# a lookup hashes the key, probes the table and decodes only the row it lands
+# on, so pages of the file come in only when something touches them.
+#
+# a new lease doesn't rewrite anything, it's one record appended to the log.
+# on open the log is replayed into a few small dicts that sit in front of the
+# snapshot. compact() folds the log back into a fresh snapshot.
+#
+# buildings and units are kept as text here (they come from csv/jsonl anyway).
+
+MAGIC = b"TENANTS\x01"
+VERSION = 1
+LITTLE = 1  # byte order flag, columns are written in native order
+HEADER = struct.Struct("<8sIIqqqqqqq")  # magic, version, flags, buildings, units, rows, 3 index sizes, heap bytes
+LOG_RECORD = struct.Struct("<BII")  # kind, payload length, crc32 of payload
+LEASE, VACATE = 1, 2
+LEN_BITS = 20  # strings up to 1 MiB
+LEN_MASK = (1 << LEN_BITS) - 1
+NO_ONE = -1
+UNIT_SEP = "\x1f"  # between building and unit in the unit index key
+
+UNIT_FIELDS = ("building", "address", "unit")
+TENANT_FIELDS = ("ssn", "name", "email", "building", "unit")
+
+
+class StoredTenant:
+    __slots__ = ("ssn", "name", "email", "building_number", "unit_number")
+
+    def __init__(self, ssn, name, email, building_number, unit_number):
+        self.ssn = ssn
+        self.name = name
+        self.email = email
+        self.building_number = building_number
+        self.unit_number = unit_number
+
+    def __str__(self):
+        return (f"Tenant(ssn={self.ssn}, name={self.name}, email={self.email}, "
+                f"building={self.building_number}, unit={self.unit_number})")
+
+    __repr__ = __str__
+
+
+def _key_hash(key):
+    return zlib.crc32(key.encode())
+
+
+def _table_size(count):
+    size = 8
+    while size < count * 2:  # stay at most half full, probes stay short
+        size <<= 1
+    return size
+
+
+def _build_index(keys):
+    table = array("q", bytes(8 * _table_size(len(keys))))
+    mask = len(table) - 1
+    for value, key in enumerate(keys):
+        i = _key_hash(key) & mask
+        while table[i]:
+            i = (i + 1) & mask
+        table[i] = value + 1
+    return table
+
+
+def write_store(path, registry):
+    # snapshot a TenantRegistry into `path` (atomically, through a .tmp file)
+    heap = bytearray()
+
+    def ref(text):
+        data = str(text).encode()
+        if len(data) > LEN_MASK:
+            raise ValueError(f"string too long for the store: {str(text)[:40]!r}...")
+        offset = len(heap)
+        heap.extend(data)
+        return offset << LEN_BITS | len(data)
+
+    b_number, b_address, b_first, b_count = array("q"), array("q"), array("q"), array("q")
+    u_building, u_label, u_tenant = array("q"), array("q"), array("q")
+    unit_keys = []
+    new_slot = {}  # (building, unit) -> slot in the file
+    for b, number in enumerate(registry.buildings()):
+        b_number.append(ref(number))
+        b_address.append(ref(registry.address(number)))
+        b_first.append(len(u_label))
+        units = registry.units(number)
+        b_count.append(len(units))
+        for unit in units:
+            new_slot[(number, unit)] = len(u_label)
+            u_building.append(b)
+            u_label.append(ref(unit))
+            u_tenant.append(NO_ONE)
+            unit_keys.append(f"{number}{UNIT_SEP}{unit}")
+
+    t_ssn, t_name, t_email, t_unit = array("q"), array("q"), array("q"), array("q")
+    ssn_keys, email_keys = [], []
+    for tenant in registry.tenants():
+        slot = new_slot[(tenant.building_number, tenant.unit_number)]
+        u_tenant[slot] = len(t_ssn)
+        t_ssn.append(ref(tenant.ssn))
+        t_name.append(ref(tenant.name))
+        t_email.append(ref(tenant.email))
+        t_unit.append(slot)
+        ssn_keys.append(str(tenant.ssn))
+        email_keys.append(str(tenant.email).casefold())
+
+    ix_ssn, ix_email, ix_unit = _build_index(ssn_keys), _build_index(email_keys), _build_index(unit_keys)
+    columns = (b_number, b_address, b_first, b_count, u_building, u_label, u_tenant,
+               t_ssn, t_name, t_email, t_unit, ix_ssn, ix_email, ix_unit)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, LITTLE if sys.byteorder == "little" else 0,
+                            len(b_number), len(u_label), len(t_ssn),
+                            len(ix_ssn), len(ix_email), len(ix_unit), len(heap)))
+        for column in columns:
+            f.write(column.tobytes())
+        f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class TenantStore:
+    def __init__(self, path, sync=False):
+        self.path = path
+        self.sync = sync  # fsync after every appended record
+        self._file = open(path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, flags, self._nb, self._nu, self._nr,
+         ssn_cap, email_cap, unit_cap, heap_len) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a tenant store")
+        if flags != (LITTLE if sys.byteorder == "little" else 0):
+            raise ValueError(f"{path} was written on a machine with the other byte order")
+
+        view = memoryview(self._mm)
+        offset = HEADER.size
+        cols = []
+        for count in (self._nb,) * 4 + (self._nu,) * 3 + (self._nr,) * 4 + (ssn_cap, email_cap, unit_cap):
+            cols.append(view[offset:offset + 8 * count].cast("q"))
+            offset += 8 * count
+        (self._b_number, self._b_address, self._b_first, self._b_count,
+         self._u_building, self._u_label, self._u_tenant,
+         self._t_ssn, self._t_name, self._t_email, self._t_unit,
+         self._ix_ssn, self._ix_email, self._ix_unit) = cols
+        self._heap = offset
+        self._log_start = offset + heap_len
+        self._buildings = None  # building number -> index, built the first time someone asks
+
+        # what the log changed, in front of the snapshot
+        self._added = {}  # ssn -> (name, email, slot) leased since the snapshot
+        self._gone = set()  # snapshot ssns that moved out
+        self._email_over = {}  # casefolded email -> ssn now using it, or None if freed
+        self._unit_over = {}  # slot -> ssn in it now, or None if vacated
+        self._vacant = {}  # building index -> {slot: None}, built lazily
+        self._count = self._nr
+        self._replay()
+
+    # -- opening / closing --
+
+    def close(self):
+        if self._mm is None:
+            return
+        for name in ("_b_number", "_b_address", "_b_first", "_b_count", "_u_building", "_u_label",
+                     "_u_tenant", "_t_ssn", "_t_name", "_t_email", "_t_unit",
+                     "_ix_ssn", "_ix_email", "_ix_unit"):
+            getattr(self, name).release()
+        self._mm.close()
+        self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _replay(self):
+        # apply every whole record in the log; a torn one at the end (crash mid-append) is cut off
+        self._file.seek(self._log_start)
+        log = self._file.read()
+        pos = 0
+        while pos + LOG_RECORD.size <= len(log):
+            kind, length, crc = LOG_RECORD.unpack_from(log, pos)
+            payload = log[pos + LOG_RECORD.size:pos + LOG_RECORD.size + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                break
+            fields = payload.decode().split("\x00")
+            if kind == LEASE:
+                ssn, name, email, building, unit = fields
+                self._apply_lease(ssn, name, email, self._find_unit(building, unit))
+            elif kind == VACATE:
+                self._apply_vacate(fields[0])
+            pos += LOG_RECORD.size + length
+        if pos != len(log):
+            self._file.truncate(self._log_start + pos)
+        self._file.seek(0, os.SEEK_END)
+
+    # -- reading the snapshot --
+
+    def _bytes(self, ref):
+        start = self._heap + (ref >> LEN_BITS)
+        return self._mm[start:start + (ref & LEN_MASK)]
+
+    def _str(self, ref):
+        return self._bytes(ref).decode()
+
+    def _probe(self, table, key, matches):
+        mask = len(table) - 1
+        i = _key_hash(key) & mask
+        while True:
+            value = table[i]
+            if not value:
+                return NO_ONE
+            if matches(value - 1):
+                return value - 1
+            i = (i + 1) & mask
+
+    def _find_row(self, ssn):
+        key = ssn.encode()
+        return self._probe(self._ix_ssn, ssn, lambda row: self._bytes(self._t_ssn[row]) == key)
+
+    def _find_email_row(self, email_key):
+        return self._probe(self._ix_email, email_key,
+                           lambda row: self._str(self._t_email[row]).casefold() == email_key)
+
+    def _find_unit(self, building, unit):
+        b, u = str(building).encode(), str(unit).encode()
+        return self._probe(self._ix_unit, f"{building}{UNIT_SEP}{unit}",
+                           lambda slot: self._bytes(self._u_label[slot]) == u
+                           and self._bytes(self._b_number[self._u_building[slot]]) == b)
+
+    def _unit_names(self, slot):
+        return self._str(self._b_number[self._u_building[slot]]), self._str(self._u_label[slot])
+
+    def _base_tenant(self, row):
+        building, unit = self._unit_names(self._t_unit[row])
+        return StoredTenant(self._str(self._t_ssn[row]), self._str(self._t_name[row]),
+                            self._str(self._t_email[row]), building, unit)
+
+    def _building_index(self, building):
+        if self._buildings is None:
+            self._buildings = {self._str(self._b_number[b]): b for b in range(self._nb)}
+        try:
+            return self._buildings[str(building)]
+        except KeyError:
+            raise KeyError(f"no building {building}") from None
+
+    # -- lookups, None when nobody matches --
+
+    def by_ssn(self, ssn):
+        added = self._added.get(ssn)
+        if added is not None:
+            name, email, slot = added
+            return StoredTenant(ssn, name, email, *self._unit_names(slot))
+        if ssn in self._gone:
+            return None
+        row = self._find_row(ssn)
+        return None if row == NO_ONE else self._base_tenant(row)
+
+    def by_email(self, email):
+        key = email.casefold()
+        if key in self._email_over:
+            ssn = self._email_over[key]
+            return None if ssn is None else self.by_ssn(ssn)
+        row = self._find_email_row(key)
+        return None if row == NO_ONE else self._base_tenant(row)
+
+    def at(self, building, unit):
+        slot = self._find_unit(building, unit)
+        if slot == NO_ONE:
+            return None
+        return self._in(slot)
+
+    def _in(self, slot):
+        if slot in self._unit_over:
+            ssn = self._unit_over[slot]
+            return None if ssn is None else self.by_ssn(ssn)
+        row = self._u_tenant[slot]
+        return None if row == NO_ONE else self._base_tenant(row)
+
+    def _occupied(self, slot):
+        if slot in self._unit_over:
+            return self._unit_over[slot] is not None
+        return self._u_tenant[slot] != NO_ONE
+
+    def is_vacant(self, building, unit):
+        slot = self._find_unit(building, unit)
+        if slot == NO_ONE:
+            raise KeyError(f"no unit {unit} in building {building}")
+        return not self._occupied(slot)
+
+    def _vacancies_of(self, b):
+        # first time a building's vacancies matter, scan its units once; kept current after that
+        vacant = self._vacant.get(b)
+        if vacant is None:
+            first = self._b_first[b]
+            vacant = {slot: None for slot in range(first, first + self._b_count[b]) if not self._occupied(slot)}
+            self._vacant[b] = vacant
+        return vacant
+
+    def vacancies(self, building):
+        return len(self._vacancies_of(self._building_index(building)))
+
+    def vacant_units(self, building):
+        return [self._str(self._u_label[slot]) for slot in self._vacancies_of(self._building_index(building))]
+
+    def buildings(self):
+        return [self._str(self._b_number[b]) for b in range(self._nb)]
+
+    def address(self, building):
+        return self._str(self._b_address[self._building_index(building)])
+
+    def units(self, building):
+        b = self._building_index(building)
+        first = self._b_first[b]
+        return [self._str(self._u_label[slot]) for slot in range(first, first + self._b_count[b])]
+
+    def tenants(self):
+        for row in range(self._nr):
+            if self._str(self._t_ssn[row]) not in self._gone:
+                yield self._base_tenant(row)
+        for ssn in list(self._added):
+            yield self.by_ssn(ssn)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, ssn):
+        return self.by_ssn(ssn) is not None
+
+    def __str__(self):
+        return (f"TenantStore({self.path}, buildings={self._nb}, units={self._nu}, tenants={self._count}, "
+                f"logged={len(self._added) + len(self._gone)})")
+
+    # -- changes, appended to the log --
+
+    def lease(self, ssn, name, email, building, unit=None):
+        if self.by_ssn(ssn) is not None:
+            raise ValueError(f"tenant {ssn} already has a lease")
+        if self.by_email(email) is not None:
+            raise ValueError(f"email {email} is already in use")
+        if unit is None:
+            vacant = self._vacancies_of(self._building_index(building))
+            if not vacant:
+                raise ValueError(f"building {building} has no vacant units")
+            slot = next(reversed(vacant))
+        else:
+            slot = self._find_unit(building, unit)
+            if slot == NO_ONE:
+                raise KeyError(f"no unit {unit} in building {building}")
+            if self._occupied(slot):
+                raise ValueError(f"unit {unit} in building {building} is taken")
+        building, unit = self._unit_names(slot)
+        self._append(LEASE, (ssn, name, email, building, unit))
+        self._apply_lease(ssn, name, email, slot)
+        return StoredTenant(ssn, name, email, building, unit)
+
+    def vacate(self, ssn):
+        tenant = self.by_ssn(ssn)
+        if tenant is None:
+            raise KeyError(f"no tenant with ssn {ssn}")
+        self._append(VACATE, (ssn,))
+        self._apply_vacate(ssn)
+        return tenant.building_number, tenant.unit_number
+
+    def _append(self, kind, fields):
+        for field in fields:
+            if "\x00" in field:
+                raise ValueError("fields can't contain NUL")
+        payload = "\x00".join(fields).encode()
+        self._file.write(LOG_RECORD.pack(kind, len(payload), zlib.crc32(payload)) + payload)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def _apply_lease(self, ssn, name, email, slot):
+        self._added[ssn] = (name, email, slot)
+        self._email_over[email.casefold()] = ssn
+        self._unit_over[slot] = ssn
+        vacant = self._vacant.get(self._u_building[slot])
+        if vacant is not None:
+            vacant.pop(slot, None)
+        self._count += 1
+
+    def _apply_vacate(self, ssn):
+        added = self._added.pop(ssn, None)
+        if added is not None:
+            _, email, slot = added
+        else:
+            row = self._find_row(ssn)
+            self._gone.add(ssn)
+            email, slot = self._str(self._t_email[row]), self._t_unit[row]
+        self._email_over[email.casefold()] = None
+        self._unit_over[slot] = None
+        vacant = self._vacant.get(self._u_building[slot])
+        if vacant is not None:
+            vacant[slot] = None
+        self._count -= 1
+
+    # -- whole-file operations --
+
+    def to_registry(self):
+        reg = TenantRegistry()
+        for building in self.buildings():
+            reg.add_building(building, self.address(building), self.units(building))
+        for t in self.tenants():
+            reg.lease(t.ssn, t.name, t.email, t.building_number, t.unit_number)
+        return reg
+
+    def compact(self):
+        # fold the log into a new snapshot and reopen on it
+        reg = self.to_registry()
+        self.close()
+        write_store(self.path, reg)
+        self.__init__(self.path, self.sync)
+
+
+# -- csv / jsonl --
+
+def read_rows(path):
+    # dicts from a .csv (with a header row) or a .jsonl file
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def write_rows(path, fields, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for row in rows:
+                f.write(json.dumps(dict(zip(fields, row))) + "\n")
+        else:
+            out = csv.writer(f)
+            out.writerow(fields)
+            out.writerows(rows)
+
+
+def import_files(units_path, tenants_path=None):
+    # units file: building,address,unit   tenants file: ssn,name,email,building,unit
+    reg = TenantRegistry()
+    units = {}  # building -> (address, [units]), in file order
+    for row in read_rows(units_path):
+        building = str(row["building"])
+        units.setdefault(building, (row.get("address", ""), []))[1].append(str(row["unit"]))
+    for building, (address, labels) in units.items():
+        reg.add_building(building, address, labels)
+    if tenants_path:
+        for row in read_rows(tenants_path):
+            unit = row.get("unit")
+            reg.lease(str(row["ssn"]), row["name"], row["email"], str(row["building"]),
+                      str(unit) if unit not in (None, "") else None)
+    return reg
+
+
+def export_files(store, units_path, tenants_path):
+    write_rows(units_path, UNIT_FIELDS,
+               ((b, store.address(b), u) for b in store.buildings() for u in store.units(b)))
+    write_rows(tenants_path, TENANT_FIELDS,
+               ((t.ssn, t.name, t.email, t.building_number, t.unit_number) for t in store.tenants()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="memory-mapped tenant store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="build a store from csv/jsonl files")
+    p.add_argument("store")
+    p.add_argument("--units", required=True, help="building,address,unit rows")
+    p.add_argument("--tenants", help="ssn,name,email,building,unit rows")
+
+    p = sub.add_parser("export", help="write the store back out as csv/jsonl")
+    p.add_argument("store")
+    p.add_argument("--units", required=True)
+    p.add_argument("--tenants", required=True)
+
+    p = sub.add_parser("lookup", help="find a tenant")
+    p.add_argument("store")
+    group = p.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ssn")
+    group.add_argument("--email")
+    group.add_argument("--unit", nargs=2, metavar=("BUILDING", "UNIT"))
+
+    p = sub.add_parser("lease", help="append a new lease")
+    p.add_argument("store")
+    p.add_argument("ssn")
+    p.add_argument("name")
+    p.add_argument("email")
+    p.add_argument("building")
+    p.add_argument("unit", nargs="?")
+
+    p = sub.add_parser("vacate", help="append a move-out")
+    p.add_argument("store")
+    p.add_argument("ssn")
+
+    p = sub.add_parser("compact", help="fold the log into a new snapshot")
+    p.add_argument("store")
+
+    p = sub.add_parser("stats", help="counts, and how long opening took")
+    p.add_argument("store")
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        start = time.perf_counter()
+        write_store(args.store, import_files(args.units, args.tenants))
+        print(f"wrote {args.store} in {time.perf_counter() - start:.2f}s")
+        return
+
+    start = time.perf_counter()
+    with TenantStore(args.store) as store:
+        opened = time.perf_counter() - start
+        if args.command == "export":
+            export_files(store, args.units, args.tenants)
+        elif args.command == "lookup":
+            if args.ssn:
+                print(store.by_ssn(args.ssn))
+            elif args.email:
+                print(store.by_email(args.email))
+            else:
+                print(store.at(*args.unit))
+        elif args.command == "lease":
+            print(store.lease(args.ssn, args.name, args.email, args.building, args.unit))
+        elif args.command == "vacate":
+            print("vacated", *store.vacate(args.ssn))
+        elif args.command == "compact":
+            store.compact()
+            print(store)
+        else:
+            print(store, f"opened in {opened * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# tenant_store imports tenant_registry as a sibling module, not as a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,95 @@
+import pytest
+
+from tenant_registry import TenantRegistry
+
+
+@pytest.fixture
+def reg():
+    reg = TenantRegistry()
+    reg.add_building("1", "1 Elm St", ["101", "102", "103", "104"])
+    reg.add_building("2", "2 Oak Ave", ["201"])
+    return reg
+
+
+def check_vacancy_index(reg):
+    # every vacant unit sits in its building's free list exactly where _vacant_pos says
+    for b, vacant in enumerate(reg._vacant):
+        for pos, slot in enumerate(vacant):
+            assert reg._vacant_pos[slot] == pos
+            assert reg._unit_tenant[slot] == -1
+            assert reg._unit_building[slot] == b
+    leased = [slot for slot, row in enumerate(reg._unit_tenant) if row != -1]
+    assert all(reg._vacant_pos[slot] == -1 for slot in leased)
+    assert sum(len(v) for v in reg._vacant) + len(leased) == len(reg._unit_label)
+
+
+def test_taking_a_unit_from_the_middle_swaps_in_the_last_vacancy(reg):
+    assert reg.vacant_units("1") == ["101", "102", "103", "104"]
+    reg.lease("111", "Ada", "ada@example.com", "1", "102")
+    assert reg.vacant_units("1") == ["101", "104", "103"]  # 104 moved into 102's spot
+    check_vacancy_index(reg)
+    assert reg.next_vacant("1") == "103"
+    assert reg.lease("222", "Bo", "bo@example.com", "1").unit_number == "103"  # any unit: the top of the stack
+    reg.lease("333", "Cy", "cy@example.com", "1", "101")
+    assert reg.vacant_units("1") == ["104"]
+    check_vacancy_index(reg)
+
+    assert reg.vacate("111") == ("1", "102")
+    assert reg.vacant_units("1") == ["104", "102"]
+    assert reg.is_vacant("1", "102") and not reg.is_vacant("1", "101")
+    check_vacancy_index(reg)
+    assert (reg.vacancies("1"), reg.vacancies("2")) == (2, 1)
+
+
+def test_rows_of_tenants_who_left_are_reused(reg):
+    reg.lease("111", "Ada", "ada@example.com", "1", "101")
+    reg.lease("222", "Bo", "bo@example.com", "1", "102")
+    reg.vacate("111")
+    assert reg._ssn[0] is None  # strings dropped straight away
+    cy = reg.lease("333", "Cy", "cy@example.com", "2", "201")
+    assert cy.row == 0 and len(reg._ssn) == 2
+    assert reg.by_ssn("333").unit_number == "201"
+    assert reg.at("1", "101") is None
+    assert sorted(t.ssn for t in reg.tenants()) == ["222", "333"]
+    assert [t.ssn for t in reg.tenants("2")] == ["333"]
+    assert len(reg) == 2 and "111" not in reg and "333" in reg
+
+
+def test_a_view_kept_past_a_vacate_does_not_read_the_next_tenant(reg):
+    ada = reg.lease("111", "Ada", "ada@example.com", "1", "101")
+    assert ada == reg.by_email("ADA@example.com")
+    reg.vacate("111")
+    with pytest.raises(KeyError, match="111 moved out"):
+        ada.name
+    cy = reg.lease("333", "Cy", "cy@example.com", "2")  # takes Ada's old row
+    assert cy.row == ada.row
+    with pytest.raises(KeyError):
+        ada.unit_number
+    assert cy != ada
+    assert cy.name == "Cy"
+
+
+def test_duplicates_and_taken_units_are_refused(reg):
+    reg.lease("111", "Ada", "ada@example.com", "1", "101")
+    with pytest.raises(ValueError, match="already has a lease"):
+        reg.lease("111", "Ada", "other@example.com", "1", "102")
+    with pytest.raises(ValueError, match="already in use"):
+        reg.lease("222", "Bo", "ADA@Example.com", "1", "102")
+    with pytest.raises(ValueError, match="is taken"):
+        reg.lease("222", "Bo", "bo@example.com", "1", "101")
+    reg.lease("222", "Bo", "bo@example.com", "2")
+    with pytest.raises(ValueError, match="no vacant units"):
+        reg.lease("333", "Cy", "cy@example.com", "2")
+    with pytest.raises(KeyError):
+        reg.lease("333", "Cy", "cy@example.com", "9")
+    with pytest.raises(KeyError):
+        reg.lease("333", "Cy", "cy@example.com", "1", "999")
+    with pytest.raises(KeyError):
+        reg.vacate("333")
+    with pytest.raises(ValueError):
+        reg.add_building("1", "again")
+    with pytest.raises(ValueError):
+        reg.add_units("1", ["101"])
+    # nothing refused left a trace
+    assert len(reg) == 2 and reg.vacancies("1") == 3
+    check_vacancy_index(reg)
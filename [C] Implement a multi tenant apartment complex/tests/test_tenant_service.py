@@ -0,0 +1,116 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from tenant_registry import TenantRegistry
+from tenant_service import LRUCache, TenantServer, TenantService
+from tenant_store import TenantStore, write_store
+
+
+def small_registry():
+    reg = TenantRegistry()
+    reg.add_building("1", "1 Elm St", ["101", "102"])
+    reg.lease("111", "Ada", "ada@example.com", "1", "101")
+    return reg
+
+
+@pytest.fixture(params=["registry", "store"])
+def service(request, tmp_path):
+    if request.param == "registry":
+        yield TenantService(small_registry())
+        return
+    path = str(tmp_path / "tenants.db")
+    write_store(path, small_registry())
+    store = TenantStore(path)
+    yield TenantService(store)
+    store.close()
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", None)  # misses get cached too
+    assert cache.get("a") == (True, 1)  # a is now the newest
+    cache.put("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("c") == (True, 3)
+    assert (cache.hits, cache.misses, len(cache)) == (2, 1, 2)
+    cache.drop("c")
+    cache.drop("c")
+    assert len(cache) == 1
+    off = LRUCache(0)
+    off.put("a", 1)
+    assert off.get("a") == (False, None)
+
+
+def test_writes_drop_what_they_change_from_the_cache(service):
+    get = lambda **query: service.handle({"op": "get", **query})["tenant"]
+    # cache the "before" answers, including the misses
+    assert get(building="1", unit="102") is None
+    assert get(email="BO@example.com") is None
+    assert get(ssn="222") is None
+    assert get(ssn="111")["unit"] == "101"
+
+    leased = service.handle({"op": "lease", "ssn": "222", "name": "Bo", "email": "bo@example.com", "building": "1", "unit": 102})
+    assert leased["ok"] and leased["tenant"]["unit"] == "102"
+    assert get(building="1", unit="102")["ssn"] == "222"
+    assert get(email="BO@example.com")["name"] == "Bo"
+    assert get(ssn="222")["unit"] == "102"
+
+    assert service.handle({"op": "vacate", "ssn": "111"})["left"] == {"building": "1", "unit": "101"}
+    assert get(ssn="111") is None
+    assert get(email="ada@example.com") is None
+    assert get(building="1", unit="101") is None
+    assert service.handle({"op": "vacancies", "building": "1"})["vacancies"] == 1
+
+
+def test_batch_answers_each_query_on_its_own(service):
+    reply = service.handle({"op": "batch", "id": 9, "queries": [{"ssn": "111"}, 5, {"ssn": "999"}, {"unit": "101"}, "x"]})
+    assert reply["ok"] and reply["id"] == 9
+    found, bare_int, missing, half_unit, text = reply["tenants"]
+    assert found["email"] == "ada@example.com"
+    assert bare_int == {"error": "a lookup is a json object"}
+    assert missing is None
+    assert half_unit == {"error": "a lookup needs ssn, email, or building and unit"}
+    assert "error" in text
+    assert service.handle({"op": "batch", "queries": {"ssn": "111"}}) == {"ok": False, "error": "batch needs a list of queries"}
+
+
+def test_errors_are_replies(service):
+    assert service.handle({"op": "nope"}) == {"ok": False, "error": "unknown op 'nope'"}
+    assert service.handle({"op": "vacate", "ssn": "999", "id": "x"})["ok"] is False
+    assert service.handle({"op": "lease", "ssn": "111", "name": "A", "email": "a@b", "building": "1"})["ok"] is False
+    assert service.handle({"op": "get"})["error"] == "a lookup needs ssn, email, or building and unit"
+
+
+def test_pipelined_requests_come_back_in_order():
+    server = TenantServer(TenantService(small_registry()), port=0, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    deadline = time.monotonic() + 5.0
+    while server.listener is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    port = server.listener.getsockname()[1]
+
+    requests = [
+        {"op": "get", "ssn": "111", "id": 1},
+        {"op": "lease", "ssn": "222", "name": "Bo", "email": "bo@example.com", "building": "1", "id": 2},
+        {"op": "get", "ssn": "222", "id": 3},
+        {"op": "vacancies", "building": "1", "id": 4},
+    ]
+    lines = [json.dumps(r) for r in requests]
+    lines.insert(2, "{not json")
+    with socket.create_connection(("127.0.0.1", port), timeout=5.0) as sock:
+        payload = ("\n".join(lines) + "\n").encode()
+        sock.sendall(payload[:30])  # a request split across sends waits for the rest of its line
+        sock.sendall(payload[30:])
+        reader = sock.makefile("rb")
+        replies = [json.loads(reader.readline()) for _ in range(len(lines))]
+
+    assert [r.get("id") for r in replies] == [1, 2, None, 3, 4]
+    assert replies[0]["tenant"]["name"] == "Ada"
+    assert replies[2] == {"ok": False, "error": "bad json"}
+    assert replies[3]["tenant"]["unit"] == "102"  # the lease right before it in the same send
+    assert replies[4]["vacancies"] == 0
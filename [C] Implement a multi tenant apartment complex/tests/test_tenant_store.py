@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from tenant_registry import TenantRegistry
+from tenant_store import TenantStore, write_store
+
+
+def snapshot(store):
+    # everything a reader could see, for comparing before/after reopen and compact
+    return {
+        "tenants": sorted((t.ssn, t.name, t.email, t.building_number, t.unit_number) for t in store.tenants()),
+        "vacant": {b: sorted(store.vacant_units(b)) for b in store.buildings()},
+        "count": len(store),
+    }
+
+
+@pytest.fixture
+def path(tmp_path):
+    reg = TenantRegistry()
+    reg.add_building("1", "1 Elm St", ["101", "102", "103"])
+    reg.add_building("2", "2 Oak Ave", ["201", "202"])
+    reg.lease("111", "Ada", "ada@example.com", "1", "101")
+    reg.lease("222", "Bo", "Bo@Example.com", "2", "201")
+    path = str(tmp_path / "tenants.db")
+    write_store(path, reg)
+    return path
+
+
+def test_snapshot_lookups(path):
+    with TenantStore(path) as store:
+        assert store.by_ssn("111").unit_number == "101"
+        assert store.by_email("bo@example.COM").ssn == "222"  # emails match case-insensitively
+        assert store.at("2", "201").name == "Bo"
+        assert store.at("1", "102") is None
+        assert store.by_ssn("999") is None
+        assert (store.vacancies("1"), store.vacancies("2")) == (2, 1)
+        assert store.address("2") == "2 Oak Ave"
+        assert len(store) == 2
+
+
+def test_lease_vacate_reopen_compact(path):
+    store = TenantStore(path)
+    size = os.path.getsize(path)
+    store.lease("333", "Cy", "cy@example.com", "1", "103")
+    store.lease("444", "Di", "di@example.com", "2")  # any vacant unit
+    assert store.vacate("111") == ("1", "101")
+    assert store.vacate("333") == ("1", "103")
+    store.lease("555", "Ed", "ada@example.com", "1", "101")  # the old tenant's email and unit are free again
+    before = snapshot(store)
+    assert before["count"] == 3
+    assert before["vacant"] == {"1": ["102", "103"], "2": []}
+    assert os.path.getsize(path) > size  # only the log grew
+    store.close()
+
+    store = TenantStore(path)  # log replayed on open
+    assert snapshot(store) == before
+    assert store.by_email("ADA@example.com").ssn == "555"
+    assert store.by_ssn("111") is None and store.by_ssn("333") is None
+    assert store.at("2", "202").ssn == "444"
+
+    store.compact()
+    assert snapshot(store) == before
+    assert os.path.getsize(path) == store._log_start  # nothing left in the log
+    assert store.by_ssn("555").unit_number == "101"
+    assert store.by_email("di@example.com").unit_number == "202"
+    assert store.at("1", "103") is None
+    assert store.vacancies("1") == 2
+    store.close()
+
+    with TenantStore(path) as store:
+        assert snapshot(store) == before
+
+
+def test_bad_leases_are_refused_and_not_logged(path):
+    with TenantStore(path) as store:
+        size = os.path.getsize(path)
+        with pytest.raises(ValueError):
+            store.lease("111", "Ada", "other@example.com", "1", "102")  # already has a lease
+        with pytest.raises(ValueError):
+            store.lease("333", "Cy", "ADA@example.com", "1", "102")  # email taken
+        with pytest.raises(ValueError):
+            store.lease("333", "Cy", "cy@example.com", "1", "101")  # unit taken
+        with pytest.raises(KeyError):
+            store.lease("333", "Cy", "cy@example.com", "1", "999")
+        with pytest.raises(KeyError):
+            store.vacate("999")
+        assert os.path.getsize(path) == size
+
+
+def test_torn_record_at_the_end_is_cut_off(path):
+    with TenantStore(path) as store:
+        store.lease("333", "Cy", "cy@example.com", "1", "103")
+        store.lease("444", "Di", "di@example.com", "1", "102")
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)  # crash in the middle of the last append
+    with TenantStore(path) as store:
+        assert store.by_ssn("333") is not None
+        assert store.by_ssn("444") is None
+        assert store.vacancies("1") == 1
@@ -1,5 +1,16 @@
 import socket
 
+# The acknowledgment every reply starts with, encoded once up front.
+ACK_PREFIX = b"Hey, this is the server acknowledging the receipt of your data: "
+
+# One buffer, laid out like the reply: [ ACK_PREFIX | the client's data ].
+# recv_into writes the data straight in after the prefix, so the reply is
+# just a slice of the same buffer; no new bytes or strings per message.
+buffer = bytearray(len(ACK_PREFIX) + 1024)
+buffer[:len(ACK_PREFIX)] = ACK_PREFIX
+reply = memoryview(buffer)
+incoming = reply[len(ACK_PREFIX):]
+
 # Create a TCP object
 server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
@@ -20,19 +31,16 @@ while True:
 
     try:
         while True:
-            # Receive data from the client
-            data = client_socket.recv(1024)
-            if not data:
+            # Receive data from the client, up to 1024 bytes, into the buffer after the prefix
+            nbytes = client_socket.recv_into(incoming)
+            if not nbytes:
                 break  # No more data, break the loop
   
-            # Decode the received data, format with the variables involved, and display the string.
-            print(f"Received data from {client_address}: {data.decode()}")
-    
-            # Create an acknowledgment.
-            ack = "Hey, this is the server acknowledging the receipt of your data: " + data.decode()
-
-            # Encode the acknowledgment and send to client.
-            client_socket.sendall(ack.encode())
+            # Decode the received data (once, only to display it), format with the variables involved, and display the string.
+            print(f"Received data from {client_address}: {incoming[:nbytes].tobytes().decode(errors='replace')}")
+
+            # The acknowledgment is already sitting in the buffer: the prefix plus the bytes we got. Send it to the client.
+            client_socket.sendall(reply[:len(ACK_PREFIX) + nbytes])
     except Exception as e:
         print("Error: {}".format(e))
     finally:
@@ -1,25 +1,132 @@
+import argparse
+import multiprocessing
 import socket
+import time
 
-# Create a UDP socket 
-# AF_INET indicates IPv4 addresses can be used.
-# SOCK_DGRAM: with connectionless service for datagrams
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+# Server address and port
+SERVER_ADDRESS = ('localhost', 12345)
 
-# Bind the socket to a specific address and port
-server_address = ('localhost', 12345)
-server_socket.bind(server_address)
+# Receive data from the client, up to a maximum of 1024 Bytes (i.e., 1 KB).
+BUFFER_SIZE = 1024
 
-print("UDP server is waiting for incoming connections...")
+# The acknowledgment every reply starts with, already encoded once up front.
+ACK_PREFIX = b"Hey, this is the server acknowledging the receipt of your data: "
 
-while True:
-    # Receive data from the client, up to a maximum of 1024 Bytes (i.e., 1 KB).
-    data, client_address = server_socket.recvfrom(1024)
+# How often each worker prints its packets-per-second count (--stats, or --workers > 1).
+REPORT_EVERY = 1.0
 
-    # Decode the received data, format with the variables involved, and display the string.
-    print(f"Received data from {client_address}: {data.decode()}")
-    
-    # Create an acknowledgment.
-    ack = "Hey, this is the server acknowledging the receipt of your data: " + data.decode()
 
-    # Encode the acknowledgment and send to client.
-    server_socket.sendto(ack.encode(), client_address)
+def make_socket(reuse_port=False):
+    # Create a UDP socket
+    # AF_INET indicates IPv4 addresses can be used.
+    # SOCK_DGRAM: with connectionless service for datagrams
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    # SO_REUSEPORT lets several processes bind the very same address and port.
+    # The kernel then hashes each client (its address and port) to one of them,
+    # so the datagrams get spread over all the workers, and over all the cores.
+    if reuse_port:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    # Bind the socket to a specific address and port
+    server_socket.bind(SERVER_ADDRESS)
+    return server_socket
+
+
+def serve(server_socket, worker=0, verbose=True, stats=False):
+    # One buffer for the whole life of the worker, laid out like the reply:
+    #   [ ACK_PREFIX | the client's data ]
+    # recvfrom_into writes the datagram straight in after the prefix, so the
+    # reply is just a slice of the same buffer. Nothing gets decoded, joined
+    # or encoded again per datagram, and nothing new gets allocated.
+    buffer = bytearray(len(ACK_PREFIX) + BUFFER_SIZE)
+    buffer[:len(ACK_PREFIX)] = ACK_PREFIX
+    reply = memoryview(buffer)
+    incoming = reply[len(ACK_PREFIX):]
+
+    # With stats on, wake up now and then even when it's quiet, so the counter still reports.
+    # Without, block in recvfrom like the original.
+    if stats:
+        server_socket.settimeout(REPORT_EVERY)
+    packets = 0
+    window_start = time.monotonic()
+
+    while True:
+        try:
+            # Receive data from the client, into the buffer after the prefix.
+            nbytes, client_address = server_socket.recvfrom_into(incoming)
+        except socket.timeout:
+            nbytes = None
+
+        if nbytes is not None:
+            if verbose:
+                # Decode only to display it; the reply below never needs the string.
+                print(f"Received data from {client_address}: {incoming[:nbytes].tobytes().decode(errors='replace')}")
+
+            # Send the acknowledgment: the prefix plus exactly the bytes we got.
+            server_socket.sendto(reply[:len(ACK_PREFIX) + nbytes], client_address)
+            packets += 1
+
+        # Packets per second for this worker, once a second (only if it did anything).
+        if not stats:
+            continue
+        now = time.monotonic()
+        if now - window_start >= REPORT_EVERY:
+            if packets:
+                print(f"[worker {worker}] {packets / (now - window_start):,.0f} packets/s")
+            packets = 0
+            window_start = now
+
+
+def worker_main(worker):
+    # Each worker process opens its own socket on the shared port.
+    server_socket = make_socket(reuse_port=True)
+    try:
+        serve(server_socket, worker, verbose=False, stats=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server_socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP acknowledgment server")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes sharing the port with SO_REUSEPORT (0 = one per CPU)")
+    parser.add_argument("--stats", action="store_true",
+                        help="print packets/s once a second (always on with more than one worker)")
+    args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else multiprocessing.cpu_count()
+
+    if workers == 1:
+        # The original: one process, prints every datagram (and nothing else unless --stats).
+        server_socket = make_socket()
+        print("UDP server is waiting for incoming connections...")
+        try:
+            serve(server_socket, stats=args.stats)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server_socket.close()
+        return
+
+    if not hasattr(socket, "SO_REUSEPORT"):
+        # Windows doesn't have it, so there's no way to share the port there.
+        print("SO_REUSEPORT isn't available on this OS, run it with --workers 1")
+        return
+
+    print(f"UDP server is waiting for incoming connections on {workers} workers...")
+    processes = [multiprocessing.Process(target=worker_main, args=(n,), daemon=True) for n in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Ctrl+C reached the workers too, they stop on their own.
+        for process in processes:
+            process.join(1.0)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,15 @@ HOST = '127.0.0.1'
 PORT = 12345
 TIMEOUT_SEC = 10
 MAX_TIMEOUTS = 3
+ACK = b"ack: "
 
 def handle_client(c, addr):
+    # one buffer per client laid out like the reply, [ ACK | data ]. recv_into
+    # fills the part after the prefix so the ack is just a slice, nothing decoded
+    buf = bytearray(len(ACK) + 1024)
+    buf[:len(ACK)] = ACK
+    reply = memoryview(buf)
+    incoming = reply[len(ACK):]
     print("client", addr, "connected")
     timeouts = 0
     try:
@@ -21,14 +28,13 @@ def handle_client(c, addr):
                     break
                 continue
 
-            data = c.recv(1024)
-            if not data:
+            n = c.recv_into(incoming)
+            if not n:
                 # client closed
                 break
 
             # echo-ish ack
-            msg = "ack: " + data.decode()
-            c.sendall(msg.encode())
+            c.sendall(reply[:len(ACK) + n])
             timeouts = 0  # activity, reset
     except Exception as e:
         print("client error", addr, e)
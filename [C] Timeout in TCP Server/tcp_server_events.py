@@ -0,0 +1,211 @@
+import argparse
+import selectors
+import socket
+import time
+
+from timer_wheel import TimerWheel
+
+# same ack/timeout behaviour as tcp_server.py, but every client at once on one thread.
+#
+# tcp_server.py handles one client at a time and select()s that one socket
+# to notice it went quiet. here one selector (epoll on linux, kqueue on mac,
+# select on windows) watches every socket, and idle timeouts live in a timer
+# wheel: each client has one timer that fires TIMEOUT_SEC after it was armed.
+# reading data doesn't touch the wheel at all, it just notes the time. when the
+# timer fires we check that note: recent activity -> re-arm for the rest of the
+# window, really idle -> count a timeout (and close after MAX_TIMEOUTS in a row).
+#
+# run:  python tcp_server_events.py           (tcp_client.py works against it unchanged)
+#       python tcp_server_events.py --quiet   (for lots of clients, skip the per-client prints)
+
+HOST = '127.0.0.1'
+PORT = 12345
+TIMEOUT_SEC = 10
+MAX_TIMEOUTS = 3
+TICK_SEC = 0.1  # timer resolution
+RECV_SIZE = 1024
+BACKLOG = 4096  # lots of clients connect at once when you load test it
+ACK = b"ack: "
+
+
+class Client:
+    __slots__ = ("sock", "addr", "timeouts", "last_active", "timer", "outbox")
+
+    def __init__(self, sock, addr, now):
+        self.sock = sock
+        self.addr = addr
+        self.timeouts = 0
+        self.last_active = now
+        self.timer = None
+        self.outbox = bytearray()  # replies the socket wasn't ready to take yet
+
+
+class EventServer:
+    def __init__(self, host=HOST, port=PORT, timeout=TIMEOUT_SEC, max_timeouts=MAX_TIMEOUTS, quiet=False):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_timeouts = max_timeouts
+        self.quiet = quiet
+        self.sel = selectors.DefaultSelector()
+        self.wheel = TimerWheel(TICK_SEC)
+        self.clients = {}  # fd -> Client
+        self.now = time.monotonic()  # refreshed once per loop turn, good enough for idle checks
+        self.listener = None
+        self.peak = 0
+        # one receive buffer for everybody (single thread), laid out like the
+        # reply: [ ACK | data ]. recv_into fills it after the prefix, so the
+        # ack is a slice of it and nothing new is allocated per read
+        self.buf = bytearray(len(ACK) + RECV_SIZE)
+        self.buf[:len(ACK)] = ACK
+        self.reply = memoryview(self.buf)
+        self.incoming = self.reply[len(ACK):]
+
+    def log(self, *parts):
+        if not self.quiet:
+            print(*parts)
+
+    def serve_forever(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((self.host, self.port))
+        s.listen(BACKLOG)
+        s.setblocking(False)
+        self.listener = s
+        self.sel.register(s, selectors.EVENT_READ)
+        print("listening on", self.host, self.port, "using", type(self.sel).__name__)
+
+        try:
+            while True:
+                events = self.sel.select(self.wheel.next_timeout())
+                self.now = time.monotonic()
+                for key, mask in events:
+                    if key.fileobj is s:
+                        self.accept()
+                        continue
+                    client = key.data
+                    if mask & selectors.EVENT_READ:
+                        self.read(client)
+                    if mask & selectors.EVENT_WRITE and client.sock.fileno() != -1:
+                        self.flush(client)
+                self.wheel.advance(self.now)
+        except KeyboardInterrupt:
+            print("\nserver stopping")
+        finally:
+            for client in list(self.clients.values()):
+                self.close(client, quiet=True)
+            self.sel.close()
+            s.close()
+            print("server closed, most clients at once:", self.peak)
+
+    def accept(self):
+        # take everyone waiting, not just one, so a connect storm drains fast
+        while True:
+            try:
+                c, addr = self.listener.accept()
+            except BlockingIOError:
+                return
+            except OSError as e:
+                # usually out of file descriptors (ulimit -n); leave them in the backlog
+                print("accept failed:", e)
+                return
+            c.setblocking(False)
+            client = Client(c, addr, self.now)
+            self.clients[c.fileno()] = client
+            self.peak = max(self.peak, len(self.clients))
+            self.sel.register(c, selectors.EVENT_READ, client)
+            self.arm(client, self.timeout)
+            self.log("client", addr, "connected")
+
+    def read(self, client):
+        try:
+            n = client.sock.recv_into(self.incoming)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.log("client error", client.addr, e)
+            self.close(client)
+            return
+        if not n:
+            # client closed
+            self.close(client)
+            return
+
+        # echo-ish ack, copied once into the outbox (the buffer gets reused next read)
+        client.outbox += self.reply[:len(ACK) + n]
+        client.timeouts = 0  # activity, reset
+        client.last_active = self.now
+        self.flush(client)
+
+    def flush(self, client):
+        try:
+            sent = client.sock.send(client.outbox)
+        except BlockingIOError:
+            sent = 0
+        except OSError as e:
+            self.log("client error", client.addr, e)
+            self.close(client)
+            return
+        del client.outbox[:sent]
+        # only ask for EVENT_WRITE while something is actually stuck
+        wanted = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.outbox else 0)
+        if self.sel.get_key(client.sock).events != wanted:
+            self.sel.modify(client.sock, wanted, client)
+
+    def arm(self, client, delay):
+        client.timer = self.wheel.schedule(delay, lambda: self.idle(client))
+
+    def idle(self, client):
+        # timer fired; only a timeout if nothing came in since it was armed
+        quiet_for = self.now - client.last_active
+        if quiet_for < self.timeout:
+            self.arm(client, self.timeout - quiet_for)
+            return
+        client.timeouts += 1
+        self.log("timeout from", client.addr, client.timeouts, "/", self.max_timeouts)
+        if client.timeouts >= self.max_timeouts:
+            self.log("closing", client.addr, "after too many timeouts")
+            self.close(client)
+            return
+        client.last_active = self.now  # next window starts now, like the select() loop
+        self.arm(client, self.timeout)
+
+    def close(self, client, quiet=False):
+        if self.clients.pop(client.sock.fileno(), None) is None:
+            return
+        if client.timer is not None:
+            self.wheel.cancel(client.timer)
+        self.sel.unregister(client.sock)
+        client.sock.close()
+        if not quiet:
+            self.log("client", client.addr, "closed")
+
+
+def _raise_fd_limit():
+    # tens of thousands of sockets need tens of thousands of fds; go as high as we're allowed
+    try:
+        import resource
+    except ImportError:
+        return  # windows, nothing to do
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="single thread, many clients, idle timeouts on a timer wheel")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT_SEC, help="seconds of silence that count as one timeout")
+    parser.add_argument("--max-timeouts", type=int, default=MAX_TIMEOUTS, help="timeouts in a row before we hang up")
+    parser.add_argument("--quiet", action="store_true", help="no per-client connect/timeout/close lines")
+    args = parser.parse_args()
+
+    _raise_fd_limit()
+    EventServer(args.host, args.port, args.timeout, args.max_timeouts, args.quiet).serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the server scripts import timer_wheel as a sibling module, not as a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
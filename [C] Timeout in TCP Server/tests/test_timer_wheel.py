@@ -0,0 +1,92 @@
+import random
+
+from timer_wheel import SLOTS, TimerWheel
+
+
+def recorder(wheel, fired, name):
+    return lambda: fired.append((name, wheel.current))
+
+
+def test_fires_on_the_right_tick_within_level_0():
+    wheel = TimerWheel(tick=0.1, now=0.0)
+    fired = []
+    wheel.schedule(0.1, recorder(wheel, fired, "a"))
+    wheel.schedule(1.0, recorder(wheel, fired, "b"))  # 10 ticks, not 11 from float noise
+    wheel.schedule(0.0, recorder(wheel, fired, "c"))  # never sooner than the next tick
+    assert wheel.advance(now=0.05) == 0
+    assert wheel.advance(now=0.15) == 2
+    assert sorted(fired) == [("a", 1), ("c", 1)]
+    wheel.advance(now=0.95)
+    assert len(fired) == 2
+    wheel.advance(now=1.05)
+    assert fired[-1] == ("b", 10)
+
+
+def test_timers_past_256_ticks_cascade_down_from_level_1_and_2():
+    wheel = TimerWheel(tick=1.0, now=0.0)
+    fired = []
+    ticks = [SLOTS - 1, SLOTS, SLOTS + 1, 3 * SLOTS + 17, SLOTS * SLOTS - 1, SLOTS * SLOTS, SLOTS * SLOTS + 5, 2 * SLOTS * SLOTS + 300]
+    for when in ticks:
+        wheel.schedule(when, recorder(wheel, fired, when))
+    assert sum(len(slot) for slot in wheel.levels[0]) == 1
+    assert sum(len(slot) for slot in wheel.levels[1]) == 4  # 256 .. 65535 sit a level up
+    assert sum(len(slot) for slot in wheel.levels[2]) == 3  # 65536 and past, two levels up
+    wheel.advance(now=ticks[-1] + 10)
+    assert fired == [(when, when) for when in ticks]
+    assert len(wheel) == 0
+
+
+def test_random_timers_fire_exactly_once_on_their_tick():
+    rng = random.Random(5)
+    wheel = TimerWheel(tick=1.0, now=0.0)
+    fired = []
+    expected = {}
+    now = 0
+    for round_ in range(20):
+        for n in range(50):
+            name = (round_, n)
+            delay = rng.choice([rng.randint(1, 300), rng.randint(1, 70000)])
+            wheel.schedule(delay, recorder(wheel, fired, name))
+            expected[name] = wheel.current + delay
+        now += rng.randint(1, 5000)  # big steps and small ones, so scheduling starts mid-wheel
+        wheel.advance(now=now)
+    wheel.advance(now=now + 80000)
+    assert len(fired) == len(expected)
+    assert dict(fired) == expected
+
+
+def test_cancel_and_count():
+    wheel = TimerWheel(tick=1.0, now=0.0)
+    fired = []
+    keep = wheel.schedule(5, recorder(wheel, fired, "keep"))
+    near = wheel.schedule(3, recorder(wheel, fired, "near"))
+    far = wheel.schedule(1000, recorder(wheel, fired, "far"))
+    assert len(wheel) == 3
+    wheel.cancel(near)
+    wheel.cancel(far)
+    wheel.cancel(far)  # twice is harmless
+    assert len(wheel) == 1 and far.slot is None
+    wheel.advance(now=2000)
+    assert fired == [("keep", 5)]
+    wheel.cancel(keep)  # already fired
+    assert len(wheel) == 0
+
+
+def test_next_timeout_points_at_the_next_tick_boundary():
+    wheel = TimerWheel(tick=0.5, now=10.0)
+    assert wheel.next_timeout(now=10.0) is None
+    wheel.schedule(3.0, lambda: None)
+    assert abs(wheel.next_timeout(now=10.2) - 0.3) < 1e-9
+    wheel.advance(now=11.1)  # two ticks in
+    assert abs(wheel.next_timeout(now=11.1) - 0.4) < 1e-9
+    assert wheel.next_timeout(now=99.0) == 0.0
+
+
+def test_idle_wheel_catches_the_clock_up():
+    wheel = TimerWheel(tick=1.0, now=0.0)
+    wheel.advance(now=1_000_000)
+    assert wheel.current == 1_000_000
+    fired = []
+    wheel.schedule(300, recorder(wheel, fired, "late"))
+    wheel.advance(now=1_000_300)
+    assert fired == [("late", 1_000_300)]
@@ -0,0 +1,109 @@
+import math
+import time
+
+# hierarchical timer wheel (the Varghese/Lauck idea, same shape as the linux kernel's)
+#
+# time moves in ticks. level 0 has one slot per tick for the next 256 ticks,
+# level 1 one slot per 256 ticks for the next 256*256, and so on. a timer goes
+# into the coarsest slot that still tells it apart, and when level 0 wraps
+# around the next level 1 slot gets poured back down ("cascade"). so:
+#   schedule / cancel   O(1), just a set add/remove
+#   each tick           one slot looked at, plus a cascade every 256 ticks
+# no matter how many timers are waiting. 10k idle sockets cost nothing until
+# their slot comes up.
+
+SLOT_BITS = 8
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+LEVELS = 4  # 2^32 ticks of range, way more than any idle timeout
+
+
+class Timer:
+    __slots__ = ("when", "callback", "slot")
+
+    def __init__(self, when, callback):
+        self.when = when  # tick it fires on
+        self.callback = callback
+        self.slot = None  # set it currently sits in (None once fired/cancelled)
+
+
+class TimerWheel:
+    def __init__(self, tick=0.1, now=None):
+        self.tick = tick
+        self.start = time.monotonic() if now is None else now
+        self.current = 0  # last tick we processed
+        self.levels = [[set() for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self.count = 0
+
+    def schedule(self, delay, callback):
+        # callback() runs from advance() once `delay` seconds have passed (rounded up to a tick)
+        ticks = max(1, math.ceil(delay / self.tick - 1e-9))  # the 1e-9 eats float noise like 10 / 0.1
+        timer = Timer(self.current + ticks, callback)
+        self._place(timer)
+        self.count += 1
+        return timer
+
+    def cancel(self, timer):
+        if timer.slot is not None:
+            timer.slot.discard(timer)
+            timer.slot = None
+            self.count -= 1
+
+    def advance(self, now=None):
+        # fire everything due up to `now`; returns how many fired
+        now = time.monotonic() if now is None else now
+        target = int((now - self.start) / self.tick)
+        fired = 0
+        while self.current < target:
+            self.current += 1
+            if not self.count:
+                # nothing waiting, just catch the clock up
+                self.current = target
+                break
+            index = self.current & SLOT_MASK
+            if index == 0:
+                self._cascade(1)
+            slot = self.levels[0][index]
+            if not slot:
+                continue
+            due = list(slot)
+            slot.clear()
+            for timer in due:
+                timer.slot = None
+                self.count -= 1
+                timer.callback()
+                fired += 1
+        return fired
+
+    def next_timeout(self, now=None):
+        # seconds until the next tick boundary (None if no timers, so select can sleep forever)
+        if not self.count:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.start + (self.current + 1) * self.tick - now)
+
+    def __len__(self):
+        return self.count
+
+    def _place(self, timer):
+        delta = timer.when - self.current
+        level = 0
+        while level < LEVELS - 1 and delta >= 1 << (SLOT_BITS * (level + 1)):
+            level += 1
+        when = min(timer.when, self.current + (1 << (SLOT_BITS * LEVELS)) - 1)
+        slot = self.levels[level][(when >> (SLOT_BITS * level)) & SLOT_MASK]
+        slot.add(timer)
+        timer.slot = slot
+
+    def _cascade(self, level):
+        # level-1 just wrapped: move this level's current slot down to finer slots
+        if level >= LEVELS:
+            return
+        index = (self.current >> (SLOT_BITS * level)) & SLOT_MASK
+        if index == 0:
+            self._cascade(level + 1)
+        slot = self.levels[level][index]
+        moving = list(slot)
+        slot.clear()
+        for timer in moving:
+            self._place(timer)